@@ -0,0 +1,82 @@
+# ==============================================
+# Import-time benchmark — guards against heavy work creeping back into imports
+# ==============================================
+"""Measure a cold `import coderank_lc.graph.graph` in a fresh interpreter.
+
+Exits non-zero if CodeRank's own modules take longer than the budget to import, or if
+importing the graph pulls in model / database libraries that must only load on first use.
+
+    python benchmarks/bench_import.py [--module coderank_lc.graph.graph] [--budget-ms 50] [--json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must not be imported as a side effect of importing the graph
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "onnxruntime", "astrapy", "pandas", "scipy")
+
+
+def measure_import(module: str) -> dict:
+    """Import `module` in a fresh interpreter with -X importtime and summarize the trace."""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=ROOT,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    own_self_us = 0
+    cumulative_us = 0
+    imported = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        self_us, cum_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        imported.add(name)
+        if name.startswith("coderank_lc"):
+            own_self_us += int(self_us)
+        if name == module:
+            cumulative_us = int(cum_us)
+
+    return {
+        "module": module,
+        "wall_ms": round(wall_ms, 1),
+        "cumulative_ms": round(cumulative_us / 1000, 1),
+        "own_self_ms": round(own_self_us / 1000, 1),
+        "heavy_imports": sorted(m for m in HEAVY_MODULES if m in imported),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="coderank_lc.graph.graph")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="budget for CodeRank's own import work")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON only")
+    args = parser.parse_args()
+
+    result = measure_import(args.module)
+    result["budget_ms"] = args.budget_ms
+    result["ok"] = result["own_self_ms"] <= args.budget_ms and not result["heavy_imports"]
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"⏱️ import {result['module']}: {result['cumulative_ms']} ms cumulative, "
+              f"{result['own_self_ms']} ms in coderank_lc (budget {args.budget_ms} ms), wall {result['wall_ms']} ms")
+        if result["heavy_imports"]:
+            print(f"❌ Heavy modules imported eagerly: {', '.join(result['heavy_imports'])}")
+        print("✅ Import budget met" if result["ok"] else "❌ Import budget exceeded")
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
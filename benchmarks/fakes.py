@@ -0,0 +1,171 @@
+# ==============================================
+# Local stand-ins for the Hugging Face endpoint and Astra collections
+# ==============================================
+"""Deterministic, credential-free substitutes used by the benchmark suite.
+
+`FakeHFServer` speaks the subset of the TGI / HF Inference API that `lc_agents` uses
+(plain JSON and server-sent-event streaming) with configurable latency, token rate and
+error injection. `FakeCollection` mimics the astrapy `insert_one` / `insert_many` calls
+with a fixed per-request round-trip time.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+
+class FakeHFServer:
+    """Threaded HTTP server on 127.0.0.1 answering text-generation requests.
+
+    latency          seconds before the first token (cold compute / network)
+    tokens_per_sec   generation speed; 0 returns all tokens instantly
+    tokens           completion length in tokens (the code block)
+    trailing_tokens  prose the "model" keeps generating after the closing fence, until `stop` or the budget
+    error_rate       share of requests answered with a 503 "model loading" error
+    slow_rate        share of requests that stall for `slow_latency` seconds instead (tail latency)
+    """
+
+    def __init__(self, latency: float = 0.05, tokens_per_sec: float = 0.0, tokens: int = 60,
+                 error_rate: float = 0.0, seed: int = 0, slow_rate: float = 0.0, slow_latency: float = 2.0,
+                 trailing_tokens: int = 0):
+        self.latency = latency
+        self.trailing_tokens = trailing_tokens
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def completion(self, prompt: str = "", params: Dict[str, Any] = None) -> Tuple[List[str], str]:
+        """(tokens, finish_reason) for a request, honouring `max_new_tokens` and `stop` like TGI."""
+        params = params or {}
+        body = [f"    total += x{i}\n" for i in range(max(0, self.tokens - 3))]
+        opening = [] if prompt.endswith("```python\n") else ["```python\n"]  # prefilled prompts skip it
+        trailing = [f"\nNote {i}: this works because of the loop." for i in range(self.trailing_tokens)]
+        tokens = [*opening, "def solve(xs):  # Σ xs → total\n", *body, "```", *trailing]
+        budget = params.get("max_new_tokens") or len(tokens)
+        out, text = [], ""
+        for tok in tokens[:budget]:
+            out.append(tok)
+            text += tok
+            if any(stop and text.endswith(stop) for stop in params.get("stop") or ()):
+                return out, "stop_sequence"
+        return out, "length" if len(tokens) > budget else "eos_token"
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.error_rate
+            self.errors += fail
+            return fail
+
+    def _first_token_delay(self) -> float:
+        with self._lock:
+            slow = self._rng.random() < self.slow_rate
+        return self.slow_latency if slow else self.latency
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoints
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body: Any, headers: Dict[str, str] = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if fake._should_fail():
+                    self._send_json(503, {"error": "Model is currently loading", "estimated_time": 0.01},
+                                    {"Retry-After": "0"})
+                    return
+
+                params = payload.get("parameters") or {}
+                tokens, finish_reason = fake.completion(payload.get("inputs", ""), params)
+                details = {"finish_reason": finish_reason, "generated_tokens": len(tokens)}
+                delay = 1.0 / fake.tokens_per_sec if fake.tokens_per_sec > 0 else 0.0
+                time.sleep(fake._first_token_delay())
+                if not payload.get("stream"):
+                    time.sleep(delay * len(tokens))
+                    body = {"generated_text": "".join(tokens)}
+                    if params.get("details"):
+                        body["details"] = details
+                    self._send_json(200, [body])
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for tok in tokens:
+                        event = {"token": {"text": tok, "special": False}, "generated_text": None}
+                        self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                        time.sleep(delay)
+                    final = {"token": {"text": "", "special": True}, "generated_text": "".join(tokens),
+                             "details": details if params.get("details") else None}
+                    self.wfile.write(f"data: {json.dumps(final, ensure_ascii=False)}\n\n".encode("utf-8"))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client hung up early, as a real server would notice
+
+        return Handler
+
+    def __enter__(self) -> "FakeHFServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeCollection:
+    """In-memory astrapy collection stand-in; every call costs one simulated round trip."""
+
+    def __init__(self, rtt: float = 0.02):
+        self.rtt = rtt
+        self.docs: List[Dict[str, Any]] = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        time.sleep(self.rtt)
+        with self._lock:
+            self.calls += 1
+
+    def insert_one(self, doc: Dict[str, Any]):
+        self._round_trip()
+        with self._lock:
+            self.docs.append(doc)
+
+    def insert_many(self, docs: List[Dict[str, Any]], ordered: bool = False):
+        self._round_trip()
+        with self._lock:
+            self.docs.extend(docs)
@@ -0,0 +1,378 @@
+# ==============================================
+# Benchmark suite — hot paths against local stand-ins, results as JSON
+# ==============================================
+"""Measure CodeRank's hot paths without Hugging Face or Astra credentials.
+
+    python benchmarks/run_benchmarks.py [--only call_hf,generate_all] [--quick] [--out results.json]
+
+The LLM endpoint is a local `FakeHFServer`, storage is a throwaway SQLite file (patched in
+for the case) plus `FakeCollection` for the Astra write path. Reranker cases use the
+real model and are reported as skipped when it cannot be loaded. Diff two result files
+to compare runs.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_import import measure_import  # noqa: E402
+from fakes import FakeCollection, FakeHFServer  # noqa: E402
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(1000 * statistics.fmean(ordered), 2),
+        "p50_ms": round(1000 * ordered[len(ordered) // 2], 2),
+        "p95_ms": round(1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 2),
+        "max_ms": round(1000 * ordered[-1], 2),
+    }
+
+
+@contextlib.contextmanager
+def _agents_on(urls):
+    """Point every agent style at `urls` (one URL or a replica list); the endpoint config is restored after.
+
+    HF_ENDPOINTS_<STYLE> takes precedence over HF_MODELS, so it is cleared for the run —
+    otherwise a configured environment would send benchmark traffic to real endpoints.
+    """
+    from coderank_lc.agents import lc_agents
+
+    models = {style: urls for style in lc_agents.HF_MODELS}
+    with mock.patch.object(lc_agents, "HF_MODELS", models), mock.patch.dict(lc_agents.HF_ENDPOINTS, clear=True):
+        yield
+
+
+def _timed(fn: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# ==============================================
+# Cases
+# ==============================================
+def bench_import(quick: bool) -> Dict:
+    return {m: measure_import(m) for m in ("coderank_lc.graph.graph", "coderank_lc.api.app")}
+
+
+def bench_call_hf(quick: bool) -> Dict:
+    """Requests/sec through the pooled client at several concurrency levels, with and without 503s."""
+    from coderank_lc.agents.lc_agents import call_hf
+
+    total = 60 if quick else 300
+    results = {}
+    for error_rate in (0.0, 0.1):
+        with FakeHFServer(latency=0.02, error_rate=error_rate) as server:
+            for workers in (1, 8, 32):
+                latencies = []
+
+                def _one(_):
+                    start = time.perf_counter()
+                    call_hf(server.url, "bench prompt")
+                    latencies.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(_one, range(total)))
+                elapsed = time.perf_counter() - start
+                results[f"errors={error_rate:g},workers={workers}"] = {
+                    "requests_per_sec": round(total / elapsed, 1),
+                    "server_requests": server.requests,
+                    "injected_errors": server.errors,
+                    **_summary(latencies),
+                }
+                server.requests = server.errors = 0
+    return results
+
+
+def bench_generate_all(quick: bool) -> Dict:
+    """End-to-end latency of the three agents: sequential, concurrent and streaming."""
+    from coderank_lc.agents import lc_agents
+
+    repeat = 3 if quick else 10
+    results = {}
+    with FakeHFServer(latency=0.2, tokens_per_sec=200, tokens=60) as server, _agents_on(server.url):
+        query = "Write a function that sums a list."
+        results["sequential"] = _summary(_timed(lambda: lc_agents.generate_all(query, concurrent=False), repeat))
+        results["concurrent"] = _summary(_timed(lambda: lc_agents.generate_all(query, concurrent=True), repeat))
+
+        first_chunk = []
+
+        def _streamed():
+            start = time.perf_counter()
+            seen = []
+
+            def on_chunk(chunk):
+                if not seen and chunk.delta:
+                    seen.append(True)
+                    first_chunk.append(time.perf_counter() - start)
+
+            lc_agents.generate_all(query, on_chunk=on_chunk)
+
+        results["streaming"] = _summary(_timed(_streamed, repeat))
+        results["streaming_first_chunk"] = _summary(first_chunk)
+    return results
+
+
+def _load_reranker():
+    from coderank_lc.core import reranker
+
+    try:
+        reranker.get_model()
+    except Exception as e:  # missing optional dependency or weights
+        return None, f"{type(e).__name__}: {e}"
+    return reranker, None
+
+
+def bench_score_batch(quick: bool) -> Dict:
+    """Reranker pairs/sec across batch sizes and response lengths (score cache disabled)."""
+    reranker, error = _load_reranker()
+    if reranker is None:
+        return {"skipped": error}
+
+    n_pairs = 64 if quick else 256
+    line = "    result = [x * 2 for x in values if x % 3 == 0]\n"
+    results = {"model": reranker.stats()["model"]}
+    for lines in (2, 20, 80):
+        for batch_size in (8, 32, 64, 128):
+            pairs = [("Double the multiples of three.", f"# variant {i}\n" + line * lines) for i in range(n_pairs)]
+            reranker.score_pairs(pairs[:batch_size], batch_size=batch_size)  # warm-up
+            start = time.perf_counter()
+            reranker.score_pairs(pairs, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            results[f"lines={lines},batch={batch_size}"] = {"pairs_per_sec": round(n_pairs / elapsed, 1)}
+    return results
+
+
+def bench_storage(quick: bool) -> Dict:
+    """Docs/sec for single and bulk writes: SQLite backend and the Astra write path on a fake collection."""
+    from coderank_lc.core import astra_store
+    from coderank_lc.core.sqlite_store import SQLiteStorage
+
+    n = 200 if quick else 1000
+    docs = [{"query": f"q{i % 20}", "agent": "Agent-1-concise", "text": "def f():\n    pass\n" * 10}
+            for i in range(n)]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteStorage(os.path.join(tmp, "bench.sqlite3"))
+        start = time.perf_counter()
+        for d in docs:
+            backend.store_response(d)
+        results["sqlite_single"] = {"docs_per_sec": round(n / (time.perf_counter() - start), 1)}
+        start = time.perf_counter()
+        backend.store_many("responses", docs)
+        results["sqlite_bulk"] = {"docs_per_sec": round(n / (time.perf_counter() - start), 1)}
+
+    fake = FakeCollection(rtt=0.02)
+    astra_n = n // 4  # synchronous writes pay a full round trip each
+    with mock.patch.object(astra_store, "get_collection", lambda name: fake), \
+            mock.patch.object(astra_store, "_writer", None):
+        start = time.perf_counter()
+        for d in docs[:astra_n]:
+            astra_store.store_response(dict(d))
+        results["astra_sync"] = {"docs_per_sec": round(astra_n / (time.perf_counter() - start), 1),
+                                 "round_trips": fake.calls}
+
+        fake.calls = 0
+        astra_store._writer = astra_store.WriteBehindBuffer()
+        start = time.perf_counter()
+        for d in docs:
+            astra_store.store_response(dict(d))
+        enqueued = time.perf_counter() - start
+        astra_store.flush_writes()
+        results["astra_write_behind"] = {
+            "docs_per_sec": round(n / (time.perf_counter() - start), 1),
+            "enqueue_docs_per_sec": round(n / enqueued, 1),
+            "round_trips": fake.calls,
+        }
+        astra_store._writer.close()
+    return results
+
+
+def bench_evaluation(quick: bool) -> Dict:
+    """`evaluate_reranker_alignment` end to end over seeded feedback in the local store."""
+    reranker, error = _load_reranker()
+    if reranker is None:
+        return {"skipped": error}
+    from coderank_lc.core import feedback_dataset, storage
+    from coderank_lc.core.evaluation import evaluate_reranker_alignment
+    from coderank_lc.core.sqlite_store import SQLiteStorage
+
+    n = 100 if quick else 500
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.object(storage, "_backend", SQLiteStorage(os.path.join(tmp, "eval.sqlite3"))), \
+            mock.patch.object(feedback_dataset, "FEEDBACK_SOURCE", "storage"):  # not a local snapshot
+        storage.store_many("feedback", [{
+            "query": f"Task {i % 50}: reverse a string",
+            "agent_a": "Agent-1-concise", "text_a": f"def rev(s):\n    return s[::-1]  # {i}",
+            "agent_b": "Agent-2-explainer", "text_b": f"print('todo {i}')",
+            "preferred": "A",
+        } for i in range(n)])
+        start = time.perf_counter()
+        evaluate_reranker_alignment(limit=n)
+        elapsed = time.perf_counter() - start
+    return {"feedback_rows": n, "seconds": round(elapsed, 3), "rows_per_sec": round(n / elapsed, 1)}
+
+
+def bench_endpoint_pool(quick: bool) -> Dict:
+    """Tail latency of `generate_all` with replicas that stall 3% of the time: one endpoint vs. a hedged pool."""
+    from coderank_lc.agents import endpoint_pool, lc_agents
+
+    repeat = 40 if quick else 200
+    query = "Write a function that sums a list."
+    results = {}
+    servers = [FakeHFServer(latency=0.05, slow_rate=0.03, slow_latency=1.5, seed=i) for i in range(3)]
+    for server in servers:
+        server.__enter__()
+    try:
+        for label, urls in (("single", servers[:1]), ("pool_of_3", servers)):
+            with _agents_on([s.url for s in urls]):
+                # Seed the latency window so the hedge delay reflects the replicas' real p95
+                for _ in range(endpoint_pool.HEDGE_MIN_SAMPLES):
+                    lc_agents.generate_all(query, concurrent=True)
+                results[label] = _summary(_timed(lambda: lc_agents.generate_all(query, concurrent=True), repeat))
+                results[label]["pools"] = endpoint_pool.stats()
+            endpoint_pool._pools.clear()
+    finally:
+        for server in servers:
+            server.__exit__(None, None, None)
+    return results
+
+
+def bench_generation_budget(quick: bool) -> Dict:
+    """`generate_all` with per-style profiles (fence stop sequence, code-only) vs. the old flat 900-token profile.
+
+    The fake model keeps writing prose after its code block, like the real one does.
+    """
+    from coderank_lc.agents import generation_profiles, lc_agents
+
+    repeat = 3 if quick else 10
+    query = "Write a function that sums a list."
+    code_profiles = dict(generation_profiles.PROFILES)
+    flat = {style: generation_profiles.DEFAULT_PROFILE for style in code_profiles}
+    results = {}
+    with FakeHFServer(latency=0.05, tokens_per_sec=400, tokens=40, trailing_tokens=200) as server, \
+            _agents_on(server.url):
+        try:
+            for label, profiles in (("flat_900", flat), ("profiles", code_profiles)):
+                generation_profiles.PROFILES.clear()
+                generation_profiles.PROFILES.update(profiles)
+                for mode, on_chunk in (("call", None), ("stream", lambda chunk: None)):
+                    generation_profiles.TOKEN_USAGE.reset()
+                    samples = _timed(lambda: lc_agents.generate_all(query, concurrent=True, on_chunk=on_chunk), repeat)
+                    usage = generation_profiles.usage()
+                    results[f"{label},{mode}"] = {
+                        **_summary(samples),
+                        "tokens_per_call": round(sum(u["tokens"] for u in usage.values())
+                                                 / max(1, sum(u["calls"] for u in usage.values())), 1),
+                        "usage": usage,
+                    }
+        finally:
+            generation_profiles.PROFILES.clear()
+            generation_profiles.PROFILES.update(code_profiles)
+    return results
+
+
+CASES = {
+    "import": bench_import,
+    "call_hf": bench_call_hf,
+    "generate_all": bench_generate_all,
+    "endpoint_pool": bench_endpoint_pool,
+    "generation_budget": bench_generation_budget,
+    "score_batch": bench_score_batch,
+    "storage": bench_storage,
+    "evaluation": bench_evaluation,
+}
+
+
+def _configure_env(tmp: str):
+    """Point every setting at local stand-ins; must run before any coderank_lc import."""
+    os.environ.update({
+        "HF_API_TOKEN": "benchmark",
+        "GEN_CACHE_ENABLED": "0",
+        "SEMANTIC_CACHE_ENABLED": "0",
+        "HTTP_BACKOFF_BASE": "0.01",
+        "HTTP_BACKOFF_MAX": "0.05",
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(tmp, "coderank.sqlite3"),
+        "FEEDBACK_SOURCE": "storage",
+        "WATERMARK_DIR": os.path.join(tmp, "watermarks"),
+        "RERANKER_SCORE_CACHE_SIZE": "0",
+        "RERANKER_MICROBATCH": "0",
+        "RERANKER_SERVICE_URL": "",
+        "RERANKER_WATCH_INTERVAL": "0",
+    })
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=ROOT).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", default="", help="comma-separated cases: " + ",".join(CASES))
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    parser.add_argument("--out", default="", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    selected = [c for c in args.only.split(",") if c] or list(CASES)
+    unknown = set(selected) - set(CASES)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _configure_env(tmp)
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "quick": args.quick,
+            },
+            "results": {},
+        }
+        for name in selected:
+            print(f"⏱️ {name}...", file=sys.stderr)
+            start = time.perf_counter()
+            # The pipeline logs to stdout; keep stdout for the JSON report
+            with contextlib.redirect_stdout(sys.stderr):
+                report["results"][name] = CASES[name](args.quick)
+            report["results"][name]["case_seconds"] = round(time.perf_counter() - start, 2)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
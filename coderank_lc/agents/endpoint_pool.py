@@ -0,0 +1,326 @@
+# ==============================================
+# Endpoint Pool — replicas per agent style with circuit breaking and hedging
+# ==============================================
+"""Spread an agent's requests over several inference endpoint replicas.
+
+Each `Endpoint` has a concurrency limit (ENDPOINT_MAX_CONCURRENCY) and a circuit
+breaker: after ENDPOINT_FAILURE_THRESHOLD consecutive failures it is skipped for
+ENDPOINT_COOLDOWN seconds, then a single probe request decides whether it closes again.
+`EndpointPool.call` sends the request to the least-loaded healthy replica. If that
+replica has not answered after the pool's recent p95 latency (HEDGE_QUANTILE), a
+duplicate goes to a second replica and the first answer wins. A replica that fails
+outright is replaced immediately by the next one.
+
+Replicas come from HF_ENDPOINTS_<STYLE> (comma-separated URLs) or from `HF_MODELS`.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, TypeVar
+
+from coderank_lc.core import metrics
+from coderank_lc.core.http_client import EndpointError
+from coderank_lc.core.settings import (
+    ENDPOINT_MAX_CONCURRENCY,
+    ENDPOINT_FAILURE_THRESHOLD,
+    ENDPOINT_COOLDOWN,
+    HEDGE_ENABLED,
+    HEDGE_QUANTILE,
+    HEDGE_MIN_DELAY,
+    HEDGE_INITIAL_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HF_REQUEST_TIMEOUT,
+)
+
+T = TypeVar("T")
+
+
+def _endpoint_fault(error: BaseException) -> bool:
+    """Whether a failure says something about the replica (vs. a bad request every replica would reject)."""
+    return not isinstance(error, EndpointError) or error.retryable
+
+
+class Slot(NamedTuple):
+    """One acquisition of an endpoint slot; `release` records its outcome."""
+    endpoint: "Endpoint"
+    probe: bool  # the single half-open probe that decides whether the breaker closes
+    epoch: int  # breaker openings seen when acquired; older slots no longer move the breaker
+
+    @property
+    def url(self) -> str:
+        return self.endpoint.url
+
+    def release(self, ok: Optional[bool], latency: Optional[float] = None):
+        self.endpoint.release(self, ok, latency)
+
+
+class Endpoint:
+    """One replica: concurrency slots, recent latencies and circuit-breaker state."""
+
+    def __init__(
+        self,
+        url: str,
+        max_concurrency: int = ENDPOINT_MAX_CONCURRENCY,
+        failure_threshold: int = ENDPOINT_FAILURE_THRESHOLD,
+        cooldown: float = ENDPOINT_COOLDOWN,
+    ):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latencies: "deque[float]" = deque(maxlen=256)  # seconds, successful calls only
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self._failures = 0  # consecutive
+        self._opened_at: Optional[float] = None
+        self._epoch = 0  # bumped every time the breaker opens
+        self._probing = False
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self._opened_at < self.cooldown else "half_open"
+
+    def load(self) -> float:
+        return self.in_flight / self.max_concurrency
+
+    def p50(self) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 2] if ordered else 0.0
+
+    def try_acquire(self, timeout: Optional[float] = None) -> Optional[Slot]:
+        """Take a slot if the breaker allows it; waits up to `timeout` for a free slot (None = don't wait)."""
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._probing):
+                return None
+            probe = state == "half_open"
+            self._probing = self._probing or probe
+            epoch = self._epoch
+        if not self._slots.acquire(blocking=timeout is not None, timeout=timeout):
+            if probe:
+                with self._lock:
+                    self._probing = False
+            return None
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+        return Slot(self, probe, epoch)
+
+    def release(self, slot: Slot, ok: Optional[bool], latency: Optional[float] = None):
+        """Return `slot` and record the outcome; `ok=None` records nothing (not the replica's fault).
+
+        Only the probe and requests started since the breaker last opened move the breaker;
+        a request that began before it opened just updates the counters.
+        """
+        opened = False
+        with self._lock:
+            self.in_flight -= 1
+            if slot.probe:
+                self._probing = False
+            current = slot.probe or slot.epoch == self._epoch
+            if ok:
+                if latency is not None:
+                    self.latencies.append(latency)
+                if current:
+                    self._failures = 0
+                    self._opened_at = None
+            elif ok is not None:
+                self.errors += 1
+                if current:
+                    self._failures += 1
+                    if slot.probe or (self._opened_at is None and self._failures >= self.failure_threshold):
+                        opened = True
+                        self._opened_at = time.monotonic()
+                        self._epoch += 1
+        self._slots.release()
+        if opened:
+            metrics.inc("endpoint_breaker_open_total", url=self.url)
+            print(f"🔌 Circuit open for {self.url} ({self._failures} consecutive failures) — skipping {self.cooldown:g}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": round(1000 * self.p50(), 1),
+        }
+
+
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="coderank-endpoint")
+
+
+class EndpointPool:
+    """Replicas serving one agent style; `call` routes, hedges and fails over."""
+
+    def __init__(self, name: str, urls: Sequence[str], hedge: bool = HEDGE_ENABLED, **endpoint_kwargs):
+        if not urls:
+            raise ValueError(f"Endpoint pool '{name}' needs at least one URL")
+        self.name = name
+        self.endpoints = [Endpoint(u, **endpoint_kwargs) for u in dict.fromkeys(urls)]
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def urls(self) -> List[str]:
+        return [e.url for e in self.endpoints]
+
+    @property
+    def retries_per_endpoint(self) -> Optional[int]:
+        """With replicas to fail over to, retrying the same one only delays the answer."""
+        return 0 if len(self.endpoints) > 1 else None
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait on a request before hedging: the pool's recent HEDGE_QUANTILE latency."""
+        samples = sorted(s for e in self.endpoints for s in e.latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_INITIAL_DELAY
+        return max(HEDGE_MIN_DELAY, samples[min(len(samples) - 1, int(HEDGE_QUANTILE * len(samples)))])
+
+    def _acquire(self, tried: Set[str], wait_for_slot: bool) -> Optional[Slot]:
+        """Slot on the least-loaded untried replica; with `wait_for_slot`, queue on one if all are busy."""
+        candidates = sorted((e for e in self.endpoints if e.url not in tried), key=lambda e: (e.load(), e.p50()))
+        for endpoint in candidates:
+            slot = endpoint.try_acquire()
+            if slot is not None:
+                tried.add(endpoint.url)
+                return slot
+        if wait_for_slot:
+            for endpoint in candidates:
+                slot = endpoint.try_acquire(timeout=HF_REQUEST_TIMEOUT) if endpoint.state == "closed" else None
+                if slot is not None:
+                    tried.add(endpoint.url)
+                    return slot
+        return None
+
+    def _no_endpoint(self) -> EndpointError:
+        return EndpointError(
+            f"pool:{self.name}",
+            f"all {len(self.endpoints)} endpoint(s) unavailable (circuit open or saturated)",
+            attempts=0,
+            retryable=True,
+        )
+
+    def _submit(self, slot: Slot, fn: Callable[[str, Optional[int]], T]) -> "Future[T]":
+        retries = self.retries_per_endpoint
+
+        def _run() -> T:
+            start = time.perf_counter()
+            try:
+                result = fn(slot.url, retries)
+            except BaseException as e:
+                slot.release(False if _endpoint_fault(e) else None)
+                raise
+            slot.release(True, time.perf_counter() - start)
+            return result
+
+        return _executor.submit(_run)
+
+    def call(self, fn: Callable[[str, Optional[int]], T]) -> T:
+        """Run `fn(url, max_retries)` on the pool and return the first successful result.
+
+        Raises the last replica's error if every replica failed, or an `EndpointError`
+        right away if none is available.
+        """
+        tried: Set[str] = set()
+        first = self._acquire(tried, wait_for_slot=True)
+        if first is None:
+            raise self._no_endpoint()
+        in_flight: Dict[Future, Slot] = {self._submit(first, fn): first}
+        hedge_at = time.monotonic() + self.hedge_delay() if self.hedge else None
+        last_error: Optional[BaseException] = None
+
+        while in_flight:
+            timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Hedge timer fired: duplicate onto a second replica if one has a free slot right now
+                hedge_at = None
+                backup = self._acquire(tried, wait_for_slot=False)
+                if backup is not None:
+                    self.hedges += 1
+                    metrics.inc("endpoint_hedges_total", pool=self.name)
+                    in_flight[self._submit(backup, fn)] = backup
+                continue
+
+            for future in done:
+                slot = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if not _endpoint_fault(e):
+                        raise
+                    last_error = e
+                    print(f"⚠️ {slot.url} failed ({e})")
+                    continue
+                if slot is not first:
+                    self.hedge_wins += 1
+                    metrics.inc("endpoint_hedge_wins_total", pool=self.name)
+                return result  # a slower duplicate finishes in the background and only updates stats
+
+            if not in_flight:
+                failover = self._acquire(tried, wait_for_slot=True)
+                if failover is not None:
+                    in_flight[self._submit(failover, fn)] = failover
+                    first = failover
+                    hedge_at = time.monotonic() + self.hedge_delay() if self.hedge else None
+
+        raise last_error or self._no_endpoint()
+
+    @contextmanager
+    def lease(self) -> Iterator[str]:
+        """Hold a slot on the best replica for a streaming call (no hedging or mid-stream failover)."""
+        slot = self._acquire(set(), wait_for_slot=True)
+        if slot is None:
+            raise self._no_endpoint()
+        outcome: Optional[bool] = True
+        try:
+            yield slot.url
+        except GeneratorExit:
+            raise  # the consumer stopped reading; says nothing about the replica
+        except BaseException as e:
+            outcome = False if _endpoint_fault(e) else None
+            raise
+        finally:
+            slot.release(outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedge_delay_ms": round(1000 * self.hedge_delay(), 1) if self.hedge else None,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "endpoints": [e.stats() for e in self.endpoints],
+        }
+
+
+# ==============================================
+# Process-wide pools, one per (style, replica list)
+# ==============================================
+_pools: Dict[Tuple[str, Tuple[str, ...]], EndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(style: str, urls: Sequence[str]) -> EndpointPool:
+    """The shared pool for `style`; a changed replica list gets a fresh pool."""
+    key = (style, tuple(urls))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = EndpointPool(style, urls)
+    return pool
+
+
+def stats() -> Dict[str, Any]:
+    return {f"{style}": pool.stats() for (style, _), pool in list(_pools.items())}
@@ -0,0 +1,208 @@
+# ==============================================
+# Generation Profiles — per-style budgets, stop sequences and code extraction
+# ==============================================
+"""How much each agent style may generate, and where it should stop.
+
+Every style asks for exactly one code block, so the prompt is prefilled with the opening
+fence and the closing fence is a stop sequence: the endpoint stops right after the code
+instead of running on to `max_new_tokens`. When streaming, `CodeBlockStream` closes the
+connection as soon as the block is complete, and `extract_code` trims whatever still slips
+through. `TokenUsage` keeps per-agent token counts and an estimate of the decode time saved.
+"""
+
+import re
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from coderank_lc.core import metrics
+from coderank_lc.core.settings import GEN_CODE_ONLY, GEN_MAX_TOKENS
+
+FENCE = "```"
+_OPENING_FENCE = re.compile(r"```[^\n`]*\n")
+
+
+class GenerationProfile(NamedTuple):
+    max_new_tokens: int
+    temperature: float
+    stop: Tuple[str, ...] = ()
+    prefill: str = ""  # appended to the prompt, e.g. an opening fence so generation starts inside the block
+    extract_code: bool = False  # return only the code of the (first) code block
+
+    def parameters(self) -> Dict[str, Any]:
+        params = {
+            "max_new_tokens": self.max_new_tokens,
+            "temperature": self.temperature,
+            "return_full_text": False,
+            "details": True,  # generated_tokens + finish_reason, for usage tracking
+        }
+        if self.stop:
+            params["stop"] = list(self.stop)
+        return params
+
+
+# Parameters every call used before profiles existed; still the default for non-agent calls
+DEFAULT_PROFILE = GenerationProfile(max_new_tokens=900, temperature=0.35)
+
+
+def _code_profile(style: str, temperature: float) -> GenerationProfile:
+    if not GEN_CODE_ONLY:
+        return DEFAULT_PROFILE._replace(max_new_tokens=GEN_MAX_TOKENS[style])
+    return GenerationProfile(
+        max_new_tokens=GEN_MAX_TOKENS[style],
+        temperature=temperature,
+        stop=(FENCE,),
+        prefill=f"{FENCE}python\n",
+        extract_code=True,
+    )
+
+
+PROFILES: Dict[str, GenerationProfile] = {
+    "concise": _code_profile("concise", 0.2),
+    "explainer": _code_profile("explainer", 0.35),
+    "optimizer": _code_profile("optimizer", 0.3),
+}
+
+
+def get_profile(style: str) -> GenerationProfile:
+    return PROFILES.get(style, DEFAULT_PROFILE)
+
+
+# ==============================================
+# Code extraction
+# ==============================================
+def extract_code(text: str, prefilled: bool = True) -> str:
+    """The code of the first fenced block; with `prefilled`, `text` already starts inside the block."""
+    if prefilled and not text.lstrip().startswith(FENCE):
+        return text.split(FENCE, 1)[0].strip()
+    # No prefill, or the model re-opened the block itself
+    match = _OPENING_FENCE.search(text)
+    if match is None:
+        # A lone fence (e.g. cut off by the fence stop sequence) holds no code yet; no fence at all is bare code
+        return "" if FENCE in text else text.strip()
+    return text[match.end():].split(FENCE, 1)[0].strip()
+
+
+class CodeBlockStream:
+    """Incremental `extract_code` for streamed deltas: `feed` returns the code text that is safe to emit.
+
+    `done` turns True once the closing fence arrives; the caller then stops reading. Trailing
+    backticks and whitespace are held back until it is clear whether a fence follows, so the
+    joined output equals `extract_code` of the same text.
+    """
+
+    def __init__(self, prefilled: bool = True):
+        self.text = ""
+        self.start: Optional[int] = 0 if prefilled else None  # where the code begins
+        self.emitted = 0
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        if self.done:
+            return ""
+        self.text += delta
+        if not self._locate():
+            return ""
+        end = self.text.find(FENCE, self.emitted)
+        if end != -1:
+            self.done = True
+            return self._emit(len(self.text[:end].rstrip()))
+        return self._emit(len(self.text.rstrip("` \t\r\n")))
+
+    def finish(self) -> str:
+        """Flush held-back text when the stream ends without a closing fence (e.g. budget reached)."""
+        if self.done:
+            return ""
+        self.done = True
+        if not self._locate(final=True):
+            return ""
+        return self._emit(len(self.text.rstrip()))
+
+    def _locate(self, final: bool = False) -> bool:
+        """Find where the code starts; False while that is unclear (or, at the end, if no code began)."""
+        if self.start is not None and self.emitted == self.start:
+            head = self.text[self.start:].lstrip()
+            if head.startswith(FENCE):
+                self.start = None  # the model re-opened the block despite the prefill
+            elif not head.strip("`"):
+                return False  # only whitespace/backticks so far: could still be a re-opened fence
+        if self.start is None:
+            match = _OPENING_FENCE.search(self.text)
+            if match is not None:
+                self.start = self.emitted = match.end()
+            elif final and FENCE not in self.text:
+                self.start = self.emitted = 0  # no fence at all: bare code
+            else:
+                return False
+        if self.emitted == self.start:  # nothing emitted yet: skip leading whitespace
+            self.start = self.emitted = len(self.text) - len(self.text[self.start:].lstrip())
+        return True
+
+    def _emit(self, end: int) -> str:
+        if end <= self.emitted:
+            return ""
+        out, self.emitted = self.text[self.emitted:end], end
+        return out
+
+
+# ==============================================
+# Token usage per agent
+# ==============================================
+EARLY_STOPS = ("stop_sequence", "client_stop")
+
+
+class TokenUsage:
+    """Per-agent generation counters: tokens, stop reasons and the decode time early stops saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents: Dict[str, Dict[str, float]] = {}
+
+    def record(self, agent: str, tokens: int, budget: int, finish_reason: str, seconds: float):
+        early = finish_reason in EARLY_STOPS
+        with self._lock:
+            row = self._agents.setdefault(agent, {
+                "calls": 0, "tokens": 0, "seconds": 0.0, "early_stops": 0,
+                "budget_hits": 0, "tokens_saved": 0, "trimmed_chars": 0,
+            })
+            row["calls"] += 1
+            row["tokens"] += tokens
+            row["seconds"] += seconds
+            row["early_stops"] += early
+            row["budget_hits"] += finish_reason == "length"
+            if early:
+                row["tokens_saved"] += max(0, budget - tokens)
+        metrics.inc("agent_tokens_total", tokens, agent=agent)
+        metrics.inc("agent_finish_total", agent=agent, reason=finish_reason or "unknown")
+
+    def record_trim(self, agent: str, chars: int):
+        with self._lock:
+            if agent in self._agents:
+                self._agents[agent]["trimmed_chars"] += chars
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Counters per agent plus `est_seconds_saved`: tokens not generated at the agent's decode rate.
+
+        The saving is measured against running to the full budget, so it is an upper bound.
+        """
+        with self._lock:
+            out = {}
+            for agent, row in self._agents.items():
+                rate = row["tokens"] / row["seconds"] if row["seconds"] > 0 else 0.0
+                out[agent] = {
+                    **row,
+                    "mean_tokens": round(row["tokens"] / row["calls"], 1) if row["calls"] else 0.0,
+                    "tokens_per_sec": round(rate, 1),
+                    "est_seconds_saved": round(row["tokens_saved"] / rate, 2) if rate else 0.0,
+                }
+            return out
+
+    def reset(self):
+        with self._lock:
+            self._agents.clear()
+
+
+TOKEN_USAGE = TokenUsage()
+
+
+def usage() -> Dict[str, Dict[str, float]]:
+    return TOKEN_USAGE.snapshot()
@@ -1,11 +1,32 @@
-from typing import Dict
-from langchain.schema.runnable import Runnable, RunnableLambda
+import json
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set
+from langchain_core.runnables import Runnable, RunnableLambda
+from coderank_lc.core import metrics
 from coderank_lc.core.prompts import CONCISE_FIXER, EXPLAINER, OPTIMIZER
-import requests, os
-from dotenv import load_dotenv
-
-# Load environment variables early
-load_dotenv()
+from coderank_lc.core.http_client import EndpointError, get_http_client
+from coderank_lc.agents.endpoint_pool import get_pool
+from coderank_lc.agents.generation_cache import cache_key, get_generation_cache
+from coderank_lc.agents.generation_profiles import (
+    DEFAULT_PROFILE,
+    TOKEN_USAGE,
+    CodeBlockStream,
+    GenerationProfile,
+    extract_code,
+    get_profile,
+)
+from coderank_lc.core.settings import (
+    HF_API_URL,
+    HF_API_TOKEN as _HF_API_TOKEN,
+    HF_REQUEST_TIMEOUT,
+    HF_ENDPOINTS,
+    AGENT_CONCURRENT,
+    AGENT_MAX_CONCURRENCY,
+    AGENT_TIMEOUT,
+    GEN_CACHE_ENABLED,
+)
 
 # Hugging Face model endpoints (using one model for all three)
 HF_MODELS = {
@@ -14,7 +35,12 @@ HF_MODELS = {
     "optimizer": "https://xiiukibz8hcuvjog.us-east-1.aws.endpoints.huggingface.cloud",
 }
 
-HF_API_TOKEN = os.getenv("HF_API_TOKEN", "").strip()
+# HF_API_URL points every agent at one endpoint (e.g. a local stub server for testing).
+# Values may also be lists of replica URLs; HF_ENDPOINTS_<STYLE> takes precedence when set.
+if HF_API_URL:
+    HF_MODELS = {style: HF_API_URL for style in HF_MODELS}
+
+HF_API_TOKEN = _HF_API_TOKEN.strip()
 
 
 def _mock(style: str) -> str:
@@ -28,52 +54,248 @@ def _mock(style: str) -> str:
     return "# Mock: generic response"
 
 
-def call_hf(model_url: str, prompt: str) -> str:
-    """Generic HF Inference API call."""
-    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"} if HF_API_TOKEN else {}
+def _headers() -> Dict[str, str]:
+    return {"Authorization": f"Bearer {HF_API_TOKEN}"} if HF_API_TOKEN else {}
+
+
+def _payload(prompt: str, profile: GenerationProfile = DEFAULT_PROFILE, stream: bool = False) -> Dict:
     payload = {
         "inputs": f"{prompt}",
-        "parameters": {
-            "max_new_tokens": 900,  # Increased for longer code + explanation
-            "temperature": 0.35,
-            "return_full_text": False,
-        },
+        "parameters": profile.parameters(),
     }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _parse_generated(model_url: str, r) -> str:
     try:
-        print(f"\n🚀 Calling model → {model_url}")
-        r = requests.post(model_url, headers=headers, json=payload, timeout=120)
-        r.raise_for_status()
         data = r.json()
+    except ValueError as e:
+        raise EndpointError(model_url, f"Invalid JSON response: {e}", status=r.status_code)
 
-        # Handle Hugging Face response formats
-        if isinstance(data, list) and len(data) > 0 and "generated_text" in data[0]:
-            return data[0]["generated_text"].strip()
-        elif isinstance(data, dict) and "generated_text" in data:
-            return data["generated_text"].strip()
-        else:
-            return str(data)
-    except Exception as e:
-        return f"# [Error calling {model_url}: {e}]"
+    # Handle Hugging Face response formats
+    if isinstance(data, list) and len(data) > 0 and "generated_text" in data[0]:
+        return data[0]["generated_text"].strip()
+    elif isinstance(data, dict) and "generated_text" in data:
+        return data["generated_text"].strip()
+    elif isinstance(data, dict) and "error" in data:
+        raise EndpointError(model_url, str(data["error"]), status=r.status_code)
+    else:
+        return str(data)
 
 
-def make_agent(style: str) -> Runnable:
-    """Return a LangChain Runnable for the given style."""
-    def _call(query: str) -> str:
-        # Handle both dict and string model configs
-        model_cfg = HF_MODELS.get(style, HF_MODELS["concise"])
-        model_url = model_cfg if isinstance(model_cfg, str) else model_cfg.get("url")
+def _generation_details(r) -> Dict:
+    """Token count and finish reason from a TGI `details` block, when the endpoint returns one."""
+    try:
+        data = r.json()
+    except ValueError:
+        return {}
+    item = data[0] if isinstance(data, list) and data else data
+    details = item.get("details") if isinstance(item, dict) else None
+    if isinstance(details, dict) and "generated_tokens" in details:
+        return {"tokens": int(details["generated_tokens"]), "finish_reason": str(details.get("finish_reason", ""))}
+    return {}
+
+
+def call_hf(
+    model_url: str,
+    prompt: str,
+    timeout: float = HF_REQUEST_TIMEOUT,
+    agent: str = "",
+    max_retries: Optional[int] = None,
+    profile: GenerationProfile = DEFAULT_PROFILE,
+) -> str:
+    """Generic HF Inference API call over the shared pooled client.
+
+    Transient failures (connection errors, 429/5xx cold starts) are retried with backoff
+    (`max_retries` overrides HTTP_MAX_RETRIES); anything that still fails raises a
+    structured `EndpointError`. `profile` sets the token budget, temperature and stop sequences.
+    """
+    print(f"\n🚀 Calling model → {model_url}")
+    with metrics.span("agent_call", agent=agent or "-", mode="call") as attrs:
+        start = time.perf_counter()
+        r = get_http_client().post_json(
+            model_url, _payload(prompt, profile), headers=_headers(), timeout=timeout, max_retries=max_retries
+        )
+        text = _parse_generated(model_url, r)
+        details = _generation_details(r)
+        if agent and details:
+            TOKEN_USAGE.record(agent, details["tokens"], profile.max_new_tokens, details["finish_reason"],
+                               time.perf_counter() - start)
+        if metrics.enabled():
+            attrs.update(bytes=len(r.content), retries=getattr(r, "attempts", 1) - 1, **details)
+    return text
+
+
+def stream_hf(
+    model_url: str,
+    prompt: str,
+    timeout: float = HF_REQUEST_TIMEOUT,
+    agent: str = "",
+    profile: GenerationProfile = DEFAULT_PROFILE,
+) -> Iterator[str]:
+    """Stream generated text from a TGI-style endpoint's server-sent events, one token at a time.
+
+    Endpoints that ignore `stream` and answer with plain JSON yield their whole completion at once.
+    Closing the generator early closes the connection, which stops generation server-side.
+    """
+    print(f"\n📡 Streaming from model → {model_url}")
+    with metrics.span("agent_call", agent=agent or "-", mode="stream") as attrs:
+        start = time.perf_counter()
+        r = get_http_client().post_json(
+            model_url, _payload(prompt, profile, stream=True), headers=_headers(), timeout=timeout, stream=True
+        )
+        attrs["retries"] = getattr(r, "attempts", 1) - 1
+        tokens = size = 0
+        finish_reason = ""
+        try:
+            if "text/event-stream" not in r.headers.get("Content-Type", ""):
+                text = _parse_generated(model_url, r)
+                details = _generation_details(r)
+                tokens, finish_reason = details.get("tokens", 0), details.get("finish_reason", "")
+                attrs["bytes"] = len(r.content)
+                yield text
+                return
+
+            r.encoding = "utf-8"  # SSE is always UTF-8; requests would guess ISO-8859-1 for a bare text/* type
+            for line in r.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                size += len(line)
+                data = json.loads(line[len("data:"):].strip())
+                if "error" in data:
+                    raise EndpointError(model_url, str(data["error"]), status=r.status_code)
+                if isinstance(data.get("details"), dict):
+                    finish_reason = str(data["details"].get("finish_reason", ""))
+                token = data.get("token") or {}
+                if token.get("special"):
+                    continue
+                if token.get("text"):
+                    if not tokens:
+                        attrs["first_token_ms"] = (time.perf_counter() - start) * 1000
+                    tokens += 1
+                    yield token["text"]
+        except GeneratorExit:
+            finish_reason = "client_stop"  # e.g. the code block closed; no need to pay for more tokens
+            raise
+        finally:
+            r.close()
+            if tokens:
+                attrs.update(tokens=tokens, bytes=size)
+                if agent:
+                    TOKEN_USAGE.record(agent, tokens, profile.max_new_tokens, finish_reason,
+                                       time.perf_counter() - start)
 
-        # Select appropriate prompt
-        prompt = {
-            "concise": CONCISE_FIXER,
-            "explainer": EXPLAINER,
-            "optimizer": OPTIMIZER,
-        }.get(style, CONCISE_FIXER).format(query=query)
+
+def _model_urls(style: str) -> List[str]:
+    """Replica URLs for `style`: HF_ENDPOINTS_<STYLE>, else its `HF_MODELS` entry."""
+    if HF_ENDPOINTS.get(style) and not HF_API_URL:
+        return list(HF_ENDPOINTS[style])
+    # Handle string, list and dict model configs
+    model_cfg = HF_MODELS.get(style, HF_MODELS["concise"])
+    if isinstance(model_cfg, str):
+        return [model_cfg]
+    if isinstance(model_cfg, dict):
+        urls = model_cfg.get("urls") or [model_cfg.get("url")]
+        return [u for u in urls if u]
+    return list(model_cfg)
+
+
+def _model_url(style: str) -> Optional[str]:
+    # Replicas serve the same model, so the first one names it (e.g. in generation-cache keys)
+    urls = _model_urls(style)
+    return urls[0] if urls else None
+
+
+def _call_pool(style: str, prompt: str, profile: GenerationProfile) -> str:
+    """Blocking generation on the style's endpoint pool (least-loaded replica, hedged, with failover)."""
+    pool = get_pool(style, _model_urls(style))
+    return pool.call(lambda url, retries: call_hf(url, prompt, agent=style, max_retries=retries, profile=profile))
+
+
+def _stream_pool(style: str, prompt: str, profile: GenerationProfile) -> Iterator[str]:
+    pool = get_pool(style, _model_urls(style))
+    with pool.lease() as url:
+        yield from stream_hf(url, prompt, agent=style, profile=profile)
+
+
+def _generate(style: str, prompt: str) -> str:
+    """One completion for `style`, trimmed to its code block when the profile asks for it."""
+    profile = get_profile(style)
+    raw = _call_pool(style, prompt, profile)
+    if not profile.extract_code:
+        return raw
+    code = extract_code(raw, prefilled=bool(profile.prefill))
+    if not code and profile.stop:
+        # A model that re-opens the block trips the fence stop sequence before writing any code
+        print(f"⚠️ Agent '{style}' stopped before any code — retrying without stop sequences")
+        raw = _call_pool(style, prompt, profile._replace(stop=()))
+        code = extract_code(raw, prefilled=bool(profile.prefill))
+    TOKEN_USAGE.record_trim(style, len(raw) - len(code))
+    return code
+
+
+def _stream_generate(style: str, prompt: str) -> Iterator[str]:
+    """Streaming `_generate`: yields code deltas and hangs up as soon as the code block closes."""
+    profile = get_profile(style)
+    if not profile.extract_code:
+        yield from _stream_pool(style, prompt, profile)
+        return
+    for attempt in (profile, profile._replace(stop=())):
+        block = CodeBlockStream(prefilled=bool(attempt.prefill))
+        emitted = False
+        raw = _stream_pool(style, prompt, attempt)
+        try:
+            for delta in raw:
+                code = block.feed(delta)
+                if code:
+                    emitted = True
+                    yield code
+                if block.done:
+                    break
+            tail = block.finish()
+            if tail:
+                emitted = True
+                yield tail
+        finally:
+            raw.close()
+        TOKEN_USAGE.record_trim(style, max(0, len(block.text) - block.emitted))
+        if emitted or not attempt.stop:
+            return
+        print(f"⚠️ Agent '{style}' stopped before any code — retrying without stop sequences")
+
+
+def _render_prompt(style: str, query: str) -> str:
+    # Select appropriate prompt; the profile may prefill the start of the answer (the opening fence)
+    return {
+        "concise": CONCISE_FIXER,
+        "explainer": EXPLAINER,
+        "optimizer": OPTIMIZER,
+    }.get(style, CONCISE_FIXER).format(query=query) + get_profile(style).prefill
+
+
+def make_agent(style: str, use_cache: bool = GEN_CACHE_ENABLED) -> Runnable:
+    """Return a LangChain Runnable for the given style.
+
+    With `use_cache`, completions are served from / written to the generation cache;
+    pass `use_cache=False` to force fresh sampling.
+    """
+    def _call(query: str) -> str:
+        model_url = _model_url(style)
+        prompt = _render_prompt(style, query)
 
         if HF_API_TOKEN and model_url:
-            result = call_hf(model_url, prompt)
-            if result.startswith("# [Error"):
-                print(result)
+            if not use_cache:
+                return _generate(style, prompt)
+            cache = get_generation_cache()
+            key = cache_key(model_url, prompt, get_profile(style).parameters())
+            cached = cache.get(key)
+            if cached is not None:
+                print(f"💾 Generation cache hit for agent '{style}'")
+                return cached
+            result = _generate(style, prompt)
+            cache.put(key, result)
             return result
         else:
             print("⚠️ No valid token or model URL — using mock response.")
@@ -81,16 +303,207 @@ def make_agent(style: str) -> Runnable:
     return RunnableLambda(_call)
 
 
-def generate_all(query: str, styles=("concise", "explainer", "optimizer")) -> Dict[str, str]:
-    """Generate responses from all configured agents."""
-    agents = {s: make_agent(s) for s in styles}
-    results = {}
-    print("🔍 HF token loaded:", bool(HF_API_TOKEN))
+def stream_agent(style: str, query: str, use_cache: bool = GEN_CACHE_ENABLED) -> Iterator[str]:
+    """Streaming counterpart of `make_agent(style).invoke(query)`: yields text chunks as they arrive."""
+    model_url = _model_url(style)
+    prompt = _render_prompt(style, query)
+
+    if HF_API_TOKEN and model_url:
+        if not use_cache:
+            yield from _stream_generate(style, prompt)
+            return
+        cache = get_generation_cache()
+        key = cache_key(model_url, prompt, get_profile(style).parameters())
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"💾 Generation cache hit for agent '{style}'")
+            yield cached
+            return
+        parts = []
+        for delta in _stream_generate(style, prompt):
+            parts.append(delta)
+            yield delta
+        # Only complete streams reach this point; abandoned or failed ones are never cached
+        cache.put(key, "".join(parts).strip())
+    else:
+        print("⚠️ No valid token or model URL — using mock response.")
+        yield _mock(style)
+
+
+def _failure_text(style: str, error: Exception) -> str:
+    """Log a failed agent call (structured when possible) and return its placeholder response."""
+    if isinstance(error, EndpointError):
+        print(f"⚠️ Agent '{style}' endpoint error: {error.to_dict()}")
+    else:
+        print(f"⚠️ Agent '{style}' failed: {error}")
+    return f"# [Agent {style} failed: {error}]"
 
+
+def _generate_sequential(query: str, styles: Sequence[str], agents: Dict[str, Runnable]) -> Dict[str, str]:
+    results = {}
     for i, s in enumerate(styles):
         print(f"\n🚀 Generating with agent '{s}'")
         try:
             results[f"Agent-{i+1}-{s}"] = agents[s].invoke(query)
         except Exception as e:
-            results[f"Agent-{i+1}-{s}"] = f"# [Agent {s} failed: {e}]"
+            results[f"Agent-{i+1}-{s}"] = _failure_text(s, e)
     return results
+
+
+def _generate_concurrent(
+    query: str,
+    styles: Sequence[str],
+    agents: Dict[str, Runnable],
+    max_workers: int,
+    timeout: float,
+) -> Dict[str, str]:
+    """Run agents on a bounded thread pool; each agent gets `timeout` seconds from the moment it starts."""
+    started: Dict[str, float] = {}
+
+    def _run(style: str) -> str:
+        started[style] = time.monotonic()
+        print(f"\n🚀 Generating with agent '{style}'")
+        return agents[style].invoke(query)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="coderank-agent")
+    futures = {pool.submit(_run, s): s for s in styles}
+    outputs: Dict[str, str] = {}
+    pending = set(futures)
+    try:
+        while pending:
+            # Sleep until the next agent deadline, or briefly if some agents are still queued
+            now = time.monotonic()
+            deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+            queued = len(deadlines) < len(pending)
+            wake = min(deadlines, default=now + timeout) - now
+            if queued:
+                wake = min(wake, 0.05)
+            done, pending = wait(pending, timeout=max(wake, 0), return_when=FIRST_COMPLETED)
+
+            for f in done:
+                s = futures[f]
+                try:
+                    outputs[s] = f.result()
+                except Exception as e:
+                    outputs[s] = _failure_text(s, e)
+
+            now = time.monotonic()
+            for f in list(pending):
+                s = futures[f]
+                if s in started and now - started[s] >= timeout:
+                    f.cancel()
+                    outputs[s] = f"# [Agent {s} timed out after {timeout:g}s]"
+                    print(f"⏱️ Agent '{s}' exceeded its {timeout:g}s deadline")
+                    pending.discard(f)
+    finally:
+        # Don't block on stragglers past their deadline; their HTTP timeout will reap them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return {f"Agent-{i+1}-{s}": outputs[s] for i, s in enumerate(styles)}
+
+
+class AgentChunk(NamedTuple):
+    """One streaming event: `delta` text for `agent`; `done` marks that agent's final event."""
+    agent: str
+    delta: str
+    done: bool = False
+
+
+def stream_all(
+    query: str,
+    styles=("concise", "explainer", "optimizer"),
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    use_cache: bool = GEN_CACHE_ENABLED,
+) -> Iterator[AgentChunk]:
+    """Stream all agents concurrently, yielding `AgentChunk`s in arrival order.
+
+    Every agent finishes with exactly one `done=True` chunk. Failures and missed deadlines are
+    reported as a placeholder delta, matching `generate_all`.
+    """
+    timeout = timeout or AGENT_TIMEOUT
+    workers = max(1, min(max_workers or AGENT_MAX_CONCURRENCY, len(styles)))
+    events: "queue.Queue[AgentChunk]" = queue.Queue()
+    keys = {f"Agent-{i+1}-{s}": s for i, s in enumerate(styles)}
+    started: Dict[str, float] = {}
+    closed: Set[str] = set()  # agents whose done chunk has been yielded
+
+    def _run(key: str, style: str):
+        started[key] = time.monotonic()
+        print(f"\n🚀 Streaming with agent '{style}'")
+        try:
+            for delta in stream_agent(style, query, use_cache=use_cache):
+                if key in closed:
+                    break  # timed out: the consumer already closed this agent
+                events.put(AgentChunk(key, delta))
+        except Exception as e:
+            events.put(AgentChunk(key, _failure_text(style, e)))
+        finally:
+            events.put(AgentChunk(key, "", done=True))
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="coderank-stream")
+    for key, style in keys.items():
+        pool.submit(_run, key, style)
+    try:
+        while len(closed) < len(keys):
+            # Wake at the next agent deadline even if no token arrives (stalled streams)
+            now = time.monotonic()
+            deadlines = [t + timeout for k, t in list(started.items()) if k not in closed]
+            wake = min(deadlines, default=now + timeout) - now
+            try:
+                event = events.get(timeout=max(wake, 0))
+            except queue.Empty:
+                event = None
+            if event is not None and event.agent not in closed:
+                if event.done:
+                    closed.add(event.agent)
+                yield event
+
+            now = time.monotonic()
+            for key, t in list(started.items()):
+                if key not in closed and now - t >= timeout:
+                    style = keys[key]
+                    closed.add(key)
+                    print(f"⏱️ Agent '{style}' exceeded its {timeout:g}s deadline")
+                    yield AgentChunk(key, f"\n# [Agent {style} timed out after {timeout:g}s]")
+                    yield AgentChunk(key, "", done=True)
+    finally:
+        # Don't block on stalled streams past their deadline; their HTTP timeout will reap them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_all(
+    query: str,
+    styles=("concise", "explainer", "optimizer"),
+    concurrent: bool = AGENT_CONCURRENT,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    on_chunk: Optional[Callable[[AgentChunk], None]] = None,
+    use_cache: bool = GEN_CACHE_ENABLED,
+) -> Dict[str, str]:
+    """Generate responses from all configured agents.
+
+    With `concurrent=True` the agents run in parallel (at most `max_workers` at once), so latency
+    tracks the slowest agent rather than the sum. Agents that miss their `timeout` deadline get a
+    placeholder response; the returned dict keeps the `Agent-{i}-{style}` shape and style order.
+
+    Passing `on_chunk` switches to the streaming path: the callback receives every `AgentChunk`
+    in the calling thread as tokens arrive, and the assembled texts are returned as usual.
+    `use_cache=False` bypasses the generation cache for fresh sampling.
+    """
+    print("🔍 HF token loaded:", bool(HF_API_TOKEN))
+
+    if on_chunk is not None:
+        texts = {f"Agent-{i+1}-{s}": "" for i, s in enumerate(styles)}
+        for chunk in stream_all(query, styles, max_workers=max_workers, timeout=timeout, use_cache=use_cache):
+            texts[chunk.agent] += chunk.delta
+            on_chunk(chunk)
+        return {agent: text.strip() for agent, text in texts.items()}
+
+    agents = {s: make_agent(s, use_cache=use_cache) for s in styles}
+
+    if not concurrent or len(styles) < 2:
+        return _generate_sequential(query, styles, agents)
+
+    workers = max(1, min(max_workers or AGENT_MAX_CONCURRENCY, len(styles)))
+    return _generate_concurrent(query, styles, agents, workers, timeout or AGENT_TIMEOUT)
@@ -0,0 +1,169 @@
+# ==============================================
+# CodeRank HTTP API — async front end over the HITL graph
+# ==============================================
+# Run with several workers (sessions live in the shared sqlite checkpointer):
+#   python -m coderank_lc.api.app
+
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from coderank_lc.agents import endpoint_pool, generation_profiles
+from coderank_lc.core import metrics, reranker, storage
+from coderank_lc.core.settings import API_HOST, API_PORT, API_WORKERS, GRAPH_CHECKPOINTER
+from coderank_lc.graph.graph import build_graph, submit_choice, thread_config
+from coderank_lc.graph.state import GraphState
+
+
+# ==============================================
+# Schemas
+# ==============================================
+class StartSession(BaseModel):
+    query: str
+    fresh: bool = False  # bypass the generation and semantic caches
+
+
+class Candidate(BaseModel):
+    agent: str
+    text: str
+
+
+class PairOut(BaseModel):
+    session_id: str
+    query: str
+    a: Candidate
+    b: Candidate
+
+
+class Choice(BaseModel):
+    choice: Literal["A", "B"]
+
+
+class RankedItem(BaseModel):
+    agent: str
+    text: str
+    score: float
+
+
+class RankedOut(BaseModel):
+    session_id: str
+    query: str
+    preferred: Optional[str]
+    ranked: List[RankedItem]
+
+
+# ==============================================
+# App
+# ==============================================
+_graph = None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    global _graph
+    # One graph (and checkpointer connection) per worker; connect and load before serving
+    _graph = build_graph()
+    await asyncio.to_thread(storage.warm_up)
+    await asyncio.to_thread(reranker.warm_up)
+    yield
+    await asyncio.to_thread(storage.flush)
+    reranker.shutdown()
+
+
+app = FastAPI(title="CodeRank", lifespan=lifespan)
+
+
+def _snapshot(session_id: str):
+    snapshot = _graph.get_state(thread_config(session_id))
+    if not snapshot.values:
+        raise HTTPException(404, f"Unknown session '{session_id}'")
+    return snapshot
+
+
+def _pair_out(session_id: str, values) -> PairOut:
+    (a_name, a_text), (b_name, b_text) = values["pair"]
+    return PairOut(
+        session_id=session_id,
+        query=values["query"],
+        a=Candidate(agent=a_name, text=a_text),
+        b=Candidate(agent=b_name, text=b_text),
+    )
+
+
+def _ranked_out(session_id: str, values) -> RankedOut:
+    return RankedOut(
+        session_id=session_id,
+        query=values["query"],
+        preferred=values.get("human_choice"),
+        ranked=[RankedItem(**{k: row[k] for k in ("agent", "text", "score")}) for row in values["ranked"]],
+    )
+
+
+@app.post("/sessions", response_model=PairOut, status_code=201)
+async def start_session(req: StartSession) -> PairOut:
+    """Generate answers for a query and pause at the A/B comparison."""
+    session_id = uuid.uuid4().hex
+    # Without `fresh`, the nodes follow GEN_CACHE_ENABLED
+    config = thread_config(session_id, **({"use_cache": False} if req.fresh else {}))
+    # The graph blocks on HTTP calls; a worker thread keeps the event loop serving other sessions
+    values = await asyncio.to_thread(_graph.invoke, GraphState(query=req.query).model_dump(), config)
+    return _pair_out(session_id, values)
+
+
+@app.get("/sessions/{session_id}/pair", response_model=PairOut)
+async def get_pair(session_id: str) -> PairOut:
+    snapshot = await asyncio.to_thread(_snapshot, session_id)
+    return _pair_out(session_id, snapshot.values)
+
+
+@app.post("/sessions/{session_id}/choice", response_model=RankedOut)
+async def post_choice(session_id: str, req: Choice) -> RankedOut:
+    """Record the human choice and rerank; resumes the paused graph without regenerating."""
+    snapshot = await asyncio.to_thread(_snapshot, session_id)
+    if "wait_human" not in snapshot.next:
+        raise HTTPException(409, "Session is not waiting for a choice")
+    values = await asyncio.to_thread(submit_choice, _graph, session_id, req.choice)
+    return _ranked_out(session_id, values)
+
+
+@app.get("/sessions/{session_id}/ranked", response_model=RankedOut)
+async def get_ranked(session_id: str) -> RankedOut:
+    snapshot = await asyncio.to_thread(_snapshot, session_id)
+    if not snapshot.values.get("ranked"):
+        raise HTTPException(409, "Session has not been ranked yet — submit a choice first")
+    return _ranked_out(session_id, snapshot.values)
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "reranker": reranker.stats(),
+        "endpoints": endpoint_pool.stats(),
+        "token_usage": generation_profiles.usage(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> str:
+    return metrics.prometheus_text()
+
+
+@app.get("/metrics.json")
+async def metrics_snapshot():
+    return metrics.snapshot()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    workers = API_WORKERS
+    if GRAPH_CHECKPOINTER == "memory" and workers > 1:
+        print("⚠️ GRAPH_CHECKPOINTER=memory keeps sessions per worker — running a single worker.")
+        workers = 1
+    uvicorn.run("coderank_lc.api.app:app", host=API_HOST, port=API_PORT, workers=workers)
@@ -5,31 +5,68 @@
 from dotenv import load_dotenv
 load_dotenv()  # Load environment variables early
 
+import atexit
+import json
+import os
+import queue
+import threading
 import time
-from typing import Dict, Any, List
-from astrapy import DataAPIClient
-
-# --- Robust Exception Imports (Handles all astrapy versions) ---
-try:
-    from astrapy.exceptions import DataAPIException
-except ImportError:
-    try:
-        from astrapy.exceptions import DataAPIError as DataAPIException
-    except ImportError:
-        class DataAPIException(Exception):
-            """Fallback if astrapy exception is unavailable."""
-            pass
+import uuid
+from typing import Dict, Any, Iterator, List, Optional, Sequence
 
 # --- Project Settings ---
 from coderank_lc.core.settings import (
     ASTRA_DB_APPLICATION_TOKEN,
     ASTRA_DB_API_ENDPOINT,
     ASTRA_DB_KEYSPACE,
+    ASTRA_WRITE_BEHIND,
+    ASTRA_FLUSH_SIZE,
+    ASTRA_FLUSH_INTERVAL,
+    ASTRA_QUEUE_MAX,
+    ASTRA_ENQUEUE_TIMEOUT,
+    ASTRA_FLUSH_RETRIES,
+    ASTRA_RETRY_BACKOFF,
+    ASTRA_DEAD_LETTER_PATH,
+    FEEDBACK_PAGE_SIZE,
 )
+from coderank_lc.core import metrics
+from coderank_lc.core.storage import Mark, StorageBackend, after_mark
 
-# --- AstraDB Client Setup ---
-client = DataAPIClient(ASTRA_DB_APPLICATION_TOKEN)
-db = client.get_database(ASTRA_DB_API_ENDPOINT)
+
+def _data_api_exception():
+    """Robust exception lookup (handles all astrapy versions)."""
+    try:
+        from astrapy.exceptions import DataAPIException
+    except ImportError:
+        try:
+            from astrapy.exceptions import DataAPIError as DataAPIException
+        except ImportError:
+            class DataAPIException(Exception):
+                """Fallback if astrapy exception is unavailable."""
+                pass
+    return DataAPIException
+
+
+# ==============================================
+# Lazy AstraDB Client Setup
+# ==============================================
+# Nothing connects at import time: the client, database and collection handles are
+# process-wide singletons created on first use (or by `warm_up`).
+_db = None
+_collections: Dict[str, Any] = {}
+_lock = threading.RLock()
+
+
+def get_db():
+    """Return the shared Astra database handle, creating the client on first use."""
+    global _db
+    if _db is None:
+        with _lock:
+            if _db is None:
+                from astrapy import DataAPIClient
+                client = DataAPIClient(ASTRA_DB_APPLICATION_TOKEN)
+                _db = client.get_database(ASTRA_DB_API_ENDPOINT)
+    return _db
 
 
 # ==============================================
@@ -37,6 +74,8 @@ db = client.get_database(ASTRA_DB_API_ENDPOINT)
 # ==============================================
 def ensure_collection_exists(name: str):
     """Ensure a collection exists in Astra DB and return the collection object."""
+    db = get_db()
+    DataAPIException = _data_api_exception()
     try:
         db.create_collection(name, keyspace=ASTRA_DB_KEYSPACE)
         print(f"✅ Created new collection: {name}")
@@ -58,11 +97,235 @@ def ensure_collection_exists(name: str):
     raise RuntimeError(f"❌ Could not verify existence of collection: {name}")
 
 
+def get_collection(name: str):
+    """Return a cached collection handle, verifying the collection only on first use."""
+    coll = _collections.get(name)
+    if coll is None:
+        with _lock:
+            coll = _collections.get(name)
+            if coll is None:
+                coll = _collections[name] = ensure_collection_exists(name)
+    return coll
+
+
+def warm_up(names=("responses", "feedback")):
+    """Connect and resolve collection handles ahead of the first request."""
+    for name in names:
+        get_collection(name)
+
+
 # ==============================================
-# Initialize Core Collections
+# Write-Behind Buffer
 # ==============================================
-responses = ensure_collection_exists("responses")
-feedback = ensure_collection_exists("feedback")
+class WriteBehindBuffer:
+    """Background writer that batches documents per collection into `insert_many`.
+
+    A batch is flushed when a collection has `flush_size` pending documents or every
+    `flush_interval` seconds. The queue holds at most `max_queue` documents; when it is
+    full, callers block for up to `enqueue_timeout` seconds and then write synchronously.
+    A failed batch is retried with backoff, then written one document at a time; documents
+    that still fail go to a dead-letter JSONL file (`replay_dead_letters` re-inserts them),
+    so nothing is silently dropped. Pending documents are flushed at interpreter exit.
+    """
+
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(
+        self,
+        flush_size: int = ASTRA_FLUSH_SIZE,
+        flush_interval: float = ASTRA_FLUSH_INTERVAL,
+        max_queue: int = ASTRA_QUEUE_MAX,
+        enqueue_timeout: float = ASTRA_ENQUEUE_TIMEOUT,
+        retries: int = ASTRA_FLUSH_RETRIES,
+        backoff: float = ASTRA_RETRY_BACKOFF,
+        dead_letter_path: str = ASTRA_DEAD_LETTER_PATH,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.dead_letter_path = dead_letter_path
+        self.dead_lettered = 0
+        self.dropped = 0  # could not even be dead-lettered
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="astra-write-behind", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def submit(self, coll_name: str, doc: Dict[str, Any]) -> bool:
+        """Queue a document; returns False if the queue stayed full (caller should write it directly)."""
+        self._ensure_started()
+        try:
+            self._queue.put((coll_name, doc), timeout=self.enqueue_timeout)
+            return True
+        except queue.Full:
+            print(f"⚠️ Write-behind queue full — writing to '{coll_name}' synchronously")
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued before this call has been written; False if that timed out."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put((self._FLUSH, done), timeout=self.enqueue_timeout if timeout is None else timeout)
+        except queue.Full:
+            print(f"⚠️ Write-behind queue full — flush gave up with {self.pending()} document(s) pending")
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 30.0):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put((self._STOP, None), timeout=timeout)
+        except queue.Full:
+            print(f"⚠️ Write-behind queue still full at shutdown — {self.pending()} document(s) not written")
+            return
+        self._thread.join(timeout=timeout)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self.pending(), "dead_lettered": self.dead_lettered, "dropped": self.dropped}
+
+    def _run(self):
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        last_flush = time.monotonic()
+        while True:
+            wait = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                coll_name, item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                coll_name, item = None, None
+
+            if coll_name is self._FLUSH or coll_name is self._STOP:
+                self._write(pending)
+                pending = {}
+                last_flush = time.monotonic()
+                if coll_name is self._STOP:
+                    return
+                item.set()
+                continue
+
+            if coll_name is not None:
+                pending.setdefault(coll_name, []).append(item)
+                if len(pending[coll_name]) >= self.flush_size:
+                    self._write({coll_name: pending.pop(coll_name)})
+
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._write(pending)
+                pending = {}
+                last_flush = time.monotonic()
+
+    def _write(self, batches: Dict[str, List[Dict[str, Any]]]):
+        for coll_name, docs in batches.items():
+            if not docs:
+                continue
+            error: Optional[Exception] = None
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(self.backoff * (2 ** (attempt - 1)))
+                try:
+                    with metrics.span("storage_op", op="insert_many", backend="astra") as attrs:
+                        attrs["docs"] = len(docs)
+                        get_collection(coll_name).insert_many(docs, ordered=False)
+                    print(f"📦 Flushed {len(docs)} document(s) → {coll_name}")
+                    break
+                except Exception as e:
+                    error = e
+                    print(f"⚠️ Error flushing {len(docs)} document(s) to '{coll_name}' (attempt {attempt + 1}): {e}")
+            else:
+                self._write_each(coll_name, docs, error)
+
+    def _write_each(self, coll_name: str, docs: List[Dict[str, Any]], error: Optional[Exception]):
+        """Last resort after `insert_many` kept failing: one insert per document, dead-letter the rest."""
+        failed = []
+        for doc in docs:
+            try:
+                get_collection(coll_name).insert_one(doc)
+            except Exception as e:
+                if _already_exists(e):
+                    continue  # landed in an earlier (partially successful) insert_many
+                failed.append(doc)
+                error = e
+        if failed:
+            self._dead_letter(coll_name, failed, error)
+        print(f"📦 Wrote {len(docs) - len(failed)}/{len(docs)} document(s) → {coll_name} one at a time")
+
+    def _dead_letter(self, coll_name: str, docs: List[Dict[str, Any]], error: Optional[Exception]):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for doc in docs:
+                    row = {"collection": coll_name, "doc": doc, "error": str(error), "failed_at": time.time()}
+                    f.write(json.dumps(row, default=str) + "\n")
+        except OSError as e:
+            self.dropped += len(docs)
+            metrics.inc("astra_write_dropped_total", len(docs), collection=coll_name)
+            print(f"❌ Dropped {len(docs)} document(s) for '{coll_name}': dead-letter file unwritable ({e})")
+            return
+        self.dead_lettered += len(docs)
+        metrics.inc("astra_write_dead_letter_total", len(docs), collection=coll_name)
+        print(f"⚠️ {len(docs)} document(s) for '{coll_name}' saved to {self.dead_letter_path}")
+
+
+def _already_exists(error: Exception) -> bool:
+    message = str(error)
+    return "DOCUMENT_ALREADY_EXISTS" in message or "already exists" in message.lower()
+
+
+def replay_dead_letters(path: str = ASTRA_DEAD_LETTER_PATH) -> int:
+    """Re-insert dead-lettered documents; rows that fail again stay in the file. Returns the number written."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    written, remaining = 0, []
+    for row in rows:
+        try:
+            get_collection(row["collection"]).insert_one(row["doc"])
+            written += 1
+        except Exception as e:
+            if _already_exists(e):
+                written += 1
+            else:
+                remaining.append(row)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(row, default=str) + "\n" for row in remaining)
+    os.replace(tmp, path)
+    return written
+
+
+_writer = WriteBehindBuffer() if ASTRA_WRITE_BEHIND else None
+
+
+def flush_writes(timeout: Optional[float] = None):
+    """Wait for buffered writes to land (call before reading back just-written data)."""
+    if _writer is not None:
+        _writer.flush(timeout)
+
+
+def _insert(coll_name: str, doc: Dict[str, Any]) -> str:
+    """Insert via the write-behind buffer when enabled, else synchronously; returns the document id."""
+    if _writer is not None:
+        doc = dict(doc)
+        doc.setdefault("_id", str(uuid.uuid4()))  # client-side id so callers get it without a round-trip
+        if _writer.submit(coll_name, doc):
+            return doc["_id"]
+    res = get_collection(coll_name).insert_one(doc)
+    return str(getattr(res, "inserted_id", res))
 
 
 # ==============================================
@@ -71,9 +334,9 @@ feedback = ensure_collection_exists("feedback")
 def store_response(doc: Dict[str, Any]) -> str:
     """Insert an agent response into Astra DB."""
     try:
-        res = responses.insert_one(doc)
+        doc_id = _insert("responses", doc)
         print(f"📥 Stored response from {doc.get('agent')}")
-        return str(getattr(res, "inserted_id", res))
+        return doc_id
     except Exception as e:
         print(f"⚠️ Error storing response: {e}")
         return ""
@@ -82,9 +345,9 @@ def store_response(doc: Dict[str, Any]) -> str:
 def store_feedback(doc: Dict[str, Any]) -> str:
     """Insert a human feedback entry."""
     try:
-        res = feedback.insert_one(doc)
+        doc_id = _insert("feedback", doc)
         print(f"📝 Stored feedback preference: {doc.get('preferred')}")
-        return str(getattr(res, "inserted_id", res))
+        return doc_id
     except Exception as e:
         print(f"⚠️ Error storing feedback: {e}")
         return ""
@@ -92,20 +355,49 @@ def store_feedback(doc: Dict[str, Any]) -> str:
 
 def store_reranker_score(doc: Dict[str, Any]) -> str:
     """Insert a reranker score for offline fine-tuning."""
-    coll_name = "reranker_scores"
     try:
-        coll = ensure_collection_exists(coll_name)
-        res = coll.insert_one(doc)
+        doc_id = _insert("reranker_scores", doc)
         print(f"🏁 Stored reranker score for {doc.get('agent')} → {doc.get('score')}")
-        return str(getattr(res, "inserted_id", res))
+        return doc_id
     except Exception as e:
         print(f"⚠️ Error storing reranker score: {e}")
         return ""
 
 
+def store_evaluation(doc: Dict[str, Any]) -> str:
+    """Insert a reranker evaluation result."""
+    try:
+        return _insert("evaluation_results", doc)
+    except Exception as e:
+        print(f"⚠️ Failed to store evaluation results: {e}")
+        return ""
+
+
+def store_many(coll_name: str, docs: Sequence[Dict[str, Any]]) -> List[str]:
+    """Insert many documents into one collection, batched into `insert_many` calls."""
+    docs = [dict(d) for d in docs]
+    for d in docs:
+        d.setdefault("_id", str(uuid.uuid4()))
+    if _writer is not None:
+        # The write-behind buffer already groups these into insert_many batches
+        overflow = [d for d in docs if not _writer.submit(coll_name, d)]
+    else:
+        overflow = docs
+    if overflow:
+        try:
+            get_collection(coll_name).insert_many(overflow, ordered=False)
+        except Exception as e:
+            print(f"⚠️ Error storing {len(overflow)} document(s) to '{coll_name}': {e}")
+            failed = {d["_id"] for d in overflow}
+            return ["" if d["_id"] in failed else d["_id"] for d in docs]
+    return [d["_id"] for d in docs]
+
+
 def list_recent_feedback(limit: int = 1000) -> List[Dict[str, Any]]:
     """Fetch the most recent feedback documents."""
+    flush_writes()
     try:
+        feedback = get_collection("feedback")
         # Prefer sorting by timestamp if available
         try:
             docs = feedback.find({}, sort={"created_at": -1}, limit=limit)
@@ -117,3 +409,95 @@ def list_recent_feedback(limit: int = 1000) -> List[Dict[str, Any]]:
         print(f"⚠️ Error listing feedback: {e}")
         return []
 
+
+def list_recent_responses(limit: int = 1000) -> List[Dict[str, Any]]:
+    """Fetch the most recent agent response documents."""
+    flush_writes()
+    try:
+        responses = get_collection("responses")
+        try:
+            docs = responses.find({}, sort={"created_at": -1}, limit=limit)
+        except Exception:
+            docs = responses.find({}, limit=limit)
+        return list(docs)
+    except Exception as e:
+        print(f"⚠️ Error listing responses: {e}")
+        return []
+
+
+def iter_feedback(
+    fields: Optional[Sequence[str]] = None,
+    since: Optional[Mark] = None,
+    page_size: int = FEEDBACK_PAGE_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """Yield feedback oldest-first in keyset pages of `page_size`, projected to `fields`."""
+    flush_writes()
+    feedback = get_collection("feedback")
+    projection = {f: True for f in (*fields, "created_at")} if fields else None
+
+    mark = since
+    if since is None:
+        # Legacy documents written before created_at stamping come first
+        yield from feedback.find({"created_at": {"$exists": False}}, projection=projection)
+        flt = {"created_at": {"$exists": True}}  # already yielded: re-reading them would stall the keyset
+    else:
+        flt = {"created_at": {"$gte": since[0]}}
+
+    while True:
+        page = list(feedback.find(flt, projection=projection, sort={"created_at": 1}, limit=page_size))
+        full = len(page) == page_size
+        if full:
+            # Ties on the last timestamp may run past the page: read that timestamp whole, then step past it
+            last = page[-1]["created_at"]
+            page = [d for d in page if d["created_at"] < last]
+            page += feedback.find({"created_at": {"$eq": last}}, projection=projection)
+        fresh = [doc for doc in page if after_mark(doc, mark)]
+        fresh.sort(key=lambda d: (d["created_at"], str(d["_id"])))
+        yield from fresh
+        if not full:
+            return
+        flt = {"created_at": {"$gt": last}}
+
+
+# ==============================================
+# StorageBackend adapter
+# ==============================================
+class AstraStorage(StorageBackend):
+    """Remote Astra DB backend (the module-level functions above)."""
+
+    name = "astra"
+
+    def store_response(self, doc: Dict[str, Any]) -> str:
+        return store_response(doc)
+
+    def store_feedback(self, doc: Dict[str, Any]) -> str:
+        return store_feedback(doc)
+
+    def store_reranker_score(self, doc: Dict[str, Any]) -> str:
+        return store_reranker_score(doc)
+
+    def store_evaluation(self, doc: Dict[str, Any]) -> str:
+        return store_evaluation(doc)
+
+    def store_many(self, collection: str, docs: Sequence[Dict[str, Any]]) -> List[str]:
+        return store_many(collection, docs)
+
+    def list_recent_feedback(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        return list_recent_feedback(limit)
+
+    def list_recent_responses(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        return list_recent_responses(limit)
+
+    def iter_feedback(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        since: Optional[Mark] = None,
+        page_size: int = FEEDBACK_PAGE_SIZE,
+    ) -> Iterator[Dict[str, Any]]:
+        return iter_feedback(fields=fields, since=since, page_size=page_size)
+
+    def flush(self):
+        flush_writes()
+
+    def warm_up(self):
+        warm_up()
@@ -1,105 +1,147 @@
 # ==============================================
-# Evaluation Script — Reranker Alignment + Astra Logging
+# Evaluation Script — Reranker Alignment + Result Logging
 # ==============================================
 
 import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import numpy as np
 import pandas as pd
 from scipy.stats import kendalltau, spearmanr
-from coderank_lc.core.astra_store import list_recent_feedback
-from coderank_lc.core.reranker import score_batch
-from coderank_lc.core.astra_store import ensure_collection_exists
-from coderank_lc.core.settings import RERANKER_BASE, RERANKER_LOAD_DIR
-from astrapy import DataAPIClient
-import os
+from coderank_lc.core.storage import Watermark, iter_feedback, store_evaluation
+from coderank_lc.core.reranker import score_pairs_tagged
+from coderank_lc.core.settings import RERANKER_BATCH_SIZE
 
 
 # ==============================================
-# Astra Setup
+# Evaluation Engine
 # ==============================================
-ASTRA_DB_APPLICATION_TOKEN = os.getenv("ASTRA_DB_APPLICATION_TOKEN")
-ASTRA_DB_API_ENDPOINT = os.getenv("ASTRA_DB_API_ENDPOINT")
-ASTRA_DB_KEYSPACE = os.getenv("ASTRA_DB_KEYSPACE", "default_keyspace")
+def feedback_frame(docs: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """Build a frame of valid (query, text_a, text_b, preferred) feedback rows."""
+    df = pd.DataFrame.from_records(list(docs), columns=["query", "text_a", "text_b", "preferred"])
+    df = df.dropna(subset=["query", "text_a", "text_b"])
+    return df[(df[["query", "text_a", "text_b"]] != "").all(axis=1)].reset_index(drop=True)
 
-client = DataAPIClient(ASTRA_DB_APPLICATION_TOKEN)
-db = client.get_database(ASTRA_DB_API_ENDPOINT)
 
-ensure_collection_exists("evaluation_results")
-evaluation_coll = db.get_collection("evaluation_results", keyspace=ASTRA_DB_KEYSPACE)
+def dataset_frame(limit: Optional[int] = None) -> pd.DataFrame:
+    """Feedback pairs from `load_pairs` (snapshot or storage backend), shaped like `feedback_frame` (A = preferred)."""
+    from coderank_lc.core.feedback_dataset import load_pairs
+
+    table = load_pairs(limit=limit).select(["query", "pos", "neg"])
+    df = table.to_pandas().rename(columns={"pos": "text_a", "neg": "text_b"})
+    return df.assign(preferred="A")
+
+
+def score_pair_frame(
+    df: pd.DataFrame,
+    batch_size: int = RERANKER_BATCH_SIZE,
+    predict: Optional[Callable] = None,
+) -> pd.DataFrame:
+    """Score every A/B text of `df` in one pass and attach `agent_a_score` / `agent_b_score`.
+
+    All (query, text) pairs are flattened into a single deduplicated list and scored in
+    batches of `batch_size` — by the shared reranker, or by `predict(pairs, batch_size=...)`
+    (e.g. `CrossEncoder.predict` of another checkpoint). With the shared reranker the
+    version of the model that produced the scores is kept in `attrs["model_version"]`.
+    """
+    n = len(df)
+    flat = pd.MultiIndex.from_arrays([
+        pd.concat([df["query"], df["query"]], ignore_index=True),
+        pd.concat([df["text_a"], df["text_b"]], ignore_index=True),
+    ])
+    codes, unique_pairs = pd.factorize(flat)
+    pairs = list(unique_pairs)
+    version = ""
+    if predict is None:
+        unique_scores, version = score_pairs_tagged(pairs, batch_size=batch_size)
+    else:
+        unique_scores = predict(pairs, batch_size=batch_size)
+    scores = np.asarray(unique_scores, dtype=float)[codes]
+    scored = df.assign(agent_a_score=scores[:n], agent_b_score=scores[n:])
+    scored.attrs["model_version"] = version
+    return scored
+
+
+def alignment_metrics(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """Vectorized reranker-vs-human agreement plus Kendall tau / Spearman rho of the paired scores."""
+    a = df["agent_a_score"].to_numpy()
+    b = df["agent_b_score"].to_numpy()
+    reranker_pref = np.where(a > b, "A", np.where(a < b, "B", "Tie"))
+    result = pd.DataFrame({
+        "query": df["query"].to_numpy(),
+        "agent_a_score": a,
+        "agent_b_score": b,
+        "human_preferred": df["preferred"].to_numpy(),
+        "reranker_preferred": reranker_pref,
+        "match": reranker_pref == df["preferred"].to_numpy(),
+    })
+
+    if np.unique(a).size > 1 or np.unique(b).size > 1:
+        tau, _ = kendalltau(a, b)
+        rho, _ = spearmanr(a, b)
+    else:
+        tau = rho = 0.0
+        print("ℹ️ All scores identical — correlation not meaningful.")
+
+    metrics = {
+        "accuracy": float(result["match"].mean() * 100),
+        "pairs_evaluated": int(len(result)),
+        "kendall_tau": float(tau),
+        "spearman_rho": float(rho),
+    }
+    return result, metrics
 
 
 # ==============================================
 # Evaluation Function
 # ==============================================
-def evaluate_reranker_alignment(limit: int = 1000):
+def evaluate_reranker_alignment(limit: int = 1000, batch_size: int = RERANKER_BATCH_SIZE, since_last: bool = False):
     """
-    Evaluate reranker alignment with human feedback and store results in AstraDB.
+    Evaluate reranker alignment with human feedback and store the results.
+    With `since_last`, only feedback added since the previous incremental run is evaluated.
     Returns the evaluation DataFrame.
     """
-    feedback_docs = list_recent_feedback(limit=limit)
-    if not feedback_docs:
-        print("⚠️ No feedback data found in AstraDB.")
-        return None
-
-    results = []
-    for doc in feedback_docs:
-        query = doc.get("query")
-        a_text = doc.get("text_a")
-        b_text = doc.get("text_b")
-        preferred = doc.get("preferred")
-
-        if not query or not a_text or not b_text:
-            continue
-
-        # Score both responses using current reranker
-        scores = score_batch(query, [a_text, b_text])
-        if not scores or len(scores) < 2:
-            continue
-
-        score_a, score_b = scores[0], scores[1]
-        reranker_pref = "A" if score_a > score_b else "B" if score_a != score_b else "Tie"
-        match = reranker_pref == preferred
-
-        results.append({
-            "query": query,
-            "agent_a_score": score_a,
-            "agent_b_score": score_b,
-            "human_preferred": preferred,
-            "reranker_preferred": reranker_pref,
-            "match": match
-        })
-
-    df = pd.DataFrame(results)
-    if df.empty:
+    watermark = Watermark("evaluation") if since_last else None
+    if watermark is None:
+        # Local snapshot, or the storage backend with FEEDBACK_SOURCE=storage / an empty snapshot
+        pairs = dataset_frame(limit=limit)
+    else:
+        feedback_docs = []
+        for doc in iter_feedback(fields=("query", "text_a", "text_b", "preferred"), since=watermark.mark):
+            if len(feedback_docs) >= limit:
+                break  # the rest is picked up by the next incremental run
+            watermark.advance(doc)
+            feedback_docs.append(doc)
+        pairs = feedback_frame(feedback_docs)
+    if pairs.empty:
         print("⚠️ No valid feedback pairs found.")
         return None
 
-    # --- Compute Metrics ---
-    accuracy = df["match"].mean() * 100
-    total_pairs = len(df)
-    print(f"✅ Reranker–Human Agreement: {accuracy:.2f}% ({total_pairs} pairs)")
+    start = time.perf_counter()
+    scored = score_pair_frame(pairs, batch_size=batch_size)
+    df, metrics = alignment_metrics(scored)
+    elapsed = time.perf_counter() - start
 
-    if df["agent_a_score"].nunique() > 1 or df["agent_b_score"].nunique() > 1:
-        tau, _ = kendalltau(df["agent_a_score"], df["agent_b_score"])
-        rho, _ = spearmanr(df["agent_a_score"], df["agent_b_score"])
-    else:
-        tau = rho = 0.0
-        print("ℹ️ All scores identical — correlation not meaningful.")
+    # --- Compute Metrics ---
+    accuracy = metrics["accuracy"]
+    total_pairs = metrics["pairs_evaluated"]
+    tau, rho = metrics["kendall_tau"], metrics["spearman_rho"]
+    print(f"✅ Reranker–Human Agreement: {accuracy:.2f}% ({total_pairs} pairs, scored in {elapsed:.1f}s)")
 
-    # --- Log evaluation to AstraDB ---
+    # --- Log evaluation to the storage backend ---
     eval_doc = {
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
         "accuracy": round(accuracy, 3),
         "pairs_evaluated": total_pairs,
         "kendall_tau": round(tau, 3),
         "spearman_rho": round(rho, 3),
-        "model_used": RERANKER_LOAD_DIR or RERANKER_BASE,
+        "model_used": scored.attrs["model_version"],
+        "model_version": scored.attrs["model_version"],
     }
 
-    try:
-        evaluation_coll.insert_one(eval_doc)
-        print(f"📊 Stored evaluation result in AstraDB: {eval_doc}")
-    except Exception as e:
-        print(f"⚠️ Failed to store evaluation results: {e}")
+    if store_evaluation(eval_doc):
+        print(f"📊 Stored evaluation result: {eval_doc}")
+    if watermark is not None:
+        watermark.commit()
 
     return df
 
@@ -0,0 +1,173 @@
+# ==============================================
+# Feedback Dataset — local columnar snapshot of preference pairs
+# ==============================================
+
+import glob
+import hashlib
+import os
+from collections import deque
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from coderank_lc.core.settings import FEEDBACK_DATASET_DIR, FEEDBACK_SOURCE
+
+SCHEMA = pa.schema([
+    ("hash", pa.string()),
+    ("query", pa.string()),
+    ("pos", pa.string()),
+    ("neg", pa.string()),
+    ("agent_pos", pa.string()),
+    ("agent_neg", pa.string()),
+    ("created_at", pa.float64()),
+])
+
+FEEDBACK_FIELDS = ("query", "text_a", "text_b", "resp_A", "resp_B", "preferred", "agent_a", "agent_b")
+STORAGE_FALLBACK_LIMIT = 5000  # rows read from the backend when no limit is given
+
+
+def pair_hash(query: str, pos: str, neg: str) -> str:
+    """Content hash used to deduplicate pairs across exports."""
+    h = hashlib.sha256()
+    for part in (query, pos, neg):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def pair_from_feedback(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Normalize a feedback document into a (query, pos, neg) record, or None if incomplete."""
+    q = (doc.get("query") or "").strip()
+    a = (doc.get("text_a") or doc.get("resp_A") or "").strip()
+    b = (doc.get("text_b") or doc.get("resp_B") or "").strip()
+    pref = (doc.get("preferred") or "A").upper()
+    if not (q and a and b):
+        return None
+    if pref == "A":
+        pos, neg = a, b; ap, an = doc.get("agent_a") or "A", doc.get("agent_b") or "B"
+    else:
+        pos, neg = b, a; ap, an = doc.get("agent_b") or "B", doc.get("agent_a") or "A"
+    return {
+        "hash": pair_hash(q, pos, neg),
+        "query": q, "pos": pos, "neg": neg, "agent_pos": ap, "agent_neg": an,
+        "created_at": float(doc.get("created_at") or 0.0),  # legacy rows predate stamping: oldest
+    }
+
+
+def _part_paths(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, "part-*.arrow")))
+
+
+def open_dataset(directory: str = FEEDBACK_DATASET_DIR, columns: Optional[List[str]] = None) -> pa.Table:
+    """Open every part memory-mapped; the returned table references the mapped buffers (no copy)."""
+    tables = []
+    for path in _part_paths(directory):
+        reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        table = reader.read_all()
+        tables.append(table.select(columns) if columns else table)
+    if not tables:
+        schema = pa.schema([SCHEMA.field(c) for c in columns]) if columns else SCHEMA
+        return schema.empty_table()
+    return pa.concat_tables(tables)
+
+
+def append_pairs(records: Iterable[Dict[str, Any]], directory: str = FEEDBACK_DATASET_DIR) -> int:
+    """Append records not already present (by content hash) as a new part; returns rows written."""
+    seen = set(open_dataset(directory, columns=["hash"]).column("hash").to_pylist())
+    fresh: Dict[str, Dict[str, Any]] = {}
+    for rec in records:
+        if rec["hash"] not in seen and rec["hash"] not in fresh:
+            fresh[rec["hash"]] = rec
+    if not fresh:
+        return 0
+
+    os.makedirs(directory, exist_ok=True)
+    parts = _part_paths(directory)
+    index = int(os.path.basename(parts[-1])[5:10]) + 1 if parts else 0
+    path = os.path.join(directory, f"part-{index:05d}.arrow")
+    table = pa.Table.from_pylist(list(fresh.values()), schema=SCHEMA)
+    # Uncompressed IPC files can be memory-mapped and read zero-copy
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, SCHEMA) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+    return len(fresh)
+
+
+def sync_from_storage(
+    directory: str = FEEDBACK_DATASET_DIR,
+    full: bool = False,
+    limit: Optional[int] = None,
+    consumer: str = "feedback_dataset",
+    on_pair: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> int:
+    """Pull feedback added since `consumer`'s last sync from the storage backend into the dataset.
+
+    An incremental run walks oldest-first from the watermark and stops after `limit` rows
+    (the next run continues there); a `full` run takes the newest `limit` rows. `on_pair`
+    sees every valid pair, including ones the dataset already holds. Returns rows written.
+    """
+    from coderank_lc.core.storage import Watermark, iter_feedback
+
+    watermark = Watermark(consumer)
+    if full:
+        watermark.reset()
+
+    docs: Iterable[Dict[str, Any]] = iter_feedback(fields=FEEDBACK_FIELDS, since=watermark.mark)
+    if limit is not None:
+        docs = deque(docs, maxlen=limit) if full else islice(docs, limit)
+
+    written, batch = 0, []
+    for doc in docs:
+        watermark.advance(doc)
+        rec = pair_from_feedback(doc)
+        if rec is None:
+            continue
+        if on_pair is not None:
+            on_pair(rec)
+        batch.append(rec)
+        if len(batch) >= 5000:
+            written += append_pairs(batch, directory)
+            batch = []
+    written += append_pairs(batch, directory)
+    watermark.commit()
+    return written
+
+
+def pairs_from_storage(limit: Optional[int] = None) -> pa.Table:
+    """The most recent `limit` pairs read straight from the storage backend, oldest first."""
+    from coderank_lc.core.storage import list_recent_feedback
+
+    records: Dict[str, Dict[str, Any]] = {}
+    for doc in list_recent_feedback(limit or STORAGE_FALLBACK_LIMIT):
+        rec = pair_from_feedback(doc)
+        if rec is not None:
+            records.setdefault(rec["hash"], rec)
+    rows = sorted(records.values(), key=lambda r: r["created_at"])
+    return pa.Table.from_pylist(rows, schema=SCHEMA)
+
+
+def load_pairs(
+    directory: str = FEEDBACK_DATASET_DIR,
+    limit: Optional[int] = None,
+    source: Optional[str] = None,
+) -> pa.Table:
+    """The (most recent `limit`) pairs of the local snapshot, or of the storage backend.
+
+    `source` defaults to FEEDBACK_SOURCE; "storage" always reads the backend, and an
+    empty snapshot falls back to it.
+    """
+    if (source or FEEDBACK_SOURCE) == "storage":
+        return pairs_from_storage(limit)
+    table = open_dataset(directory)
+    if table.num_rows == 0:
+        print(f"ℹ️ Feedback dataset at '{directory}' is empty — reading the storage backend "
+              f"(run scripts/export_feedback.py to build the snapshot).")
+        return pairs_from_storage(limit)
+    if limit is not None and table.num_rows > limit:
+        # Parts are not strictly chronological (a full re-export appends older unseen rows)
+        newest = pc.sort_indices(table, sort_keys=[("created_at", "descending")])[:limit]
+        table = table.take(newest.take(pc.array_sort_indices(newest)))  # keep the stored order
+    return table
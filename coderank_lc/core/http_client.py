@@ -0,0 +1,168 @@
+# ==============================================
+# Shared HTTP Client — pooled keep-alive sessions with retry/backoff
+# ==============================================
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from coderank_lc.core import metrics
+from coderank_lc.core.settings import (
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_BASE,
+    HTTP_BACKOFF_MAX,
+    HF_REQUEST_TIMEOUT,
+)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class EndpointError(Exception):
+    """Structured failure of an HTTP endpoint call (after retries)."""
+
+    def __init__(
+        self,
+        url: str,
+        message: str,
+        status: Optional[int] = None,
+        attempts: int = 1,
+        retryable: bool = False,
+    ):
+        super().__init__(message)
+        self.url = url
+        self.message = message
+        self.status = status
+        self.attempts = attempts
+        self.retryable = retryable
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "message": self.message,
+            "status": self.status,
+            "attempts": self.attempts,
+            "retryable": self.retryable,
+        }
+
+    def __str__(self) -> str:
+        status = f"HTTP {self.status}" if self.status else "no response"
+        return f"{status} from {self.url} after {self.attempts} attempt(s): {self.message}"
+
+
+def _retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    """Parse `Retry-After` (seconds or HTTP date), falling back to HF's `estimated_time` hint."""
+    value = resp.headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    if resp.status_code == 503:
+        # HF endpoints report cold-start warm-up as {"error": ..., "estimated_time": 20.0}
+        try:
+            body = resp.json()
+            if isinstance(body, dict) and "estimated_time" in body:
+                return float(body["estimated_time"])
+        except ValueError:
+            pass
+    return None
+
+
+class PooledHTTPClient:
+    """A keep-alive `requests.Session` with a bounded connection pool and jittered exponential backoff."""
+
+    def __init__(
+        self,
+        pool_connections: int = HTTP_POOL_CONNECTIONS,
+        pool_maxsize: int = HTTP_POOL_MAXSIZE,
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff_base: float = HTTP_BACKOFF_BASE,
+        backoff_max: float = HTTP_BACKOFF_MAX,
+        timeout: float = HF_REQUEST_TIMEOUT,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        # pool_block=True turns the pool bound into backpressure instead of throwaway connections
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential delay for `attempt` (0-based); `Retry-After` acts as a floor."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def post_json(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        stream: bool = False,
+        max_retries: Optional[int] = None,
+    ) -> requests.Response:
+        """POST JSON with retries on connection errors and 429/5xx. Raises `EndpointError` on failure."""
+        attempts = (self.max_retries if max_retries is None else max_retries) + 1
+        for attempt in range(attempts):
+            retry_after = None
+            try:
+                resp = self.session.post(
+                    url, headers=headers, json=payload, timeout=timeout or self.timeout, stream=stream
+                )
+            except requests.RequestException as e:
+                error = EndpointError(url, f"{type(e).__name__}: {e}", attempts=attempt + 1, retryable=True)
+            else:
+                if resp.ok:
+                    resp.attempts = attempt + 1  # lets callers report retries
+                    return resp
+                retryable = resp.status_code in RETRY_STATUSES
+                retry_after = _retry_after_seconds(resp)
+                error = EndpointError(
+                    url, resp.text[:500], status=resp.status_code, attempts=attempt + 1, retryable=retryable
+                )
+                resp.close()
+                if not retryable:
+                    raise error
+
+            if attempt + 1 < attempts:
+                metrics.inc("http_retries_total", host=urlsplit(url).netloc)
+                delay = self.backoff(attempt, retry_after)
+                print(f"🔁 Retrying {url} in {delay:.1f}s ({error})")
+                time.sleep(delay)
+        raise error
+
+    def close(self):
+        self.session.close()
+
+
+# ==============================================
+# Process-wide shared client
+# ==============================================
+_client: Optional[PooledHTTPClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> PooledHTTPClient:
+    """Return the shared pooled client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PooledHTTPClient()
+    return _client
@@ -0,0 +1,322 @@
+# ==============================================
+# Metrics — spans, histograms and profiling hooks
+# ==============================================
+"""Lightweight in-process instrumentation.
+
+    with span("agent_call", agent="concise") as attrs:
+        ...
+        attrs["bytes"] = len(body)
+
+Every span records its duration (ms) plus each numeric attribute into histograms keyed by
+span name and labels, and keeps the most recent spans for the JSON snapshot. Export with
+`prometheus_text()` or `snapshot()`. With METRICS_ENABLED=0 `span` returns a shared no-op
+context manager, so instrumented code pays one flag check.
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from coderank_lc.core.settings import (
+    METRICS_ENABLED,
+    METRICS_PROFILE,
+    METRICS_PROFILER,
+    METRICS_PROFILE_DIR,
+    METRICS_DUMP_PATH,
+)
+
+# Upper bounds shared by every histogram; durations are in ms, sizes in their own unit
+BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Bucket upper bound containing the q-quantile (a coarse estimate, like Prometheus')."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return float(bound)
+        return float("inf")
+
+
+class Registry:
+    """Thread-safe store of histograms and counters plus a ring buffer of recent spans."""
+
+    def __init__(self, recent: int = 500):
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        self.recent: "deque[Dict[str, Any]]" = deque(maxlen=recent)
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, LabelKey]:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def record_span(self, name: str, labels: Dict[str, Any], duration_ms: float, attrs: Dict[str, Any], error: str):
+        self.observe(f"{name}_duration_ms", duration_ms, **labels)
+        for attr, value in attrs.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.observe(f"{name}_{attr}", value, **labels)
+        if error:
+            self.inc(f"{name}_errors_total", **labels)
+        with self._lock:
+            self.recent.append({
+                "name": name, "labels": labels, "ms": round(duration_ms, 3),
+                "attrs": attrs, "error": error, "ts": time.time(),
+            })
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.recent.clear()
+
+    # --- Export ---
+    def prometheus_text(self, prefix: str = "coderank_") -> str:
+        def fmt(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), hist in sorted(self.histograms.items()):
+                metric = prefix + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), hist.counts):
+                    cumulative += n
+                    lines.append(f"{metric}_bucket{fmt(labels, (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_sum{fmt(labels)} {hist.sum:.6g}")
+                lines.append(f"{metric}_count{fmt(labels)} {hist.count}")
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = prefix + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{fmt(labels)} {value:.6g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self, recent: int = 50) -> Dict[str, Any]:
+        with self._lock:
+            histograms = [{
+                "name": name,
+                "labels": dict(labels),
+                "count": h.count,
+                "sum": round(h.sum, 3),
+                "mean": round(h.sum / h.count, 3) if h.count else 0.0,
+                "p50": h.quantile(0.5),
+                "p95": h.quantile(0.95),
+                "p99": h.quantile(0.99),
+            } for (name, labels), h in sorted(self.histograms.items())]
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.counters.items())]
+            spans = list(self.recent)[-recent:] if recent else []
+        return {"enabled": _enabled, "histograms": histograms, "counters": counters, "recent_spans": spans}
+
+
+REGISTRY = Registry()
+_enabled = METRICS_ENABLED
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool):
+    global _enabled
+    _enabled = flag
+
+
+# ==============================================
+# Spans
+# ==============================================
+class _Discard(dict):
+    """Attribute sink handed out by disabled spans; writes are dropped."""
+
+    def __setitem__(self, key, value):
+        pass
+
+    def update(self, *args, **kwargs):
+        pass
+
+
+class _NullSpan:
+    _attrs = _Discard()
+
+    def __enter__(self):
+        return self._attrs
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+@contextmanager
+def _live_span(name: str, labels: Dict[str, Any]):
+    attrs: Dict[str, Any] = {}
+    error = ""
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except GeneratorExit:
+        raise  # a consumer stopped reading a stream early; not a failure
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        REGISTRY.record_span(name, labels, (time.perf_counter() - start) * 1000, attrs, error)
+
+
+def span(name: str, **labels):
+    """Time a block; the yielded dict collects numeric attributes (bytes, tokens, batch size...)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _live_span(name, labels)
+
+
+def observe(name: str, value: float, **labels):
+    if _enabled:
+        REGISTRY.observe(name, value, **labels)
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    if _enabled:
+        REGISTRY.inc(name, value, **labels)
+
+
+def prometheus_text() -> str:
+    return REGISTRY.prometheus_text()
+
+
+def snapshot(recent: int = 50) -> Dict[str, Any]:
+    return REGISTRY.snapshot(recent)
+
+
+# ==============================================
+# Profiling hook
+# ==============================================
+def _cprofile(name: str):
+    import cProfile
+
+    @contextmanager
+    def run():
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(METRICS_PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(METRICS_PROFILE_DIR, f"{name}-{time.time():.0f}.prof"))
+
+    return run()
+
+
+def _pyinstrument(name: str):
+    from pyinstrument import Profiler
+
+    @contextmanager
+    def run():
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            os.makedirs(METRICS_PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(METRICS_PROFILE_DIR, f"{name}-{time.time():.0f}.html"), "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+
+    return run()
+
+
+PROFILERS: Dict[str, Callable[[str], Any]] = {"cprofile": _cprofile, "pyinstrument": _pyinstrument}
+_profile_targets = {n.strip() for n in METRICS_PROFILE.split(",") if n.strip()}
+_profiler: Callable[[str], Any] = PROFILERS.get(METRICS_PROFILER, _cprofile)
+
+
+def set_profiler(factory: Callable[[str], Any], targets: Optional[set] = None):
+    """Plug in a profiler: `factory(name)` returns a context manager wrapped around each profiled target."""
+    global _profiler, _profile_targets
+    _profiler = factory
+    if targets is not None:
+        _profile_targets = set(targets)
+
+
+def profile(name: str):
+    """Profile a block if `name` is listed in METRICS_PROFILE (or via `set_profiler`), else do nothing."""
+    if name in _profile_targets or "*" in _profile_targets:
+        return _profiler(name)
+    return _NULL_SPAN
+
+
+def instrument_node(name: str, fn: Callable) -> Callable:
+    """Wrap a graph node in a `graph_node` span and the profiling hook.
+
+    `functools.wraps` keeps the node's signature visible, so LangGraph still passes
+    `config` to nodes that accept it.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled and not _profile_targets:
+            return fn(*args, **kwargs)
+        with span("graph_node", node=name), profile(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def _dump_at_exit():
+    if _enabled and METRICS_DUMP_PATH and (REGISTRY.histograms or REGISTRY.counters):
+        os.makedirs(os.path.dirname(os.path.abspath(METRICS_DUMP_PATH)), exist_ok=True)
+        with open(METRICS_DUMP_PATH, "w", encoding="utf-8") as f:
+            json.dump(snapshot(recent=0), f, indent=2, default=str)
+
+
+atexit.register(_dump_at_exit)
@@ -0,0 +1,255 @@
+# ==============================================
+# Model Registry — hot-swappable reranker checkpoints
+# ==============================================
+"""Keep one active reranker per process and replace it without a restart.
+
+The source of the active model is either a manifest file (`RERANKER_MANIFEST`, written by
+`publish`, e.g. `train_reranker.py --publish`) or a checkpoint directory whose newest file
+mtime acts as its version. A watcher thread polls the source; when the version changes it
+loads the new checkpoint in the background, scores a canary batch, and swaps it in
+atomically. Callers hold a lease on the model they started with, so in-flight requests
+finish on the old model, which is released once its last lease ends.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import metrics
+from .settings import RERANKER_WATCH_INTERVAL
+
+# Scored on every freshly loaded model before it may serve traffic
+CANARY_PAIRS: List[Tuple[str, str]] = [
+    ("Reverse a string in Python.", "def reverse(s):\n    return s[::-1]"),
+    ("Reverse a string in Python.", "print('hello world')"),
+    ("Sum a list of numbers.", "def total(xs):\n    return sum(xs)"),
+]
+
+
+def model_identity(path: str) -> str:
+    """Identify a checkpoint: hub names as-is, local dirs by absolute path + newest file mtime."""
+    if not os.path.isdir(path):
+        return path
+    # Files only: a training run rewriting its checkpoint-last/ subdir is not a new model
+    mtimes = [os.path.getmtime(e.path) for e in os.scandir(path) if e.is_file()]
+    return f"{os.path.abspath(path)}@{max(mtimes, default=0):.0f}"
+
+
+def read_manifest(manifest_path: str) -> Optional[Tuple[str, str]]:
+    """(model path, version) from a manifest, or None if it is missing or unreadable."""
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    path = data.get("path")
+    if not path:
+        return None
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(manifest_path)), path)
+    return path, str(data.get("version") or model_identity(path))
+
+
+def publish(manifest_path: str, model_path: str, version: str = "") -> Dict[str, Any]:
+    """Point the manifest at `model_path`; running registries pick it up on their next poll."""
+    entry = {
+        "path": os.path.abspath(model_path),
+        "version": version or f"{os.path.basename(os.path.normpath(model_path))}@{time.strftime('%Y%m%dT%H%M%S')}",
+        "published_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    tmp = f"{manifest_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, indent=2)
+    os.replace(tmp, manifest_path)  # readers never see a half-written manifest
+    return entry
+
+
+class LoadedModel:
+    """One loaded checkpoint plus the resources (e.g. a scheduler) that serve it.
+
+    `closers` run once the model is retired and its last lease is released.
+    """
+
+    def __init__(self, model: Any, version: str, source: str):
+        self.model = model
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+        self.scheduler: Any = None  # micro-batcher serving this model, attached by the reranker
+        self.closers: List[Callable[[], None]] = []
+        self._leases = 0
+        self._retired = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self._leases += 1
+
+    def release(self):
+        with self._lock:
+            self._leases -= 1
+            done = self._retired and self._leases == 0
+        if done:
+            self._close()
+
+    def retire(self):
+        with self._lock:
+            self._retired = True
+            done = self._leases == 0
+        if done:
+            self._close()
+
+    def _close(self):
+        for close in self.closers:
+            try:
+                close()
+            except Exception as e:
+                print(f"⚠️ Releasing reranker {self.version} failed: {e}")
+        self.closers.clear()
+
+
+class ModelRegistry:
+    """Own the active `LoadedModel`; load, canary-check and swap in new versions.
+
+    loader(path)            → model
+    predict(model, pairs)   → scores, the same path real requests take
+    resolve()               → (path, version) the registry should be serving
+    on_swap(new)            → called after every swap (and the first load)
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Any],
+        predict: Callable[[Any, List[Tuple[str, str]]], List[float]],
+        resolve: Callable[[], Tuple[str, str]],
+        on_swap: Optional[Callable[[LoadedModel], None]] = None,
+        interval: float = RERANKER_WATCH_INTERVAL,
+    ):
+        self.loader = loader
+        self.predict = predict
+        self.resolve = resolve
+        self.on_swap = on_swap
+        self.interval = interval
+        self.swaps = 0
+        self.failures = 0
+        self._active: Optional[LoadedModel] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # one load at a time
+        self._pending: Optional[str] = None  # version seen once, waiting to be stable
+        self._failed: Optional[str] = None
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._active is not None
+
+    @property
+    def active(self) -> Optional[LoadedModel]:
+        return self._active
+
+    def current(self) -> LoadedModel:
+        """The active model, loading it synchronously on first use (thread-safe)."""
+        if self._active is None:
+            with self._load_lock:
+                if self._active is None:
+                    path, version = self.resolve()
+                    self._install(self.load(path, version))
+                    if self.interval > 0:
+                        self.watch()
+        return self._active
+
+    @contextmanager
+    def lease(self) -> Iterator[LoadedModel]:
+        """Pin the active model for the duration of one request, across any swap."""
+        self.current()
+        with self._lock:
+            entry = self._active
+            entry.acquire()
+        try:
+            yield entry
+        finally:
+            entry.release()
+
+    def load(self, path: str, version: str) -> LoadedModel:
+        """Load a checkpoint and score the canary batch; raises if the model is unusable."""
+        start = time.perf_counter()
+        entry = LoadedModel(self.loader(path), version, path)
+        scores = list(self.predict(entry.model, CANARY_PAIRS))
+        if len(scores) != len(CANARY_PAIRS) or not all(math.isfinite(s) for s in scores):
+            raise ValueError(f"canary batch returned {scores!r}")
+        print(f"⚙️ Reranker {version} loaded and warmed up in {time.perf_counter() - start:.1f}s")
+        return entry
+
+    def _install(self, entry: LoadedModel):
+        with self._lock:
+            old, self._active = self._active, entry
+        if self.on_swap is not None:
+            self.on_swap(entry)
+        if old is not None:
+            self.swaps += 1
+            metrics.inc("reranker_swaps_total")
+            print(f"🔁 Reranker swapped: {old.version} → {entry.version}")
+            old.retire()  # in-flight leases finish on the old model first
+
+    def check(self) -> bool:
+        """Poll the source once; load and swap if a new version has been stable for two polls."""
+        path, version = self.resolve()
+        active = self._active
+        if active is not None and version == active.version:
+            self._pending = None
+            return False
+        if version == self._failed:
+            return False
+        if version != self._pending:
+            self._pending = version  # a checkpoint still being written keeps changing; wait a poll
+            return False
+        with self._load_lock:
+            try:
+                entry = self.load(path, version)
+            except Exception as e:
+                self.failures += 1
+                self._failed = version
+                metrics.inc("reranker_swap_failures_total")
+                print(f"⚠️ Reranker {version} rejected, keeping {active.version if active else 'none'}: {e}")
+                return False
+            self._pending = None
+            self._install(entry)
+        return True
+
+    def watch(self):
+        """Start the background poller (idempotent)."""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="reranker-registry", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️ Reranker registry poll failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        active = self._active
+        return {
+            "version": active.version if active else "",
+            "source": active.source if active else "",
+            "loaded_at": active.loaded_at if active else None,
+            "swaps": self.swaps,
+            "failures": self.failures,
+            "watching": self._watcher is not None,
+        }
@@ -0,0 +1,150 @@
+# ==============================================
+# ONNX Runtime Reranker Backend (optional int8 quantization)
+# ==============================================
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from coderank_lc.core.settings import RERANKER_NUM_THREADS
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+
+def export_onnx(model_path: str, out_dir: str, quantize: bool = False, opset: int = 17) -> str:
+    """Export a cross-encoder checkpoint (hub name or local dir) to ONNX, optionally int8-quantized.
+
+    The tokenizer and config are saved alongside so `OnnxCrossEncoder` can load `out_dir` alone.
+    Returns the path of the model file `OnnxCrossEncoder` will pick up.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path).eval()
+
+    sample = tokenizer([("query", "def f(): pass")], padding=True, truncation=True, return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "seq"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    print(f"📦 Exporting {model_path} → {fp32_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(out_dir)
+    model.config.save_pretrained(out_dir)
+
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = os.path.join(out_dir, INT8_FILE)
+    print(f"🗜️ Quantizing (dynamic int8) → {int8_path}")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class OnnxCrossEncoder:
+    """ONNX Runtime stand-in for `CrossEncoder.predict` on CPU."""
+
+    def __init__(self, onnx_dir: str, quantized: bool = True, num_threads: int = RERANKER_NUM_THREADS, max_length: int = 512):
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        int8_path = os.path.join(onnx_dir, INT8_FILE)
+        self.model_file = int8_path if quantized and os.path.exists(int8_path) else os.path.join(onnx_dir, FP32_FILE)
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        self.max_length = min(max_length, self.tokenizer.model_max_length)
+
+        opts = ort.SessionOptions()
+        if num_threads > 0:
+            opts.intra_op_num_threads = num_threads
+            opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_file, opts, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+        # Mirror CrossEncoder's default activation: the config's override, else sigmoid for 1 label
+        config = AutoConfig.from_pretrained(onnx_dir)
+        activation = getattr(config, "sbert_ce_default_activation_function", None) or ""
+        self.apply_sigmoid = "Sigmoid" in activation or (not activation and config.num_labels == 1)
+        self.num_labels = config.num_labels
+        print(f"⚙️ ONNX reranker loaded: {self.model_file} (threads={num_threads or 'auto'})")
+
+    def predict(self, pairs: List[Tuple[str, str]], batch_size: int = 32, **_) -> np.ndarray:
+        scores = []
+        for i in range(0, len(pairs), batch_size):
+            batch = pairs[i:i + batch_size]
+            features = self.tokenizer(
+                [q for q, _ in batch], [r for _, r in batch],
+                padding=True, truncation="only_second", max_length=self.max_length, return_tensors="np",
+            )
+            scores.append(self.predict_features(features))
+        return np.concatenate(scores) if scores else np.zeros(0)
+
+    def predict_features(self, features) -> np.ndarray:
+        """Score one already-tokenized, padded batch (input_ids / attention_mask / token_type_ids)."""
+        logits = self.session.run(["logits"], {n: np.asarray(features[n], dtype=np.int64) for n in self.input_names})[0]
+        if self.apply_sigmoid:
+            logits = 1.0 / (1.0 + np.exp(-logits))
+        return logits[:, 0] if logits.shape[1] == 1 else logits
+
+
+def parity_check(
+    pairs: List[Tuple[str, str]],
+    torch_model_path: str,
+    onnx_dir: str,
+    quantized: bool = True,
+    batch_size: int = 32,
+    onnx_model: Optional[OnnxCrossEncoder] = None,
+) -> Dict[str, float]:
+    """Compare ONNX scores against the torch CrossEncoder on `pairs`.
+
+    Reports score drift plus ranking agreement: the share of same-query response pairs
+    that both backends order the same way, and whether each query's top response matches.
+    """
+    from scipy.stats import spearmanr
+    from sentence_transformers import CrossEncoder
+
+    ref = np.asarray(CrossEncoder(torch_model_path).predict(pairs, batch_size=batch_size), dtype=float)
+    onnx_model = onnx_model or OnnxCrossEncoder(onnx_dir, quantized=quantized)
+    got = np.asarray(onnx_model.predict(pairs, batch_size=batch_size), dtype=float)
+
+    by_query: Dict[str, List[int]] = {}
+    for i, (q, _) in enumerate(pairs):
+        by_query.setdefault(q, []).append(i)
+
+    agree = total = top1 = 0
+    for idx in by_query.values():
+        idx = np.asarray(idx)
+        top1 += int(np.argmax(ref[idx]) == np.argmax(got[idx]))
+        if len(idx) < 2:
+            continue
+        iu = np.triu_indices(len(idx), k=1)
+        ref_order = np.sign(ref[idx][:, None] - ref[idx][None, :])[iu]
+        got_order = np.sign(got[idx][:, None] - got[idx][None, :])[iu]
+        agree += int((ref_order == got_order).sum())
+        total += len(ref_order)
+
+    rho = spearmanr(ref, got)[0] if len(pairs) > 1 else 1.0
+    return {
+        "pairs": len(pairs),
+        "max_abs_diff": float(np.max(np.abs(ref - got))) if len(pairs) else 0.0,
+        "mean_abs_diff": float(np.mean(np.abs(ref - got))) if len(pairs) else 0.0,
+        "spearman_rho": float(rho),
+        "pairwise_order_agreement": agree / total if total else 1.0,
+        "top1_agreement": top1 / len(by_query) if by_query else 1.0,
+    }
@@ -1,13 +1,564 @@
+import asyncio
+import hashlib
 import os
-from typing import List
-from sentence_transformers import CrossEncoder
-from .settings import RERANKER_BASE, RERANKER_LOAD_DIR
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+from . import metrics
+from .model_registry import LoadedModel, ModelRegistry, model_identity, read_manifest
+from .settings import (
+    RERANKER_BASE,
+    RERANKER_LOAD_DIR,
+    RERANKER_MANIFEST,
+    RERANKER_BATCH_SIZE,
+    RERANKER_SCORE_CACHE_SIZE,
+    RERANKER_SCORE_CACHE_PATH,
+    RERANKER_BACKEND,
+    RERANKER_ONNX_DIR,
+    RERANKER_ONNX_QUANTIZED,
+    RERANKER_NUM_THREADS,
+    RERANKER_MICROBATCH,
+    RERANKER_MAX_WAIT_MS,
+    RERANKER_WINDOWED,
+    RERANKER_MAX_LENGTH,
+    RERANKER_WINDOW_OVERLAP,
+    RERANKER_MAX_WINDOWS,
+    RERANKER_WINDOW_REDUCER,
+    RERANKER_SERVICE_URL,
+    RERANKER_SERVICE_TIMEOUT,
+    RERANKER_SERVICE_RETRY,
+)
+
+
+def _load_model(path: str):
+    """Load one checkpoint: an ONNX export dir with the ONNX backend, else a torch `CrossEncoder`."""
+    if RERANKER_BACKEND == "onnx":
+        from .onnx_reranker import FP32_FILE, OnnxCrossEncoder
+        if os.path.exists(os.path.join(path, FP32_FILE)):
+            return OnnxCrossEncoder(path, quantized=RERANKER_ONNX_QUANTIZED)
+        print(f"⚠️ No ONNX export in '{path}' — run scripts/export_onnx_reranker.py. Using torch.")
+
+    from sentence_transformers import CrossEncoder
+    if RERANKER_NUM_THREADS > 0:
+        import torch
+        torch.set_num_threads(RERANKER_NUM_THREADS)
+    return CrossEncoder(path)
+
+
+def _resolve_source() -> Tuple[str, str]:
+    """(path, version) to serve: the manifest if set, else the ONNX dir / RERANKER_LOAD_DIR / base model."""
+    if RERANKER_MANIFEST:
+        found = read_manifest(RERANKER_MANIFEST)
+        if found is not None:
+            return found
+    if RERANKER_BACKEND == "onnx" and os.path.isdir(RERANKER_ONNX_DIR):
+        precision = "int8" if RERANKER_ONNX_QUANTIZED else "fp32"
+        return RERANKER_ONNX_DIR, f"onnx:{model_identity(RERANKER_ONNX_DIR)}:{precision}"
+    # Re-checked on every poll, so a RERANKER_LOAD_DIR created after start-up is picked up
+    path = RERANKER_LOAD_DIR if (RERANKER_LOAD_DIR and os.path.isdir(RERANKER_LOAD_DIR)) else RERANKER_BASE
+    return path, model_identity(path)
+
+
+def _on_swap(entry: LoadedModel):
+    if _score_cache is not None:
+        _score_cache.bind(entry.version)
+
+
+def get_registry() -> ModelRegistry:
+    return _registry
+
+
+def get_model():
+    """Return the active reranker model, loading it on first use (thread-safe)."""
+    return _registry.current().model
+
+
+def model_version() -> str:
+    """Version tag of the active model ("" before the first load)."""
+    active = _registry.active
+    return active.version if active else ""
+
+
+def warm_up():
+    """Load the model and run one tiny batch so the first real request pays no setup cost.
+
+    In client mode only the scoring service is checked; the local model loads lazily if it is down.
+    """
+    client = get_service_client()
+    if client is not None and client.health() is not None:
+        return
+    _registry.current()  # loading includes the canary batch
+
+
+# ==============================================
+# Scoring service client — share one model across processes
+# ==============================================
+class ScoringServiceClient:
+    """Keep-alive client for `reranker_service`; returns None instead of raising so callers fall back.
+
+    After a failure the service is skipped for `retry_interval` seconds, so an outage costs
+    one timeout rather than one per request.
+    """
+
+    def __init__(self, url: str, timeout: float = RERANKER_SERVICE_TIMEOUT, retry_interval: float = RERANKER_SERVICE_RETRY):
+        from .http_client import PooledHTTPClient
+
+        self.url = url.rstrip("/")
+        self.retry_interval = retry_interval
+        self.http = PooledHTTPClient(max_retries=0, timeout=timeout)
+        self._down_until = 0.0
+
+    def _call(self, method: str, path: str, payload=None) -> Optional[dict]:
+        from .http_client import EndpointError
+
+        if time.monotonic() < self._down_until:
+            return None
+        try:
+            if method == "GET":
+                resp = self.http.session.get(self.url + path, timeout=self.http.timeout)
+                resp.raise_for_status()
+            else:
+                resp = self.http.post_json(self.url + path, payload)
+            return resp.json()
+        except (EndpointError, ValueError, OSError) as e:
+            # requests' exceptions derive from OSError
+            print(f"⚠️ Scoring service {self.url} unavailable ({e}) — scoring in-process for {self.retry_interval:g}s")
+            self._down_until = time.monotonic() + self.retry_interval
+            return None
+
+    def health(self) -> Optional[dict]:
+        return self._call("GET", "/health")
+
+    def score(self, pairs: List[Tuple[str, str]]) -> Optional[Tuple[List[float], str]]:
+        """(scores, model version) from the service, or None if it is unavailable."""
+        body = self._call("POST", "/score", {"pairs": [list(p) for p in pairs]})
+        if body is None or len(body.get("scores", ())) != len(pairs):
+            return None
+        return [float(s) for s in body["scores"]], str(body.get("model", ""))
+
+
+_service_url = RERANKER_SERVICE_URL
+_service_client: Optional[ScoringServiceClient] = None
+
+
+def set_service_url(url: str):
+    """Point `score*` at a scoring service, or "" to always score in-process (the service itself does this)."""
+    global _service_url, _service_client
+    _service_url, _service_client = url, None
+
+
+def get_service_client() -> Optional[ScoringServiceClient]:
+    global _service_client
+    if _service_url and _service_client is None:
+        _service_client = ScoringServiceClient(_service_url)
+    return _service_client if _service_url else None
+
+
+# ==============================================
+# Score cache — (model, query, response) → score
+# ==============================================
+class ScoreCache:
+    """Bounded in-memory LRU of reranker scores with an optional SQLite backing file.
+
+    Keys hash the model identity and scoring config together with the query and response
+    text, so scores from a different checkpoint or windowing setup never match; `bind`
+    also drops the in-memory entries.
+    """
+
+    def __init__(self, max_entries: int = RERANKER_SCORE_CACHE_SIZE, path: str = RERANKER_SCORE_CACHE_PATH):
+        self.max_entries = max_entries
+        self.model_id = ""
+        self.hits = 0
+        self.misses = 0
+        self._mem: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL NOT NULL)")
+            self._conn.commit()
+
+    def bind(self, model_id: str):
+        with self._lock:
+            if model_id != self.model_id:
+                self._mem.clear()
+                self.model_id = model_id
+
+    def key(self, query: str, response: str, model_id: Optional[str] = None) -> str:
+        h = hashlib.sha256()
+        for part in (self.model_id if model_id is None else model_id, query, response):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, float]:
+        found: Dict[str, float] = {}
+        with self._lock:
+            for k in keys:
+                if k in self._mem:
+                    self._mem.move_to_end(k)
+                    found[k] = self._mem[k]
+            missing = [k for k in set(keys) if k not in found]
+            if self._conn is not None and missing:
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, score FROM scores WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for k, s in rows:
+                        found[k] = s
+                        self._remember(k, s)
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+        return found
+
+    def put_many(self, items: Dict[str, float]):
+        with self._lock:
+            for k, s in items.items():
+                self._remember(k, s)
+            if self._conn is not None and items:
+                self._conn.executemany("INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)", items.items())
+                self._conn.commit()
+
+    def _remember(self, key: str, value: float):
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._mem)}
+
+
+_score_cache: Optional[ScoreCache] = ScoreCache() if RERANKER_SCORE_CACHE_SIZE > 0 else None
+
+
+# ==============================================
+# Micro-batching scheduler — one forward pass for many concurrent callers
+# ==============================================
+class MicroBatcher:
+    """Queue (query, response) pairs from any number of threads and score them in shared batches.
+
+    A background worker takes up to `max_batch_size` queued pairs once the batch is full
+    or the oldest pair has waited `max_wait_ms`, runs a single `predict_fn` call and
+    resolves each caller's futures. Only the worker touches the model.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[List[Tuple[str, str]]], List[float]],
+        max_batch_size: int = RERANKER_BATCH_SIZE,
+        max_wait_ms: float = RERANKER_MAX_WAIT_MS,
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "deque[Tuple[Tuple[str, str], Future, float]]" = deque()
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+        self.batches = 0
+        self.pairs = 0
+        self.max_seen = 0
+        self.wait_total = 0.0
+        self.size_histogram: Dict[int, int] = {}
+
+    def submit(self, pairs: List[Tuple[str, str]]) -> List[Future]:
+        futures = [Future() for _ in pairs]
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="reranker-microbatch", daemon=True)
+                self._worker.start()
+            self._queue.extend((p, f, now) for p, f in zip(pairs, futures))
+            self._cond.notify()
+        return futures
+
+    def score(self, pairs: List[Tuple[str, str]], timeout: Optional[float] = None) -> List[float]:
+        return [f.result(timeout) for f in self.submit(pairs)]
+
+    async def score_async(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        return list(await asyncio.gather(*(asyncio.wrap_future(f) for f in self.submit(pairs))))
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            # Hold the first pair until the batch fills or its wait budget runs out
+            deadline = self._queue[0][2] + self.max_wait if self._queue else 0.0
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # closed and drained
+            started = time.monotonic()
+            try:
+                scores = [float(s) for s in self.predict_fn([p for p, _, _ in batch])]
+                if len(scores) != len(batch):
+                    raise ValueError(f"predict_fn returned {len(scores)} scores for a batch of {len(batch)}")
+            except Exception as e:
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+            else:
+                for (_, fut, _), s in zip(batch, scores):
+                    fut.set_result(s)
+            with self._cond:
+                self.batches += 1
+                self.pairs += len(batch)
+                self.max_seen = max(self.max_seen, len(batch))
+                self.wait_total += sum(started - t for _, _, t in batch)
+                bucket = 1 << (len(batch) - 1).bit_length()
+                self.size_histogram[bucket] = self.size_histogram.get(bucket, 0) + 1
+
+    def close(self):
+        """Stop accepting pairs; the worker finishes what is queued and exits."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join()
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "batches": self.batches,
+                "pairs": self.pairs,
+                "mean_batch_size": self.pairs / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_seen,
+                "mean_wait_ms": 1000.0 * self.wait_total / self.pairs if self.pairs else 0.0,
+                # batches by size, bucketed to the next power of two
+                "batch_size_histogram": dict(sorted(self.size_histogram.items())),
+            }
+
+
+def _batch_shape(model, pairs: List[Tuple[str, str]], batch_size: int) -> Dict[str, float]:
+    """Forward passes, mean padded length and padding share for metrics (tokenizes, so only when enabled)."""
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return {}
+    max_length = getattr(model, "max_length", None) or 512
+    lengths = [len(ids) for ids in tokenizer(
+        [q for q, _ in pairs], [r for _, r in pairs], truncation=True, max_length=max_length
+    )["input_ids"]]
+    chunks = [lengths[i:i + batch_size] for i in range(0, len(lengths), batch_size)]
+    padded = sum(max(c) * len(c) for c in chunks)
+    return {
+        "forward_passes": len(chunks),
+        "padded_length": padded / len(lengths),
+        "padding_pct": 100.0 * (padded - sum(lengths)) / padded if padded else 0.0,
+    }
+
+
+def _windowed_supported(model) -> bool:
+    """Windowing needs the model's tokenizer and a single relevance logit to aggregate."""
+    if not RERANKER_WINDOWED or getattr(model, "tokenizer", None) is None:
+        return False
+    num_labels = getattr(model, "num_labels", None) or getattr(getattr(model, "config", None), "num_labels", 1)
+    return num_labels == 1
+
+
+def _forward(model, batch):
+    """One forward pass over a padded, pre-tokenized batch; returns activated scores."""
+    if hasattr(model, "predict_features"):  # ONNX backend
+        return model.predict_features(batch)
+    import torch
+    device = model.model.device
+    with torch.inference_mode():
+        logits = model.model(**{k: torch.from_numpy(v).to(device) for k, v in batch.items()}, return_dict=True).logits
+        return model.default_activation_function(logits)[:, 0].float().cpu().numpy()
+
+
+def _predict_windowed(model, pairs: List[Tuple[str, str]], batch_size: int, attrs: Dict) -> List[float]:
+    """Tokenize once, split long responses into overlapping windows, score length-sorted batches, reduce per pair."""
+    import numpy as np
+    from .windowed_scoring import length_batches, pad_batch, plan_windows, reduce_scores
+
+    tokenizer = model.tokenizer
+    max_length = min(RERANKER_MAX_LENGTH, getattr(model, "max_length", None) or tokenizer.model_max_length)
+    plan = plan_windows(tokenizer, pairs, max_length, RERANKER_WINDOW_OVERLAP, RERANKER_MAX_WINDOWS,
+                        RERANKER_WINDOW_REDUCER)
+    lengths = plan.lengths
+    window_scores = np.zeros(len(lengths), dtype=np.float64)
+    batches = length_batches(lengths, batch_size)
+    padded = 0
+    for idx in batches:
+        batch = pad_batch([plan.features[i] for i in idx], tokenizer.pad_token_id or 0)
+        window_scores[idx] = _forward(model, batch)
+        padded += batch["input_ids"].size
+    attrs.update(
+        windows=len(lengths),
+        forward_passes=len(batches),
+        padded_length=padded / len(lengths),
+        padding_pct=100.0 * (padded - sum(lengths)) / padded,
+    )
+    return reduce_scores(window_scores, plan.owners, len(pairs), RERANKER_WINDOW_REDUCER)
+
+
+def _predict_pairs(pairs: List[Tuple[str, str]], batch_size: int, model=None) -> List[float]:
+    if not pairs:
+        return []
+    if model is None:
+        model = get_model()
+    if _windowed_supported(model):
+        with metrics.span("reranker_batch", backend=RERANKER_BACKEND) as attrs:
+            scores = _predict_windowed(model, pairs, batch_size, attrs)
+            attrs["size"] = len(pairs)
+        return scores
+
+    shape = _batch_shape(model, pairs, batch_size) if metrics.enabled() else {}
+    with metrics.span("reranker_batch", backend=RERANKER_BACKEND) as attrs:
+        scores = model.predict(pairs, batch_size=batch_size)
+        attrs.update(size=len(pairs), **shape)
+    return [float(s) for s in scores]
+
+
+_registry = ModelRegistry(
+    loader=_load_model,
+    predict=lambda model, pairs: _predict_pairs(pairs, len(pairs), model),
+    resolve=_resolve_source,
+    on_swap=_on_swap,
+)
+_scheduler_lock = threading.Lock()
+
+
+def _scheduler_for(entry: LoadedModel) -> MicroBatcher:
+    """The micro-batcher feeding `entry`'s model; closed when that model is retired and drained."""
+    scheduler = entry.scheduler
+    if scheduler is None:
+        with _scheduler_lock:
+            scheduler = entry.scheduler
+            if scheduler is None:
+                model = entry.model
+                scheduler = entry.scheduler = MicroBatcher(lambda pairs: _predict_pairs(pairs, len(pairs), model))
+                entry.closers.append(scheduler.close)
+    return scheduler
+
+
+def get_scheduler() -> MicroBatcher:
+    """Return the micro-batcher feeding the active model."""
+    return _scheduler_for(_registry.current())
+
+
+def _run_model(entry: LoadedModel, pairs: List[Tuple[str, str]], batch_size: int) -> List[float]:
+    if RERANKER_MICROBATCH:
+        return _scheduler_for(entry).score(pairs)
+    return _predict_pairs(pairs, batch_size, entry.model)
+
+
+def _cache_namespace(entry: LoadedModel) -> str:
+    """Model version plus the scoring config: windowed and truncated scores must never share keys."""
+    if not _windowed_supported(entry.model):
+        return f"{entry.version}|truncate"
+    return (f"{entry.version}|windowed:{RERANKER_MAX_LENGTH}:{RERANKER_WINDOW_OVERLAP}:"
+            f"{RERANKER_MAX_WINDOWS}:{RERANKER_WINDOW_REDUCER}")
+
+
+def _split_cached(pairs: List[Tuple[str, str]], entry: LoadedModel):
+    """(cache keys, cached scores, unseen deduplicated pairs by key)."""
+    namespace = _cache_namespace(entry)
+    keys = [_score_cache.key(q, r, namespace) for q, r in pairs]
+    known = _score_cache.get_many(keys)
+    todo = {k: p for k, p in zip(keys, pairs) if k not in known}
+    return keys, known, todo
 
-_model_path = RERANKER_LOAD_DIR if (RERANKER_LOAD_DIR and os.path.isdir(RERANKER_LOAD_DIR)) else RERANKER_BASE
-_cross = CrossEncoder(_model_path)
 
 def score(query: str, resp: str) -> float:
-    return float(_cross.predict([(query, resp)])[0])
+    return score_batch(query, [resp])[0]
 
 def score_batch(query: str, responses: List[str]) -> List[float]:
-    return [float(s) for s in _cross.predict([(query, r) for r in responses])]
+    return score_pairs([(query, r) for r in responses])
+
+def score_pairs(pairs: List[Tuple[str, str]], batch_size: int = RERANKER_BATCH_SIZE) -> List[float]:
+    """Score arbitrary (query, response) pairs; cached pairs are skipped and duplicates scored once.
+
+    With RERANKER_SERVICE_URL set the pairs go to the shared scoring service, falling back
+    to the local model when it is unreachable. With RERANKER_MICROBATCH the pairs join the
+    shared scheduler's batches, whose size (RERANKER_BATCH_SIZE) takes the place of `batch_size`.
+    """
+    return score_pairs_tagged(pairs, batch_size)[0]
+
+
+def score_pairs_tagged(pairs: List[Tuple[str, str]], batch_size: int = RERANKER_BATCH_SIZE) -> Tuple[List[float], str]:
+    """`score_pairs` plus the version of the model that produced every score, for storing alongside them."""
+    client = get_service_client()
+    if client is not None and pairs:
+        tagged = client.score(pairs)
+        if tagged is not None:
+            return tagged
+    # The lease pins one model for the whole call, even if a new version is swapped in meanwhile
+    with _registry.lease() as entry:
+        if not pairs:
+            return [], entry.version
+        if _score_cache is None:
+            return _run_model(entry, pairs, batch_size), entry.version
+
+        keys, known, todo = _split_cached(pairs, entry)
+        # Only unseen (deduplicated) pairs go to the model
+        if todo:
+            fresh = dict(zip(todo.keys(), _run_model(entry, list(todo.values()), batch_size)))
+            _score_cache.put_many(fresh)
+            known.update(fresh)
+        return [known[k] for k in keys], entry.version
+
+
+async def score_batch_async(query: str, responses: List[str]) -> List[float]:
+    return await score_pairs_async([(query, r) for r in responses])
+
+
+async def score_pairs_async(pairs: List[Tuple[str, str]]) -> List[float]:
+    """`score_pairs` for event-loop callers: awaits the scheduler instead of blocking the loop."""
+    return (await score_pairs_tagged_async(pairs))[0]
+
+
+async def score_pairs_tagged_async(pairs: List[Tuple[str, str]]) -> Tuple[List[float], str]:
+    if not pairs or not RERANKER_MICROBATCH or get_service_client() is not None:
+        return await asyncio.to_thread(score_pairs_tagged, pairs)
+    if not _registry.loaded:
+        await asyncio.to_thread(_registry.current)  # first load is slow; keep it off the loop
+    with _registry.lease() as entry:
+        scheduler = _scheduler_for(entry)
+        if _score_cache is None:
+            return await scheduler.score_async(pairs), entry.version
+
+        keys, known, todo = _split_cached(pairs, entry)
+        if todo:
+            fresh = dict(zip(todo.keys(), await scheduler.score_async(list(todo.values()))))
+            _score_cache.put_many(fresh)
+            known.update(fresh)
+        return [known[k] for k in keys], entry.version
+
+
+def stats() -> Dict[str, object]:
+    """Active model version plus registry, scheduler and score-cache counters."""
+    active = _registry.active
+    scheduler = active.scheduler if active else None
+    return {
+        "model": active.version if active else "",
+        "registry": _registry.stats(),
+        "scheduler": scheduler.stats() if scheduler is not None else None,
+        "cache": _score_cache.stats() if _score_cache is not None else None,
+    }
+
+
+def shutdown():
+    """Stop watching for new checkpoints and drain the micro-batching worker."""
+    _registry.stop()
+    active = _registry.active
+    if active is not None and active.scheduler is not None:
+        active.scheduler.close()
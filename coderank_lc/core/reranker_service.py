@@ -0,0 +1,66 @@
+# ==============================================
+# Reranker Scoring Service — one shared model for every local process
+# ==============================================
+# Run a single instance (one worker, so the weights load once):
+#   python -m coderank_lc.core.reranker_service
+# and point clients at it with RERANKER_SERVICE_URL=http://127.0.0.1:8765
+
+from contextlib import asynccontextmanager
+from typing import List, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from coderank_lc.core import metrics, reranker
+from coderank_lc.core.settings import RERANKER_SERVICE_HOST, RERANKER_SERVICE_PORT
+
+# The service scores in-process, whatever RERANKER_SERVICE_URL says
+reranker.set_service_url("")
+
+
+class ScoreRequest(BaseModel):
+    pairs: List[Tuple[str, str]]
+
+
+class ScoreResponse(BaseModel):
+    scores: List[float]
+    model: str
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    reranker.warm_up()
+    yield
+    reranker.shutdown()
+
+
+app = FastAPI(title="CodeRank reranker", lifespan=lifespan)
+
+
+@app.post("/score", response_model=ScoreResponse)
+async def score(req: ScoreRequest) -> ScoreResponse:
+    # Concurrent requests are coalesced by the micro-batching scheduler
+    scores, version = await reranker.score_pairs_tagged_async(req.pairs)
+    return ScoreResponse(scores=scores, model=version)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", **reranker.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> str:
+    return metrics.prometheus_text()
+
+
+@app.get("/metrics.json")
+async def metrics_snapshot():
+    return metrics.snapshot()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=RERANKER_SERVICE_HOST, port=RERANKER_SERVICE_PORT, workers=1)
@@ -0,0 +1,165 @@
+# ==============================================
+# Semantic Query Cache — reuse answers for paraphrased queries
+# ==============================================
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from coderank_lc.core.settings import (
+    SEMANTIC_CACHE_DIR,
+    SEMANTIC_CACHE_MODEL,
+    SEMANTIC_CACHE_THRESHOLD,
+)
+
+
+class SemanticCache:
+    """Brute-force cosine index over embeddings of past queries and their agent responses.
+
+    The index lives in `index_dir` as an append-only float32 matrix (`vectors.f32`) plus one
+    JSON line per entry (`entries.jsonl`), so new answers are persisted incrementally.
+    `meta.json` records the encoder; an index built with a different encoder is ignored.
+    """
+
+    def __init__(
+        self,
+        index_dir: str = SEMANTIC_CACHE_DIR,
+        model_name: str = SEMANTIC_CACHE_MODEL,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+    ):
+        self.index_dir = index_dir
+        self.model_name = model_name
+        self.threshold = threshold
+        self._encoder = None
+        self._lock = threading.Lock()
+        self._vectors_path = os.path.join(index_dir, "vectors.f32")
+        self._entries_path = os.path.join(index_dir, "entries.jsonl")
+        self._meta_path = os.path.join(index_dir, "meta.json")
+        self.entries: List[Dict] = []
+        self.vectors: Optional[np.ndarray] = None
+        self._load()
+
+    # --- Persistence ---
+    def _load(self):
+        if not all(os.path.exists(p) for p in (self._meta_path, self._vectors_path, self._entries_path)):
+            return
+        with open(self._meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name:
+            print(f"ℹ️ Semantic index was built with {meta.get('model')}; ignoring it.")
+            return
+        dim = int(meta["dim"])
+        with open(self._entries_path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        raw = np.fromfile(self._vectors_path, dtype=np.float32)
+        vectors = raw[: raw.size - raw.size % dim].reshape(-1, dim)
+        n = min(len(vectors), len(entries))  # tolerate a torn final append
+        if n:
+            self.vectors, self.entries = vectors[:n], entries[:n]
+
+    def _append(self, vectors: np.ndarray, entries: List[Dict]):
+        os.makedirs(self.index_dir, exist_ok=True)
+        if self.vectors is None:
+            # First write (or rebuild): start a fresh index for the current encoder
+            with open(self._meta_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": int(vectors.shape[1])}, f)
+            for path in (self._vectors_path, self._entries_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        with open(self._vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self._entries_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    # --- Embedding ---
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if self._encoder is None:
+            from sentence_transformers import SentenceTransformer
+            print(f"🧭 Loading semantic cache encoder: {self.model_name}")
+            self._encoder = SentenceTransformer(self.model_name)
+        vecs = self._encoder.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+        return vecs.astype(np.float32)
+
+    # --- Public API ---
+    def lookup(self, query: str) -> Optional[Tuple[float, Dict]]:
+        """Return (similarity, entry) for the closest past query above the threshold, else None."""
+        if self.vectors is None or not len(self.vectors):
+            return None
+        q = self._encode([query])[0]
+        with self._lock:
+            sims = self.vectors @ q
+            best = int(np.argmax(sims))
+            similarity = float(sims[best])
+            entry = self.entries[best]
+        if similarity < self.threshold:
+            return None
+        return similarity, entry
+
+    def add_many(self, items: List[Tuple[str, Dict[str, str]]]):
+        """Index (query, responses) pairs and persist them."""
+        if not items:
+            return
+        vectors = self._encode([q for q, _ in items])
+        entries = [{"query": q, "responses": r} for q, r in items]
+        with self._lock:
+            self._append(vectors, entries)
+            self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+            self.entries.extend(entries)
+
+    def add(self, query: str, responses: Dict[str, str]):
+        self.add_many([(query, responses)])
+
+    def rebuild_from_responses(self, limit: int = 5000) -> int:
+        """Rebuild the index from the stored `responses` collection, grouped by query."""
+        from coderank_lc.core.storage import list_recent_responses
+
+        grouped: Dict[str, Dict[str, str]] = {}
+        for doc in list_recent_responses(limit=limit):
+            query, agent, text = doc.get("query"), doc.get("agent"), doc.get("text")
+            if query and agent and text and not is_failed_response(text):
+                grouped.setdefault(query, {})[agent] = text
+
+        items = [(q, r) for q, r in grouped.items() if len(r) >= 2]
+        with self._lock:
+            self.vectors, self.entries = None, []
+            for path in (self._meta_path, self._vectors_path, self._entries_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.add_many(items)
+        return len(items)
+
+
+def is_failed_response(text: str) -> bool:
+    """Placeholder texts from failed/timed-out agents must never be served from cache.
+
+    Streaming appends the failure marker after whatever code had already arrived, so it may
+    appear anywhere in the text, not just at the start.
+    """
+    return "# [Agent " in text or text.startswith("# Mock:")
+
+
+# ==============================================
+# Process-wide shared cache
+# ==============================================
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Return the shared semantic cache, loading its index on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache()
+    return _cache
+
+
+if __name__ == "__main__":
+    print("🧭 Rebuilding semantic cache from stored responses...")
+    n = get_semantic_cache().rebuild_from_responses()
+    print(f"✅ Indexed {n} past queries → {SEMANTIC_CACHE_DIR}")
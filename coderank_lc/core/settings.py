@@ -1,14 +1,119 @@
 import os
+from dotenv import load_dotenv
+
+# Load .env before reading any settings so every importer sees the same values
+load_dotenv()
+
+# Storage backend: "astra" (remote Astra DB) or "sqlite" (embedded local file)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "astra")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/coderank.sqlite3")
+FEEDBACK_PAGE_SIZE = int(os.getenv("FEEDBACK_PAGE_SIZE", "500"))  # docs per page for streaming reads
+WATERMARK_DIR = os.getenv("WATERMARK_DIR", ".cache/watermarks")  # per-consumer "since" marks
+FEEDBACK_DATASET_DIR = os.getenv("FEEDBACK_DATASET_DIR", "data/feedback_arrow")  # local Arrow snapshot of pairs
+FEEDBACK_SOURCE = os.getenv("FEEDBACK_SOURCE", "dataset")  # "dataset" (local snapshot) or "storage"
+TOKENIZED_CACHE_DIR = os.getenv("TOKENIZED_CACHE_DIR", ".cache/tokenized")  # pre-tokenized training pairs
 
 # Astra
 ASTRA_DB_APPLICATION_TOKEN = os.getenv("ASTRA_DB_APPLICATION_TOKEN")
 ASTRA_DB_API_ENDPOINT = os.getenv("ASTRA_DB_API_ENDPOINT")
 ASTRA_DB_KEYSPACE = os.getenv("ASTRA_DB_KEYSPACE", "default_keyspace")
+ASTRA_WRITE_BEHIND = os.getenv("ASTRA_WRITE_BEHIND", "1") == "1"  # batch inserts off the request path
+ASTRA_FLUSH_SIZE = int(os.getenv("ASTRA_FLUSH_SIZE", "20"))  # docs per insert_many
+ASTRA_FLUSH_INTERVAL = float(os.getenv("ASTRA_FLUSH_INTERVAL", "2.0"))  # seconds
+ASTRA_QUEUE_MAX = int(os.getenv("ASTRA_QUEUE_MAX", "2000"))
+ASTRA_ENQUEUE_TIMEOUT = float(os.getenv("ASTRA_ENQUEUE_TIMEOUT", "5.0"))  # block this long before writing inline
+ASTRA_FLUSH_RETRIES = int(os.getenv("ASTRA_FLUSH_RETRIES", "3"))  # insert_many retries before per-document writes
+ASTRA_RETRY_BACKOFF = float(os.getenv("ASTRA_RETRY_BACKOFF", "0.5"))  # seconds, doubled per retry
+ASTRA_DEAD_LETTER_PATH = os.getenv("ASTRA_DEAD_LETTER_PATH", "data/astra_dead_letter.jsonl")  # unwritable docs
 
 # HF
-HF_API_URL = os.getenv("HF_API_URL", "")
+HF_API_URL = os.getenv("HF_API_URL", "")  # overrides every agent endpoint (e.g. a local stub server)
 HF_API_TOKEN = os.getenv("HF_API_TOKEN", "")
+HF_REQUEST_TIMEOUT = float(os.getenv("HF_REQUEST_TIMEOUT", "120"))
+# Replicas per agent style, e.g. HF_ENDPOINTS_CONCISE=https://a...,https://b... (empty = HF_MODELS)
+HF_ENDPOINTS = {
+    style: [u.strip() for u in os.getenv(f"HF_ENDPOINTS_{style.upper()}", "").split(",") if u.strip()]
+    for style in ("concise", "explainer", "optimizer")
+}
+
+# Endpoint pool (per-replica limits, circuit breaker, hedged requests)
+ENDPOINT_MAX_CONCURRENCY = int(os.getenv("ENDPOINT_MAX_CONCURRENCY", "4"))  # in-flight requests per replica
+ENDPOINT_FAILURE_THRESHOLD = int(os.getenv("ENDPOINT_FAILURE_THRESHOLD", "3"))  # consecutive failures to open
+ENDPOINT_COOLDOWN = float(os.getenv("ENDPOINT_COOLDOWN", "30"))  # seconds an open circuit skips the replica
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))  # hedge once a request is slower than this share
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.2"))  # seconds; floor for the hedge delay
+HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", "10"))  # seconds, until enough latencies are seen
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+# Shared HTTP client (connection pool + retry/backoff)
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))  # distinct hosts kept alive
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))  # connections per host
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "4"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "30"))
+
+# Agents
+AGENT_CONCURRENT = os.getenv("AGENT_CONCURRENT", "1") == "1"
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "3"))
+AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", "150"))  # per-agent deadline in seconds
+
+# Generation profiles: token budget per style, and whether agents stop at / return only the code block
+GEN_MAX_TOKENS = {
+    style: int(os.getenv(f"GEN_MAX_TOKENS_{style.upper()}", default))
+    for style, default in (("concise", "384"), ("explainer", "900"), ("optimizer", "640"))
+}
+GEN_CODE_ONLY = os.getenv("GEN_CODE_ONLY", "1") == "1"
+
+# Generation cache (exact prompt matches; set GEN_CACHE_ENABLED=0 to always sample fresh)
+GEN_CACHE_ENABLED = os.getenv("GEN_CACHE_ENABLED", "1") == "1"
+GEN_CACHE_PATH = os.getenv("GEN_CACHE_PATH", ".cache/generations.sqlite3")
+GEN_CACHE_MAX_ENTRIES = int(os.getenv("GEN_CACHE_MAX_ENTRIES", "5000"))
+GEN_CACHE_TTL = float(os.getenv("GEN_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+
+# Semantic cache (serve stored answers for paraphrased queries; off by default)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # cosine similarity
+SEMANTIC_CACHE_DIR = os.getenv("SEMANTIC_CACHE_DIR", ".cache/semantic_index")
+
+# Graph checkpoints (HITL interrupt/resume)
+GRAPH_CHECKPOINTER = os.getenv("GRAPH_CHECKPOINTER", "sqlite")  # "sqlite" (survives restarts) or "memory"
+GRAPH_CHECKPOINT_PATH = os.getenv("GRAPH_CHECKPOINT_PATH", ".cache/graph_checkpoints.sqlite3")
+
+# Metrics / tracing (coderank_lc/core/metrics.py)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_PROFILE = os.getenv("METRICS_PROFILE", "")  # comma-separated span/node names to profile ("*" = all nodes)
+METRICS_PROFILER = os.getenv("METRICS_PROFILER", "cprofile")  # "cprofile" or "pyinstrument"
+METRICS_PROFILE_DIR = os.getenv("METRICS_PROFILE_DIR", ".cache/profiles")
+METRICS_DUMP_PATH = os.getenv("METRICS_DUMP_PATH", "")  # write a JSON snapshot here at exit (CLI / batch runs)
+
+# HTTP API (coderank_lc/api)
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))  # sessions are shared through the sqlite checkpointer
 
 # Reranker
 RERANKER_BASE = os.getenv("RERANKER_BASE", "cross-encoder/ms-marco-MiniLM-L-6-v2")
 RERANKER_LOAD_DIR = os.getenv("RERANKER_LOAD_DIR", "")
+RERANKER_MANIFEST = os.getenv("RERANKER_MANIFEST", "")  # JSON {"path", "version"}; overrides RERANKER_LOAD_DIR
+RERANKER_WATCH_INTERVAL = float(os.getenv("RERANKER_WATCH_INTERVAL", "30"))  # seconds between checkpoint polls; 0 = off
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "64"))  # pairs per forward pass
+RERANKER_SCORE_CACHE_SIZE = int(os.getenv("RERANKER_SCORE_CACHE_SIZE", "50000"))  # 0 disables memoization
+RERANKER_SCORE_CACHE_PATH = os.getenv("RERANKER_SCORE_CACHE_PATH", "")  # optional persistent SQLite file
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch")  # "torch" or "onnx"
+RERANKER_ONNX_DIR = os.getenv("RERANKER_ONNX_DIR", "models/reranker-onnx")
+RERANKER_ONNX_QUANTIZED = os.getenv("RERANKER_ONNX_QUANTIZED", "1") == "1"  # prefer model.int8.onnx when present
+RERANKER_NUM_THREADS = int(os.getenv("RERANKER_NUM_THREADS", "0"))  # 0 = runtime default
+RERANKER_MICROBATCH = os.getenv("RERANKER_MICROBATCH", "1") == "1"  # coalesce concurrent callers into shared batches
+RERANKER_MAX_WAIT_MS = float(os.getenv("RERANKER_MAX_WAIT_MS", "5"))  # how long a batch may wait to fill up
+RERANKER_WINDOWED = os.getenv("RERANKER_WINDOWED", "1") == "1"  # length-bucketed batches + sliding windows
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))  # tokens per window, query included
+RERANKER_WINDOW_OVERLAP = int(os.getenv("RERANKER_WINDOW_OVERLAP", "64"))  # tokens shared by consecutive windows
+RERANKER_MAX_WINDOWS = int(os.getenv("RERANKER_MAX_WINDOWS", "8"))  # cap per response; the tail beyond is ignored
+RERANKER_WINDOW_REDUCER = os.getenv("RERANKER_WINDOW_REDUCER", "max")  # "max", "mean" or "first" (plain truncation)
+RERANKER_SERVICE_URL = os.getenv("RERANKER_SERVICE_URL", "")  # e.g. http://127.0.0.1:8765; empty = in-process
+RERANKER_SERVICE_HOST = os.getenv("RERANKER_SERVICE_HOST", "127.0.0.1")
+RERANKER_SERVICE_PORT = int(os.getenv("RERANKER_SERVICE_PORT", "8765"))
+RERANKER_SERVICE_TIMEOUT = float(os.getenv("RERANKER_SERVICE_TIMEOUT", "30"))
+RERANKER_SERVICE_RETRY = float(os.getenv("RERANKER_SERVICE_RETRY", "30"))  # seconds before retrying a down service
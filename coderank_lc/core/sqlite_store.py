@@ -0,0 +1,165 @@
+# ==============================================
+# Embedded SQLite Storage for CodeRank (local / offline runs)
+# ==============================================
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from coderank_lc.core.settings import SQLITE_PATH, FEEDBACK_PAGE_SIZE
+from coderank_lc.core.storage import Mark, StorageBackend
+
+COLLECTIONS = ("responses", "feedback", "reranker_scores", "evaluation_results")
+
+
+class SQLiteStorage(StorageBackend):
+    """Local single-file store in WAL mode, mirroring the Astra collections as tables.
+
+    Each table keeps the full document as JSON plus indexed `query`, `agent` and
+    `created_at` columns for the lookups and scans the pipeline performs.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        for coll in COLLECTIONS:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {coll} ("
+                " id TEXT PRIMARY KEY, query TEXT, agent TEXT, created_at REAL, doc TEXT NOT NULL)"
+            )
+            for col in ("query", "agent"):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{coll}_{col} ON {coll}({col})")
+            # (created_at, id) doubles as the keyset for paginated, watermarked scans
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{coll}_created_at ON {coll}(created_at, id)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers proceed while another thread writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(doc: Dict[str, Any]):
+        doc = dict(doc)
+        doc_id = str(doc.setdefault("_id", str(uuid.uuid4())))
+        doc.setdefault("created_at", time.time())
+        return (doc_id, doc.get("query"), doc.get("agent") or doc.get("agent_a"), doc.get("created_at"),
+                json.dumps(doc, ensure_ascii=False, default=str))
+
+    def _insert_rows(self, coll: str, docs: Sequence[Dict[str, Any]]) -> List[str]:
+        rows = [self._row(d) for d in docs]
+        conn = self._conn()
+        # One transaction per call, however many rows
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {coll} (id, query, agent, created_at, doc) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        conn.commit()
+        return [r[0] for r in rows]
+
+    def _insert(self, coll: str, doc: Dict[str, Any]) -> str:
+        return self._insert_rows(coll, [doc])[0]
+
+    def _list(self, coll: str, limit: int) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            f"SELECT doc FROM {coll} ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    # --- StorageBackend ---
+    def store_response(self, doc: Dict[str, Any]) -> str:
+        try:
+            doc_id = self._insert("responses", doc)
+            print(f"📥 Stored response from {doc.get('agent')}")
+            return doc_id
+        except sqlite3.Error as e:
+            print(f"⚠️ Error storing response: {e}")
+            return ""
+
+    def store_feedback(self, doc: Dict[str, Any]) -> str:
+        try:
+            doc_id = self._insert("feedback", doc)
+            print(f"📝 Stored feedback preference: {doc.get('preferred')}")
+            return doc_id
+        except sqlite3.Error as e:
+            print(f"⚠️ Error storing feedback: {e}")
+            return ""
+
+    def store_reranker_score(self, doc: Dict[str, Any]) -> str:
+        try:
+            doc_id = self._insert("reranker_scores", doc)
+            print(f"🏁 Stored reranker score for {doc.get('agent')} → {doc.get('score')}")
+            return doc_id
+        except sqlite3.Error as e:
+            print(f"⚠️ Error storing reranker score: {e}")
+            return ""
+
+    def store_evaluation(self, doc: Dict[str, Any]) -> str:
+        try:
+            return self._insert("evaluation_results", doc)
+        except sqlite3.Error as e:
+            print(f"⚠️ Failed to store evaluation results: {e}")
+            return ""
+
+    def store_many(self, collection: str, docs: Sequence[Dict[str, Any]]) -> List[str]:
+        if collection not in COLLECTIONS:
+            raise ValueError(f"Unknown collection '{collection}'")
+        try:
+            return self._insert_rows(collection, docs)
+        except sqlite3.Error as e:
+            print(f"⚠️ Error storing {len(docs)} document(s) to '{collection}': {e}")
+            return [""] * len(docs)
+
+    def list_recent_feedback(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        return self._list("feedback", limit)
+
+    def list_recent_responses(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        return self._list("responses", limit)
+
+    def iter_feedback(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        since: Optional[Mark] = None,
+        page_size: int = FEEDBACK_PAGE_SIZE,
+    ) -> Iterator[Dict[str, Any]]:
+        if fields:
+            for f in fields:
+                if not re.fullmatch(r"\w+", f):
+                    raise ValueError(f"Invalid field name: {f!r}")
+            # Projection happens in SQL, so unneeded text bodies are never decoded
+            columns = ", ".join(f"json_extract(doc, '$.{f}')" for f in fields)
+        else:
+            columns = "doc"
+
+        created_at, last_id = since if since is not None else (float("-inf"), "")
+        while True:
+            rows = self._conn().execute(
+                f"SELECT id, created_at, {columns} FROM feedback"
+                " WHERE created_at > ? OR (created_at = ? AND id > ?)"
+                " ORDER BY created_at, id LIMIT ?",
+                (created_at, created_at, last_id, page_size),
+            ).fetchall()
+            for row in rows:
+                if fields:
+                    doc = dict(zip(fields, row[2:]))
+                else:
+                    doc = json.loads(row[2])
+                doc["_id"], doc["created_at"] = row[0], row[1]
+                yield doc
+            if len(rows) < page_size:
+                return
+            last_id, created_at = rows[-1][0], rows[-1][1]
@@ -0,0 +1,222 @@
+# ==============================================
+# Storage Interface — pluggable persistence backends
+# ==============================================
+
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from coderank_lc.core import metrics
+from coderank_lc.core.settings import STORAGE_BACKEND, FEEDBACK_PAGE_SIZE, WATERMARK_DIR
+
+# (created_at, _id) of the last document a consumer has seen
+Mark = Tuple[float, str]
+
+
+class StorageBackend(ABC):
+    """Persistence operations used by the graph, UI, evaluation and training code.
+
+    Documents are plain dicts; every `store_*` call returns the new document id
+    (or "" on failure) and every `list_*` call returns newest documents first.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def store_response(self, doc: Dict[str, Any]) -> str:
+        """Insert an agent response."""
+
+    @abstractmethod
+    def store_feedback(self, doc: Dict[str, Any]) -> str:
+        """Insert a human feedback entry."""
+
+    @abstractmethod
+    def store_reranker_score(self, doc: Dict[str, Any]) -> str:
+        """Insert a reranker score for offline fine-tuning."""
+
+    @abstractmethod
+    def store_evaluation(self, doc: Dict[str, Any]) -> str:
+        """Insert a reranker evaluation result."""
+
+    @abstractmethod
+    def list_recent_feedback(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Fetch the most recent feedback documents."""
+
+    @abstractmethod
+    def list_recent_responses(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Fetch the most recent agent response documents."""
+
+    @abstractmethod
+    def iter_feedback(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        since: Optional[Mark] = None,
+        page_size: int = FEEDBACK_PAGE_SIZE,
+    ) -> Iterator[Dict[str, Any]]:
+        """Lazily yield feedback oldest-first, one page at a time.
+
+        Only `fields` (plus `_id` and `created_at`) are fetched when given, and only
+        documents strictly after the `since` mark are returned.
+        """
+
+    def store_many(self, collection: str, docs: Sequence[Dict[str, Any]]) -> List[str]:
+        """Insert many documents into one collection ("responses", "feedback", "reranker_scores",
+        "evaluation_results"); backends override this with a single bulk write."""
+        store = {
+            "responses": self.store_response,
+            "feedback": self.store_feedback,
+            "reranker_scores": self.store_reranker_score,
+            "evaluation_results": self.store_evaluation,
+        }[collection]
+        return [store(doc) for doc in docs]
+
+    def flush(self):
+        """Wait for any buffered writes to land."""
+
+    def warm_up(self):
+        """Open connections ahead of the first request."""
+
+
+def after_mark(doc: Dict[str, Any], since: Optional[Mark]) -> bool:
+    """True if `doc` sorts strictly after the `since` (created_at, _id) mark."""
+    if since is None:
+        return True
+    return (doc.get("created_at") or 0.0, str(doc.get("_id", ""))) > since
+
+
+class Watermark:
+    """Persisted "since" mark so incremental consumers only pull documents added since their last run.
+
+    Feed every consumed document to `advance`, then `commit` once the run has succeeded;
+    an interrupted run, including a `reset` one, leaves the previous mark in place.
+    """
+
+    def __init__(self, name: str, directory: str = WATERMARK_DIR):
+        self.path = os.path.join(directory, f"{name}.json")
+        self.mark: Optional[Mark] = None
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.mark = (float(data["created_at"]), str(data["_id"]))
+        self._pending = self.mark
+
+    def advance(self, doc: Dict[str, Any]):
+        mark = (doc.get("created_at") or 0.0, str(doc.get("_id", "")))
+        if self._pending is None or mark > self._pending:
+            self._pending = mark
+
+    def commit(self):
+        if self._pending is None or self._pending == self.mark:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"created_at": self._pending[0], "_id": self._pending[1]}, f)
+        os.replace(tmp, self.path)
+        self.mark = self._pending
+
+    def reset(self):
+        """Start this run from the beginning; the persisted mark is only replaced by `commit`."""
+        self.mark = self._pending = None
+
+
+# ==============================================
+# Backend Selection
+# ==============================================
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str = STORAGE_BACKEND) -> StorageBackend:
+    """Instantiate a backend by name: "astra" (remote) or "sqlite" (embedded local file)."""
+    if name == "astra":
+        from coderank_lc.core.astra_store import AstraStorage
+        return AstraStorage()
+    if name == "sqlite":
+        from coderank_lc.core.sqlite_store import SQLiteStorage
+        return SQLiteStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND '{name}' (expected 'astra' or 'sqlite')")
+
+
+def get_storage() -> StorageBackend:
+    """Return the process-wide backend selected by STORAGE_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_storage(backend: StorageBackend):
+    """Swap the process-wide backend (e.g. a local store for benchmarks or offline runs)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+# ==============================================
+# Convenience API (delegates to the selected backend)
+# ==============================================
+def _stamped(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy `doc` with a `created_at` epoch timestamp so every backend can order by it."""
+    doc = dict(doc)
+    doc.setdefault("created_at", time.time())
+    return doc
+
+
+def _op(op: str, *args):
+    """Run one backend operation inside a `storage_op` span."""
+    backend = get_storage()
+    with metrics.span("storage_op", op=op, backend=backend.name) as attrs:
+        result = getattr(backend, op)(*args)
+        if isinstance(result, list):
+            attrs["docs"] = len(result)
+    return result
+
+
+def store_response(doc: Dict[str, Any]) -> str:
+    return _op("store_response", _stamped(doc))
+
+
+def store_feedback(doc: Dict[str, Any]) -> str:
+    return _op("store_feedback", _stamped(doc))
+
+
+def store_reranker_score(doc: Dict[str, Any]) -> str:
+    return _op("store_reranker_score", _stamped(doc))
+
+
+def store_evaluation(doc: Dict[str, Any]) -> str:
+    return _op("store_evaluation", _stamped(doc))
+
+
+def store_many(collection: str, docs: Sequence[Dict[str, Any]]) -> List[str]:
+    return _op("store_many", collection, [_stamped(d) for d in docs])
+
+
+def list_recent_feedback(limit: int = 1000) -> List[Dict[str, Any]]:
+    return _op("list_recent_feedback", limit)
+
+
+def list_recent_responses(limit: int = 1000) -> List[Dict[str, Any]]:
+    return _op("list_recent_responses", limit)
+
+
+def iter_feedback(
+    fields: Optional[Sequence[str]] = None,
+    since: Optional[Mark] = None,
+    page_size: int = FEEDBACK_PAGE_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    return get_storage().iter_feedback(fields=fields, since=since, page_size=page_size)
+
+
+def flush():
+    _op("flush")
+
+
+def warm_up():
+    get_storage().warm_up()
@@ -0,0 +1,292 @@
+# ==============================================
+# Reranker Training Engine — pairwise objective over (query, pos, neg)
+# ==============================================
+
+import hashlib
+import os
+import pickle
+import random
+import shutil
+import time
+from typing import Dict, Iterator, List, Optional
+
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Dataset, Sampler
+from transformers import AutoModelForSequenceClassification, AutoTokenizer, get_linear_schedule_with_warmup
+
+from coderank_lc.core.feedback_dataset import load_pairs
+from coderank_lc.core.settings import FEEDBACK_DATASET_DIR, RERANKER_BASE, TOKENIZED_CACHE_DIR
+
+CHECKPOINT_DIR = "checkpoint-last"
+STATE_FILE = "trainer_state.pt"
+
+
+# ==============================================
+# Pre-tokenized data
+# ==============================================
+def tokenize_pairs(tokenizer, table, max_length: int, cache_dir: str = TOKENIZED_CACHE_DIR) -> Dict[str, list]:
+    """Tokenize every (query, pos) and (query, neg) pair once, unpadded, with an on-disk cache.
+
+    The cache key covers the tokenizer, `max_length` and the pair hashes, so a grown
+    dataset or a different base model re-tokenizes while repeated runs load instantly.
+    """
+    h = hashlib.sha256()
+    h.update(f"{tokenizer.name_or_path}|{type(tokenizer).__name__}|{max_length}".encode("utf-8"))
+    for pair_hash in table.column("hash").to_pylist():
+        h.update(pair_hash.encode("utf-8"))
+    path = os.path.join(cache_dir, f"{h.hexdigest()[:32]}.pkl")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    queries = table.column("query").to_pylist()
+    encoded = {}
+    for side in ("pos", "neg"):
+        features = tokenizer(
+            queries, table.column(side).to_pylist(),
+            truncation="only_second", max_length=max_length, padding=False,
+        )
+        encoded[side] = {k: features[k] for k in features.keys() if k != "attention_mask"}
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(encoded, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return encoded
+
+
+class PairDataset(Dataset):
+    """Pre-tokenized preference pairs; item i is (pos features, neg features)."""
+
+    def __init__(self, encoded: Dict[str, Dict[str, list]]):
+        self.pos = encoded["pos"]
+        self.neg = encoded["neg"]
+        self.keys = list(self.pos.keys())
+        self.lengths = [max(len(p), len(n)) for p, n in zip(self.pos["input_ids"], self.neg["input_ids"])]
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, i):
+        return ({k: self.pos[k][i] for k in self.keys}, {k: self.neg[k][i] for k in self.keys})
+
+
+class BucketBatchSampler(Sampler):
+    """Shuffle, then sort within pools of `batch_size * pool_factor` by length so each batch pads little.
+
+    The order depends only on (seed, epoch), which lets a resumed run skip exactly the
+    batches it already trained on.
+    """
+
+    def __init__(self, lengths: List[int], batch_size: int, seed: int = 0, pool_factor: int = 50):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.seed = seed
+        self.pool_factor = pool_factor
+        self.epoch = 0
+        self.skip = 0
+
+    def set_epoch(self, epoch: int, skip: int = 0):
+        self.epoch, self.skip = epoch, skip
+
+    def _batches(self) -> List[List[int]]:
+        rng = random.Random(self.seed + self.epoch)
+        order = list(range(len(self.lengths)))
+        rng.shuffle(order)
+        pool = self.batch_size * self.pool_factor
+        batches = []
+        for start in range(0, len(order), pool):
+            chunk = sorted(order[start:start + pool], key=self.lengths.__getitem__)
+            batches += [chunk[i:i + self.batch_size] for i in range(0, len(chunk), self.batch_size)]
+        rng.shuffle(batches)
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self._batches()[self.skip:])
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size - self.skip
+
+
+class PairCollator:
+    """Pad a batch of pairs into one tensor batch: rows [0, B) are positives, [B, 2B) negatives."""
+
+    def __init__(self, pad_token_id: int):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, batch):
+        rows = [p for p, _ in batch] + [n for _, n in batch]
+        width = max(len(r["input_ids"]) for r in rows)
+        out = {}
+        for key in rows[0]:
+            pad = self.pad_token_id if key == "input_ids" else 0
+            out[key] = torch.tensor([r[key] + [pad] * (width - len(r[key])) for r in rows], dtype=torch.long)
+        out["attention_mask"] = torch.tensor(
+            [[1] * len(r["input_ids"]) + [0] * (width - len(r["input_ids"])) for r in rows], dtype=torch.long
+        )
+        return out
+
+
+def pairwise_loss(pos: torch.Tensor, neg: torch.Tensor, objective: str = "margin", margin: float = 1.0) -> torch.Tensor:
+    """`margin`: hinge on s(pos) - s(neg) >= margin; `logistic`: RankNet-style -log σ(s(pos) - s(neg))."""
+    if objective == "margin":
+        return F.margin_ranking_loss(pos, neg, torch.ones_like(pos), margin=margin)
+    if objective == "logistic":
+        return F.softplus(neg - pos).mean()
+    raise ValueError(f"Unknown objective '{objective}' (expected 'margin' or 'logistic')")
+
+
+# ==============================================
+# Checkpoints
+# ==============================================
+def _save_checkpoint(out_dir: str, model, tokenizer, state: Dict):
+    """Write model + optimizer state to `checkpoint-last`, replacing the previous one atomically."""
+    final = os.path.join(out_dir, CHECKPOINT_DIR)
+    tmp, old = final + ".tmp", final + ".old"
+    shutil.rmtree(tmp, ignore_errors=True)
+    model.save_pretrained(tmp)
+    tokenizer.save_pretrained(tmp)
+    torch.save(state, os.path.join(tmp, STATE_FILE))
+    if os.path.isdir(final):
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+# ==============================================
+# Training loop
+# ==============================================
+def train_reranker(
+    out_dir: str,
+    base_model: str = RERANKER_BASE,
+    dataset_dir: str = FEEDBACK_DATASET_DIR,
+    limit: Optional[int] = None,
+    epochs: int = 2,
+    batch_size: int = 32,
+    grad_accum: int = 1,
+    lr: float = 2e-5,
+    warmup_ratio: float = 0.1,
+    max_length: int = 512,
+    objective: str = "margin",
+    margin: float = 1.0,
+    bf16: bool = False,
+    num_workers: int = 2,
+    save_every: int = 200,
+    log_every: int = 20,
+    seed: int = 42,
+    resume: bool = True,
+) -> Dict[str, float]:
+    """Fine-tune a cross-encoder on preference pairs with a pairwise ranking objective.
+
+    `batch_size` counts pairs per forward pass (2x rows); the optimizer steps every
+    `grad_accum` batches. With `resume`, training continues from `out_dir/checkpoint-last`.
+    The final model is saved to `out_dir` in a layout `CrossEncoder` and `RERANKER_LOAD_DIR` accept.
+    Returns throughput and loss statistics.
+    """
+    torch.manual_seed(seed)
+    checkpoint = os.path.join(out_dir, CHECKPOINT_DIR)
+    resuming = resume and os.path.exists(os.path.join(checkpoint, STATE_FILE))
+    source = checkpoint if resuming else base_model
+
+    pairs = load_pairs(dataset_dir, limit=limit)
+    if pairs.num_rows == 0:
+        return {}
+
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    model = AutoModelForSequenceClassification.from_pretrained(source, num_labels=1)
+    model.train()
+
+    start = time.perf_counter()
+    dataset = PairDataset(tokenize_pairs(tokenizer, pairs, min(max_length, tokenizer.model_max_length)))
+    print(f"🧩 {len(dataset)} pairs tokenized in {time.perf_counter() - start:.1f}s")
+
+    sampler = BucketBatchSampler(dataset.lengths, batch_size, seed=seed)
+    loader = DataLoader(
+        dataset,
+        batch_sampler=sampler,
+        collate_fn=PairCollator(tokenizer.pad_token_id or 0),
+        num_workers=num_workers,
+        persistent_workers=False,
+    )
+
+    batches_per_epoch = (len(dataset) + batch_size - 1) // batch_size
+    total_steps = max(1, epochs * batches_per_epoch // grad_accum)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+    scheduler = get_linear_schedule_with_warmup(optimizer, int(warmup_ratio * total_steps), total_steps)
+
+    epoch, batches_done, global_step = 0, 0, 0
+    if resuming:
+        state = torch.load(os.path.join(checkpoint, STATE_FILE), weights_only=False)
+        optimizer.load_state_dict(state["optimizer"])
+        scheduler.load_state_dict(state["scheduler"])
+        epoch, batches_done, global_step = state["epoch"], state["batches_done"], state["global_step"]
+        print(f"↩️ Resuming from {checkpoint} (epoch {epoch + 1}, batch {batches_done}, step {global_step})")
+
+    examples = 0
+    loss_sum, loss_count = 0.0, 0
+    train_start = window_start = time.perf_counter()
+    window_examples, window_loss, window_batches = 0, 0.0, 0
+    optimizer.zero_grad(set_to_none=True)
+
+    for epoch in range(epoch, epochs):
+        sampler.set_epoch(epoch, skip=batches_done)
+        for features in loader:
+            n = features["input_ids"].shape[0] // 2
+            with torch.autocast("cpu", dtype=torch.bfloat16, enabled=bf16):
+                logits = model(**features).logits.squeeze(-1).float()
+                loss = pairwise_loss(logits[:n], logits[n:], objective, margin)
+            (loss / grad_accum).backward()
+
+            batches_done += 1
+            examples += n
+            window_examples += n
+            loss_sum += loss.item()
+            loss_count += 1
+            window_loss += loss.item()
+            window_batches += 1
+
+            if batches_done % grad_accum == 0 or batches_done == batches_per_epoch:
+                torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+                optimizer.step()
+                scheduler.step()
+                optimizer.zero_grad(set_to_none=True)
+                global_step += 1
+
+                if global_step % log_every == 0:
+                    rate = window_examples / (time.perf_counter() - window_start)
+                    print(f"📈 epoch {epoch + 1} step {global_step}/{total_steps} "
+                          f"loss {window_loss / window_batches:.4f} — {rate:.1f} pairs/s")
+                    window_start, window_examples, window_loss, window_batches = time.perf_counter(), 0, 0.0, 0
+                if global_step % save_every == 0:
+                    _save_checkpoint(out_dir, model, tokenizer, {
+                        "optimizer": optimizer.state_dict(),
+                        "scheduler": scheduler.state_dict(),
+                        "epoch": epoch,
+                        "batches_done": batches_done,
+                        "global_step": global_step,
+                    })
+        batches_done = 0
+
+    elapsed = time.perf_counter() - train_start
+    model.save_pretrained(out_dir)
+    tokenizer.save_pretrained(out_dir)
+    _save_checkpoint(out_dir, model, tokenizer, {
+        "optimizer": optimizer.state_dict(),
+        "scheduler": scheduler.state_dict(),
+        "epoch": epochs,
+        "batches_done": 0,
+        "global_step": global_step,
+    })
+
+    stats = {
+        "pairs": len(dataset),
+        "examples_trained": examples,
+        "steps": global_step,
+        "seconds": round(elapsed, 2),
+        "examples_per_sec": round(examples / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_loss": round(loss_sum / loss_count, 4) if loss_count else 0.0,
+    }
+    print(f"✅ Fine-tuned reranker saved to {out_dir} — {stats['examples_per_sec']} pairs/s")
+    return stats
@@ -0,0 +1,97 @@
+# ==============================================
+# Windowed Scoring — length bucketing and sliding windows for the cross-encoder
+# ==============================================
+"""Turn (query, response) pairs into model-ready windows and back into one score per pair.
+
+Every query and response is tokenized once. Responses longer than the model window are
+split into overlapping chunks that each carry the full query, so long explainer answers
+are scored in full instead of silently truncated. Windows are sorted by length into
+batches to keep padding low, and chunk scores are folded back per pair by a reducer.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+REDUCERS = ("max", "mean", "first")
+
+
+class WindowPlan:
+    """Windows for a list of pairs: `features[i]` belongs to pair `owners[i]`."""
+
+    def __init__(self, n_pairs: int):
+        self.n_pairs = n_pairs
+        self.features: List[Dict[str, List[int]]] = []
+        self.owners: List[int] = []
+
+    @property
+    def lengths(self) -> List[int]:
+        return [len(f["input_ids"]) for f in self.features]
+
+
+def plan_windows(
+    tokenizer,
+    pairs: Sequence[Tuple[str, str]],
+    max_length: int,
+    overlap: int = 64,
+    max_windows: int = 8,
+    reducer: str = "max",
+) -> WindowPlan:
+    """Tokenize once and cut each response into windows of at most `max_length` tokens (query included)."""
+    if reducer not in REDUCERS:
+        raise ValueError(f"Unknown reducer '{reducer}' (expected one of {', '.join(REDUCERS)})")
+
+    queries = list(dict.fromkeys(q for q, _ in pairs))
+    query_ids = dict(zip(queries, tokenizer(queries, add_special_tokens=False, verbose=False)["input_ids"]))
+    response_ids = tokenizer([r for _, r in pairs], add_special_tokens=False, verbose=False)["input_ids"]
+    specials = tokenizer.num_special_tokens_to_add(pair=True)
+    with_types = "token_type_ids" in tokenizer.model_input_names
+
+    plan = WindowPlan(len(pairs))
+    for i, ((query, _), r_ids) in enumerate(zip(pairs, response_ids)):
+        q_ids = query_ids[query][: max_length // 2]  # a huge query must still leave room for the response
+        width = max(1, max_length - specials - len(q_ids))
+        step = max(1, width - min(overlap, width // 2))  # never advance by less than half a window
+        starts = [0]
+        if reducer != "first":
+            while starts[-1] + width < len(r_ids) and len(starts) < max_windows:
+                starts.append(starts[-1] + step)
+        for start in starts:
+            chunk = r_ids[start:start + width]
+            window = {"input_ids": tokenizer.build_inputs_with_special_tokens(q_ids, chunk)}
+            if with_types:
+                window["token_type_ids"] = tokenizer.create_token_type_ids_from_sequences(q_ids, chunk)
+            plan.features.append(window)
+            plan.owners.append(i)
+    return plan
+
+
+def length_batches(lengths: Sequence[int], batch_size: int) -> List[List[int]]:
+    """Window indices grouped into batches of similar length (shortest first)."""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def pad_batch(features: Sequence[Dict[str, List[int]]], pad_token_id: int) -> Dict[str, np.ndarray]:
+    """Right-pad one batch to its own longest window."""
+    width = max(len(f["input_ids"]) for f in features)
+    batch = {}
+    for key in features[0]:
+        pad = pad_token_id if key == "input_ids" else 0
+        batch[key] = np.array([f[key] + [pad] * (width - len(f[key])) for f in features], dtype=np.int64)
+    batch["attention_mask"] = np.array(
+        [[1] * len(f["input_ids"]) + [0] * (width - len(f["input_ids"])) for f in features], dtype=np.int64
+    )
+    return batch
+
+
+def reduce_scores(window_scores: np.ndarray, owners: Sequence[int], n_pairs: int, reducer: str = "max") -> List[float]:
+    """Fold per-window scores into one score per pair, in the original pair order."""
+    grouped: List[List[float]] = [[] for _ in range(n_pairs)]
+    for owner, score in zip(owners, window_scores):
+        grouped[owner].append(float(score))
+    if reducer == "mean":
+        return [sum(g) / len(g) for g in grouped]
+    if reducer == "first":
+        return [g[0] for g in grouped]
+    return [max(g) for g in grouped]
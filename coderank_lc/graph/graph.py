@@ -1,7 +1,13 @@
+import os
+import sqlite3
+from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, END
 from coderank_lc.graph.state import GraphState
+from coderank_lc.core.metrics import instrument_node
+from coderank_lc.core.settings import SEMANTIC_CACHE_ENABLED, GRAPH_CHECKPOINTER, GRAPH_CHECKPOINT_PATH
 
 from coderank_lc.graph.nodes import (
+    node_semantic_lookup,
     node_generate,
     node_pick_pair,
     node_wait_for_human,
@@ -9,18 +15,44 @@ from coderank_lc.graph.nodes import (
     node_rerank,
 )
 
-# Build a LangGraph with a HITL interrupt
+def make_checkpointer(kind: str = GRAPH_CHECKPOINTER, path: str = GRAPH_CHECKPOINT_PATH):
+    """In-memory saver, or a local SQLite saver so paused sessions survive restarts."""
+    if kind == "memory":
+        return MemorySaver()
+    if kind != "sqlite":
+        raise ValueError(f"Unknown GRAPH_CHECKPOINTER '{kind}' (expected 'sqlite' or 'memory')")
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        print("⚠️ langgraph-checkpoint-sqlite not installed — paused sessions are kept in memory only.")
+        return MemorySaver()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
 
-def build_graph():
+
+# Build a LangGraph with a HITL interrupt: runs pause before `wait_human` and resume
+# from the checkpoint of their thread id, so only `record` and `rerank` run after the choice
+
+def build_graph(checkpointer=None):
     g = StateGraph(GraphState)
 
-    g.add_node("generate", node_generate)
-    g.add_node("pick_pair", node_pick_pair)
-    g.add_node("wait_human", node_wait_for_human)
-    g.add_node("record", node_record_feedback)
-    g.add_node("rerank", node_rerank)
+    g.add_node("generate", instrument_node("generate", node_generate))
+    g.add_node("pick_pair", instrument_node("pick_pair", node_pick_pair))
+    g.add_node("wait_human", instrument_node("wait_human", node_wait_for_human))
+    g.add_node("record", instrument_node("record", node_record_feedback))
+    g.add_node("rerank", instrument_node("rerank", node_rerank))
 
-    g.set_entry_point("generate")
+    if SEMANTIC_CACHE_ENABLED:
+        # Paraphrases of answered queries skip generation entirely
+        g.add_node("lookup", instrument_node("lookup", node_semantic_lookup))
+        g.set_entry_point("lookup")
+        g.add_conditional_edges(
+            "lookup",
+            lambda s: "hit" if s.responses else "miss",
+            {"hit": "pick_pair", "miss": "generate"},
+        )
+    else:
+        g.set_entry_point("generate")
     g.add_edge("generate", "pick_pair")
 
     # After picking a pair, we wait for human. If no choice yet, remain; once set, continue to record
@@ -31,10 +63,22 @@ def build_graph():
         {"pause": END, "have_choice": "record"},
     )
 
+    g.add_edge("record", "rerank")
+    g.add_edge("rerank", END)
+
+    return g.compile(
+        checkpointer=checkpointer if checkpointer is not None else make_checkpointer(),
+        interrupt_before=["wait_human"],
+    )
 
 
+def thread_config(thread_id: str, **configurable):
+    """Run config for one labelling session; extra keys (e.g. `on_chunk`) are passed to nodes."""
+    return {"configurable": {"thread_id": thread_id, **configurable}}
 
-    g.add_edge("record", "rerank")
-    g.add_edge("rerank", END)
 
-    return g.compile()
+def submit_choice(graph, thread_id: str, choice: str):
+    """Record the human choice on a paused session and run the remaining nodes (record, rerank)."""
+    config = thread_config(thread_id)
+    graph.update_state(config, {"human_choice": choice})
+    return graph.invoke(None, config)
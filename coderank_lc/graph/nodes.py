@@ -1,15 +1,46 @@
 from coderank_lc.agents.lc_agents import generate_all
 from coderank_lc.core.utils import pick_pair
-from coderank_lc.core.astra_store import store_response, store_feedback
-from coderank_lc.core.reranker import score_batch
+from coderank_lc.core.storage import store_response, store_feedback
+from coderank_lc.core.reranker import score_pairs_tagged
+from coderank_lc.core.settings import GEN_CACHE_ENABLED, SEMANTIC_CACHE_ENABLED
+
+
+def _use_cache(config) -> bool:
+    """Whether this run may be served from the caches; `{"use_cache": False}` forces fresh sampling."""
+    configurable = (config or {}).get("configurable") or {}
+    return configurable.get("use_cache", GEN_CACHE_ENABLED)
+
+
+# --- Node: serve a paraphrased query from the semantic cache ---
+def node_semantic_lookup(state, config=None):
+    from coderank_lc.core.semantic_cache import get_semantic_cache
+
+    if not _use_cache(config):
+        return state  # fresh sampling: a paraphrase's old answers would defeat the point
+    hit = get_semantic_cache().lookup(state.query)
+    if hit is None:
+        return state
+    similarity, entry = hit
+    print(f"🧭 Semantic cache hit ({similarity:.3f}) → '{entry['query']}'")
+    state.responses = dict(entry["responses"])
+    state.metadata["semantic_cache"] = {"similarity": similarity, "matched_query": entry["query"]}
+    return state
 
 # --- Node: generate multiple agent responses ---
-def node_generate(state):
+def node_generate(state, config=None):
     query = state.query
-    texts = generate_all(query)
+    # Callers may stream tokens by passing config={"configurable": {"on_chunk": callback}}
+    # and force fresh sampling with {"use_cache": False}
+    configurable = (config or {}).get("configurable") or {}
+    texts = generate_all(query, on_chunk=configurable.get("on_chunk"), use_cache=_use_cache(config))
     # persist
     for agent, text in texts.items():
         store_response({"query": query, "agent": agent, "text": text})
+    if SEMANTIC_CACHE_ENABLED:
+        from coderank_lc.core.semantic_cache import get_semantic_cache, is_failed_response
+
+        if not any(is_failed_response(t) for t in texts.values()):
+            get_semantic_cache().add(query, texts)
     state.responses = texts
     return state
 
@@ -24,16 +55,14 @@ def node_pick_pair(state):
 
 # --- Node: receive human feedback (HITL) ---
 def node_wait_for_human(state):
-    # Properly pause until human_choice is filled in
+    # The graph interrupts before this node; it runs once the session is resumed
     if getattr(state, "human_choice", None) is None:
         print("⏸ Waiting for human feedback...")
-        state.awaiting_human = True
-        raise RuntimeError("HITL pause")  # STOP graph here cleanly
+        return {"awaiting_human": True}  # routes to END; the session can be resumed again
     # Once human choice exists, continue to record feedback
     return {"awaiting_human": False}
 
 
-
 # --- Node: record feedback to AstraDB ---
 def node_record_feedback(state):
     (a_name, a_text), (b_name, b_text) = state.pair
@@ -53,9 +82,9 @@ def node_record_feedback(state):
 def node_rerank(state):
     agents = list(state.responses.keys())
     texts = [state.responses[a] for a in agents]
-    scores = score_batch(state.query, texts)
+    scores, version = score_pairs_tagged([(state.query, t) for t in texts])
     ranked = sorted(
-        [{"agent": a, "text": t, "score": s} for a, t, s in zip(agents, texts, scores)],
+        [{"agent": a, "text": t, "score": s, "model_version": version} for a, t, s in zip(agents, texts, scores)],
         key=lambda x: x["score"],
         reverse=True,
     )
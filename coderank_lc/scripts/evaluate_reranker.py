@@ -1,20 +1,20 @@
-import json
+import sys
 from sentence_transformers import CrossEncoder
-from coderank_lc.core.astra_store import list_recent_feedback
+from coderank_lc.core.evaluation import dataset_frame, score_pair_frame
+from coderank_lc.core.settings import RERANKER_BATCH_SIZE
 
-reranker = CrossEncoder("models/reranker-ft/offline-2025-10-13")
-rows = list_recent_feedback(limit=500)
+model_dir = sys.argv[1] if len(sys.argv) > 1 else "models/reranker-ft/offline"  # train_reranker.py --out default
+reranker = CrossEncoder(model_dir)
+pairs = dataset_frame(limit=500)
 
-correct, total = 0, 0
-for r in rows:
-    q = r["query"]
-    a = r["text_a"]
-    b = r["text_b"]
-    pref = r["preferred"]
-    scores = reranker.predict([(q, a), (q, b)])
-    chosen = "A" if scores[0] > scores[1] else "B"
-    correct += (chosen == pref)
-    total += 1
+total = len(pairs)
+if total:
+    # One deduplicated, batched pass over every (query, text) pair
+    scored = score_pair_frame(pairs, batch_size=RERANKER_BATCH_SIZE, predict=reranker.predict)
+    chosen = (scored["agent_a_score"] > scored["agent_b_score"]).map({True: "A", False: "B"})
+    correct = int((chosen == scored["preferred"]).sum())
+else:
+    correct = 0
 
 acc = correct / total if total else 0
 print(f"✅ Validation accuracy: {acc*100:.2f}% over {total} samples")
@@ -1,31 +1,33 @@
-# Export AstraDB HITL feedback to JSONL/CSV for offline fine‑tuning.
+# Export HITL feedback to JSONL/CSV and the local Arrow dataset for offline fine‑tuning.
+# By default the newest EXPORT_LIMIT rows are exported; EXPORT_SINCE_LAST=1 appends only
+# feedback added since the previous export (oldest first, up to EXPORT_LIMIT per run).
 import os, json, csv
 from pathlib import Path
-from coderank_lc.core.astra_store import list_recent_feedback
+from coderank_lc.core.feedback_dataset import sync_from_storage
+from coderank_lc.core.settings import FEEDBACK_DATASET_DIR
 
 OUT_DIR = Path(os.environ.get("OUT_DIR", "data"))
 LIMIT = int(os.environ.get("EXPORT_LIMIT", 20000))
+SINCE_LAST = os.environ.get("EXPORT_SINCE_LAST", "0") == "1"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-rows = list_recent_feedback(LIMIT)
 jsonl_path = OUT_DIR / "pairs.jsonl"
 csv_path = OUT_DIR / "pairs.csv"
+mode = "a" if SINCE_LAST and jsonl_path.exists() and csv_path.exists() else "w"
 
 n = 0
-with jsonl_path.open("w", encoding="utf-8") as jf, csv_path.open("w", newline="", encoding="utf-8") as cf:
-    cw = csv.writer(cf); cw.writerow(["query","pos","neg","agent_pos","agent_neg"])
-    for r in rows:
-        q = (r.get("query") or "").strip()
-        a = (r.get("text_a") or r.get("resp_A") or "").strip()
-        b = (r.get("text_b") or r.get("resp_B") or "").strip()
-        pref = (r.get("preferred") or "A").upper()
-        if not (q and a and b):
-            continue
-        if pref == "A":
-            pos, neg = a, b; ap, an = r.get("agent_a","A"), r.get("agent_b","B")
-        else:
-            pos, neg = b, a; ap, an = r.get("agent_b","B"), r.get("agent_a","A")
-        rec = {"query": q, "pos": pos, "neg": neg, "agent_pos": ap, "agent_neg": an}
-        jf.write(json.dumps(rec, ensure_ascii=False) + "\n")
-        cw.writerow([q, pos, neg, ap, an]); n += 1
-print(f"Exported {n} pairs → {jsonl_path} and {csv_path}")
+with jsonl_path.open(mode, encoding="utf-8") as jf, csv_path.open(mode, newline="", encoding="utf-8") as cf:
+    cw = csv.writer(cf)
+    if mode == "w":
+        cw.writerow(["query","pos","neg","agent_pos","agent_neg"])
+
+    def write(rec):
+        global n
+        out = {k: rec[k] for k in ("query", "pos", "neg", "agent_pos", "agent_neg")}
+        jf.write(json.dumps(out, ensure_ascii=False) + "\n")
+        cw.writerow(list(out.values())); n += 1
+
+    # Streams page by page with only the fields we write; memory stays flat
+    added = sync_from_storage(full=not SINCE_LAST, limit=LIMIT, consumer="export_feedback", on_pair=write)
+print(f"Exported {n} {'new ' if SINCE_LAST else ''}pairs → {jsonl_path} and {csv_path}")
+print(f"Added {added} unseen pairs → {FEEDBACK_DATASET_DIR}")
@@ -0,0 +1,35 @@
+# Export the reranker to ONNX (optionally int8) and check ranking parity against torch.
+import argparse
+from coderank_lc.core.onnx_reranker import export_onnx, parity_check
+from coderank_lc.core.settings import RERANKER_BASE, RERANKER_LOAD_DIR, RERANKER_ONNX_DIR
+
+parser = argparse.ArgumentParser(description="Export the reranker to ONNX Runtime.")
+parser.add_argument("--model", default=RERANKER_LOAD_DIR or RERANKER_BASE, help="checkpoint dir or hub name")
+parser.add_argument("--out", default=RERANKER_ONNX_DIR)
+parser.add_argument("--quantize", action="store_true", help="also write a dynamic int8 model")
+parser.add_argument("--check-limit", type=int, default=200, help="feedback pairs used for the parity check (0 = skip)")
+args = parser.parse_args()
+
+export_onnx(args.model, args.out, quantize=args.quantize)
+
+if args.check_limit:
+    from coderank_lc.core.storage import list_recent_feedback
+
+    pairs = []
+    for r in list_recent_feedback(limit=args.check_limit):
+        if r.get("query") and r.get("text_a") and r.get("text_b"):
+            pairs += [(r["query"], r["text_a"]), (r["query"], r["text_b"])]
+    if not pairs:
+        pairs = [
+            ("Find the second largest number in a list.", "def second(xs): return sorted(set(xs))[-2]"),
+            ("Find the second largest number in a list.", "print('hello')"),
+        ]
+
+    report = parity_check(pairs, args.model, args.out, quantized=args.quantize)
+    print("🔍 Parity vs torch:")
+    for k, v in report.items():
+        print(f"   {k}: {v:.4f}" if isinstance(v, float) else f"   {k}: {v}")
+    if report["pairwise_order_agreement"] < 0.95:
+        print("⚠️ Ranking agreement below 95% — keep RERANKER_BACKEND=torch.")
+    else:
+        print(f"✅ Ranking agrees — set RERANKER_BACKEND=onnx and RERANKER_ONNX_DIR={args.out}")
@@ -0,0 +1,170 @@
+# Batch mode: pre-generate and pre-rank candidates for many queries from a JSONL file.
+# Each line needs a "query" (or "prompt", or "title"/"body" as in requests.jsonl) and optionally an "id".
+# Results are appended to --out; rerunning with the same --out skips queries already there.
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from coderank_lc.agents.lc_agents import generate_all
+from coderank_lc.core.reranker import score_pairs_tagged
+from coderank_lc.core.settings import GEN_CACHE_ENABLED
+from coderank_lc.core.storage import flush, store_many
+
+
+def read_queries(path: str) -> Iterator[Tuple[str, str]]:
+    """Lazily yield (id, query) from a JSONL file."""
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            query = row.get("query") or row.get("prompt")
+            if not query and (row.get("title") or row.get("body")):
+                query = "\n\n".join(p for p in (row.get("title"), row.get("body")) if p)
+            if not query:
+                print(f"⚠️ Line {n}: no query — skipped")
+                continue
+            yield str(row.get("id") or row.get("request_id") or n), query
+
+
+def completed_ids(out_path: str) -> set:
+    """Ids already in the output file; the output doubles as the resume checkpoint."""
+    done = set()
+    if os.path.exists(out_path):
+        with open(out_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["id"])
+                except (ValueError, KeyError):
+                    pass  # torn last line from an interrupted run
+    return done
+
+
+class RateLimiter:
+    """Allow at most `per_minute` acquisitions per minute across threads (0 = unlimited)."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def flush_batch(batch: List[Dict], out, batch_size: int) -> int:
+    """Score every candidate of `batch` in one reranker call, bulk-write, then append to the output."""
+    pairs = [(r["query"], text) for r in batch for text in r["responses"].values()]
+    tagged, version = score_pairs_tagged(pairs, batch_size=batch_size)
+    scores = iter(tagged)
+
+    response_docs, score_docs = [], []
+    for r in batch:
+        ranked = []
+        for agent, text in r["responses"].items():
+            s = next(scores)
+            ranked.append({"agent": agent, "text": text, "score": s, "model_version": version})
+            response_docs.append({"query": r["query"], "agent": agent, "text": text, "batch_id": r["id"]})
+            score_docs.append({"query": r["query"], "agent": agent, "score": s, "text": text,
+                               "model_version": version, "batch_id": r["id"]})
+        r["ranked"] = sorted(ranked, key=lambda x: x["score"], reverse=True)
+
+    store_many("responses", response_docs)
+    store_many("reranker_scores", score_docs)
+    flush()
+
+    # Only fully stored queries reach the output, so a crash never skips unstored work on resume
+    for r in batch:
+        out.write(json.dumps(r, ensure_ascii=False) + "\n")
+    out.flush()
+    os.fsync(out.fileno())
+    return len(batch)
+
+
+def run(
+    in_path: str,
+    out_path: str,
+    concurrency: int = 4,
+    rate: float = 0.0,
+    score_batch: int = 256,
+    batch_size: int = 128,
+    limit: Optional[int] = None,
+    fresh: bool = False,
+):
+    done = completed_ids(out_path)
+    if done:
+        print(f"↩️ Resuming: {len(done)} queries already in {out_path}")
+    limiter = RateLimiter(rate)
+
+    def _generate(qid: str, query: str) -> Dict:
+        limiter.acquire()
+        return {"id": qid, "query": query, "responses": generate_all(query, use_cache=GEN_CACHE_ENABLED and not fresh)}
+
+    todo = islice(((qid, q) for qid, q in read_queries(in_path) if qid not in done), limit)
+    pending, batch = set(), []
+    finished, started_at = 0, time.monotonic()
+
+    def _flush():
+        nonlocal finished
+        finished += flush_batch(batch, out, batch_size)
+        batch.clear()
+        minutes = (time.monotonic() - started_at) / 60
+        rate_str = f"{finished / minutes:.1f}" if minutes > 0 else "n/a"
+        print(f"📊 {finished} queries done — {rate_str} queries/min")
+
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        exhausted = False
+        while True:
+            # Keep at most 2x `concurrency` queries queued so the file is streamed, not loaded
+            while not exhausted and len(pending) < 2 * concurrency:
+                item = next(todo, None)
+                if item is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(_generate, *item))
+            if not pending:
+                break
+
+            completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in completed:
+                try:
+                    batch.append(f.result())
+                except Exception as e:
+                    print(f"⚠️ Query failed: {e}")
+            if sum(len(r["responses"]) for r in batch) >= score_batch:
+                _flush()
+        if batch:
+            _flush()
+
+    minutes = (time.monotonic() - started_at) / 60
+    rate_str = f"{finished / minutes:.1f}" if minutes > 0 else "n/a"
+    print(f"✅ {finished} queries generated, ranked and stored in {minutes:.1f} min ({rate_str} queries/min)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and rank candidates for a JSONL file of queries.")
+    parser.add_argument("input", help="JSONL file of queries")
+    parser.add_argument("--out", default="data/batch_results.jsonl", help="results JSONL (also the resume checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4, help="queries generating at once (each fans out to its agents)")
+    parser.add_argument("--rate", type=float, default=0.0, help="max queries started per minute (0 = unlimited)")
+    parser.add_argument("--score-batch", type=int, default=256, help="candidates collected per reranker call")
+    parser.add_argument("--batch-size", type=int, default=128, help="pairs per reranker forward pass")
+    parser.add_argument("--limit", type=int, default=None, help="stop after N new queries")
+    parser.add_argument("--fresh", action="store_true", help="bypass the generation cache")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    run(args.input, args.out, args.concurrency, args.rate, args.score_batch, args.batch_size, args.limit, args.fresh)
@@ -1,18 +1,69 @@
 # Minimal terminal HITL loop for LangGraph
-from coderank_lc.graph.graph import build_graph
+import sys
+import uuid
+from coderank_lc.graph.graph import build_graph, submit_choice, thread_config
 from coderank_lc.graph.state import GraphState
 
-if __name__ == "__main__":
-    graph = build_graph()
-    query = input("Python problem: ")
-    s = GraphState(query=query).model_dump()
-    s = graph.invoke(s)  # runs to wait_human
-    (a_name, a_text), (b_name, b_text) = s["pair"]
+
+class StreamPrinter:
+    """Print streamed agent output in agent order: one agent live, the others buffered until its turn."""
+
+    def __init__(self):
+        self.agents = {}  # agent number -> "Agent-{i}-{style}"
+        self.buffers = {}
+        self.finished = set()
+        self.headed = set()
+        self.turn = 1
+
+    def __call__(self, chunk):
+        self.agents.setdefault(int(chunk.agent.split("-")[1]), chunk.agent)
+        self.buffers.setdefault(chunk.agent, []).append(chunk.delta)
+        if chunk.done:
+            self.finished.add(chunk.agent)
+
+        while self.turn in self.agents:
+            agent = self.agents[self.turn]
+            if agent not in self.headed:
+                self.headed.add(agent)
+                sys.stdout.write(f"\n===== {agent} =====\n")
+            sys.stdout.write("".join(self.buffers[agent]))
+            self.buffers[agent].clear()
+            if agent not in self.finished:
+                sys.stdout.flush()
+                return
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+            self.turn += 1
+
+
+def _ask_choice(pair) -> str:
+    (a_name, a_text), (b_name, b_text) = pair
     print("\nA —", a_name, "\n", a_text)
     print("\nB —", b_name, "\n", b_text)
     choice = input("Pick A or B: ").strip().upper()
-    s["human_choice"] = "A" if choice != "B" else "B"
-    s = graph.invoke(s)
+    return "A" if choice != "B" else "B"
+
+
+if __name__ == "__main__":
+    # `run_cli.py <thread-id>` resumes a session left waiting for a choice (also across restarts)
+    graph = build_graph()
+    if len(sys.argv) > 1:
+        thread_id = sys.argv[1]
+        snapshot = graph.get_state(thread_config(thread_id))
+        if not snapshot.next:
+            sys.exit(f"No paused session '{thread_id}'.")
+        pair = snapshot.values["pair"]
+    else:
+        thread_id = uuid.uuid4().hex
+        query = input("Python problem: ")
+        s = GraphState(query=query).model_dump()
+        # Runs generate → pick_pair and pauses before wait_human
+        s = graph.invoke(s, config=thread_config(thread_id, on_chunk=StreamPrinter()))
+        pair = s["pair"]
+        print(f"\n(session {thread_id} — resume later with: run_cli.py {thread_id})")
+
+    # Resuming executes only wait_human → record → rerank; nothing is regenerated
+    s = submit_choice(graph, thread_id, _ask_choice(pair))
     print("\nTop ranked:")
     for row in s["ranked"][:3]:
         print(f"- {row['agent']} (score {row['score']:.3f})")
@@ -1,28 +1,50 @@
-# coderank_lc/scripts/train_reranker.py
-import json, os
-from pathlib import Path
-from sentence_transformers import CrossEncoder, InputExample
-from torch.utils.data import DataLoader
-from coderank_lc.core.astra_store import list_recent_feedback
+# Fine-tune the reranker on the local feedback dataset with a pairwise objective.
+# Reads the snapshot built by scripts/export_feedback.py (or the storage backend if it is empty or
+# FEEDBACK_SOURCE=storage); rerunning with the same --out resumes from the last checkpoint.
+import argparse
+import json
+from coderank_lc.core.model_registry import publish
+from coderank_lc.core.settings import FEEDBACK_DATASET_DIR, RERANKER_BASE, RERANKER_MANIFEST
+from coderank_lc.core.training import train_reranker
 
-out_dir = Path("models/reranker-ft/offline-2025-10-13")
-out_dir.mkdir(parents=True, exist_ok=True)
+parser = argparse.ArgumentParser(description="Train the reranker on human preference pairs.")
+parser.add_argument("--out", default="models/reranker-ft/offline", help="output dir (also holds checkpoint-last)")
+parser.add_argument("--base", default=RERANKER_BASE, help="base checkpoint dir or hub name")
+parser.add_argument("--data", default=FEEDBACK_DATASET_DIR, help="Arrow feedback dataset dir")
+parser.add_argument("--limit", type=int, default=None, help="train on the most recent N pairs only")
+parser.add_argument("--epochs", type=int, default=2)
+parser.add_argument("--batch-size", type=int, default=32, help="pairs per forward pass")
+parser.add_argument("--grad-accum", type=int, default=1, help="batches per optimizer step")
+parser.add_argument("--lr", type=float, default=2e-5)
+parser.add_argument("--max-length", type=int, default=512)
+parser.add_argument("--objective", choices=("margin", "logistic"), default="margin")
+parser.add_argument("--margin", type=float, default=1.0)
+parser.add_argument("--bf16", action="store_true", help="bf16 autocast on CPU")
+parser.add_argument("--workers", type=int, default=2, help="DataLoader worker processes")
+parser.add_argument("--save-every", type=int, default=200, help="optimizer steps between checkpoints")
+parser.add_argument("--no-resume", action="store_true", help="ignore an existing checkpoint-last")
+parser.add_argument("--publish", nargs="?", const=RERANKER_MANIFEST or "models/reranker-manifest.json", default="",
+                    help="point this manifest at the trained model so running rerankers hot-swap to it")
+parser.add_argument("--version", default="", help="version tag written to the manifest (default: dir name + time)")
+args = parser.parse_args()
 
-rows = list_recent_feedback(limit=5000)
-train_examples = []
-for r in rows:
-    q = r.get("query")
-    pos = r.get("text_a") if r.get("preferred") == "A" else r.get("text_b")
-    neg = r.get("text_b") if r.get("preferred") == "A" else r.get("text_a")
-    if not (q and pos and neg): continue
-    train_examples.append(InputExample(texts=[q, pos], label=1.0))
-    train_examples.append(InputExample(texts=[q, neg], label=0.0))
-
-print(f"🧩 Training on {len(train_examples)} examples")
-
-train_dataloader = DataLoader(train_examples, shuffle=True, batch_size=8)
-model = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2", num_labels=1)
-
-model.fit(train_dataloader=train_dataloader, epochs=2, warmup_steps=50)
-model.save(str(out_dir))
-print(f"✅ Fine-tuned model saved to {out_dir}")
+stats = train_reranker(
+    args.out,
+    base_model=args.base,
+    dataset_dir=args.data,
+    limit=args.limit,
+    epochs=args.epochs,
+    batch_size=args.batch_size,
+    grad_accum=args.grad_accum,
+    lr=args.lr,
+    max_length=args.max_length,
+    objective=args.objective,
+    margin=args.margin,
+    bf16=args.bf16,
+    num_workers=args.workers,
+    save_every=args.save_every,
+    resume=not args.no_resume,
+)
+if args.publish:
+    stats["published"] = publish(args.publish, args.out, args.version)
+print(json.dumps(stats, indent=2))
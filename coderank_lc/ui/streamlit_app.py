@@ -2,8 +2,11 @@ import streamlit as st
 import random
 from dotenv import load_dotenv
 from coderank_lc.agents.lc_agents import generate_all
-from coderank_lc.core.astra_store import store_feedback, store_response, store_reranker_score
-from coderank_lc.core.reranker import score_batch
+from coderank_lc.core import reranker, storage
+from coderank_lc.core.storage import store_feedback, store_response, store_reranker_score
+from coderank_lc.core.reranker import score_pairs_tagged
+from coderank_lc.core.semantic_cache import get_semantic_cache, is_failed_response
+from coderank_lc.core.settings import GEN_CACHE_ENABLED, SEMANTIC_CACHE_ENABLED
 
 # ==========================================================
 # INITIAL SETUP
@@ -12,6 +15,17 @@ load_dotenv()
 st.set_page_config(page_title="🧠 CodeRank — Pairwise HITL", layout="wide")
 st.title("🧠 CodeRank — Pairwise Ranking (Streamlit HITL + Reranker Logging)")
 
+
+@st.cache_resource(show_spinner="Loading reranker and connecting to storage...")
+def _warm_up():
+    # Runs once per server process; later reruns reuse the loaded model and DB handles
+    storage.warm_up()
+    reranker.warm_up()
+    return True
+
+
+_warm_up()
+
 # ==========================================================
 # INPUT SECTION
 # ==========================================================
@@ -19,20 +33,44 @@ query = st.text_area(
     "Your Python request:",
     "Write a Python function to find the second largest number in a list."
 )
+fresh = st.checkbox("Fresh sampling (bypass generation cache)", value=False)
 
 # ==========================================================
 # GENERATE RESPONSES
 # ==========================================================
 if st.button("Generate Responses"):
-    with st.spinner("Generating agent responses..."):
-        responses = generate_all(query)
+    semantic_hit = None
+    if SEMANTIC_CACHE_ENABLED and not fresh:
+        semantic_hit = get_semantic_cache().lookup(query)
+
+    if semantic_hit is not None:
+        similarity, entry = semantic_hit
+        st.session_state.responses = dict(entry["responses"])
+        st.session_state.new_generation = True
+        st.success(f"♻️ Reused answers for a similar query ({similarity:.2f}): {entry['query']}")
+    else:
+        # Live panes: each agent's code renders as its tokens stream in
+        live_cols = st.columns(3)
+        panes, partial = {}, {}
+
+        def _render_chunk(chunk):
+            if chunk.agent not in panes:
+                with live_cols[(int(chunk.agent.split("-")[1]) - 1) % len(live_cols)]:
+                    st.markdown(f"**{chunk.agent}**")
+                    panes[chunk.agent] = st.empty()
+            partial[chunk.agent] = partial.get(chunk.agent, "") + chunk.delta
+            panes[chunk.agent].code(partial[chunk.agent], language="python")
+
+        responses = generate_all(query, on_chunk=_render_chunk, use_cache=GEN_CACHE_ENABLED and not fresh)
         for agent, text in responses.items():
             store_response({"query": query, "agent": agent, "text": text})
+        if SEMANTIC_CACHE_ENABLED and not any(is_failed_response(t) for t in responses.values()):
+            get_semantic_cache().add(query, responses)
 
         st.session_state.responses = responses
         st.session_state.new_generation = True
 
-    st.success("✅ Agent responses generated and stored!")
+        st.success("✅ Agent responses generated and stored!")
 
 # ==========================================================
 # PAIRWISE COMPARISON (HITL)
@@ -81,7 +119,7 @@ if "responses" in st.session_state and st.session_state.responses:
         with st.spinner("📊 Scoring all responses using reranker..."):
             agents = list(st.session_state.responses.keys())
             texts = list(st.session_state.responses.values())
-            scores = score_batch(query, texts)
+            scores, model_version = score_pairs_tagged([(query, t) for t in texts])
 
             # Convert to floats and sort
             ranked = sorted(
@@ -93,13 +131,14 @@ if "responses" in st.session_state and st.session_state.responses:
                 reverse=True
             )
 
-            # --- Log reranker results into AstraDB 🔥
+            # --- Log reranker results into storage 🔥
             for agent, text, score in ranked:
                 store_reranker_score({
                     "query": query,
                     "agent": agent,
                     "score": float(score),
-                    "text": text
+                    "text": text,
+                    "model_version": model_version,
                 })
     
         # --- Display results
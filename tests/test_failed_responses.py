@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from coderank_lc.agents import lc_agents
+from coderank_lc.core.semantic_cache import is_failed_response
+
+
+def streamed_texts(monkeypatch, fake_stream_agent, timeout=5.0):
+    """Assemble each agent's text from `stream_all`, as `generate_all(on_chunk=...)` does."""
+    monkeypatch.setattr(lc_agents, "stream_agent", fake_stream_agent)
+    texts = {}
+    for chunk in lc_agents.stream_all("q", styles=("concise",), timeout=timeout, use_cache=False):
+        texts[chunk.agent] = texts.get(chunk.agent, "") + chunk.delta
+    return texts["Agent-1-concise"]
+
+
+def test_stream_failure_after_partial_code_is_not_cacheable(monkeypatch):
+    def fake_stream_agent(style, query, use_cache=True):
+        yield "def f():\n"
+        raise RuntimeError("connection reset")
+
+    text = streamed_texts(monkeypatch, fake_stream_agent)
+    assert text.startswith("def f():\n")
+    assert is_failed_response(text)
+
+
+def test_stream_timeout_after_partial_code_is_not_cacheable(monkeypatch):
+    def fake_stream_agent(style, query, use_cache=True):
+        yield "def f():\n"
+        time.sleep(1.0)
+        yield "    return 1\n"
+
+    text = streamed_texts(monkeypatch, fake_stream_agent, timeout=0.2)
+    assert text.startswith("def f():\n")
+    assert is_failed_response(text)
+
+
+@pytest.mark.parametrize("text, failed", [
+    ("# [Agent concise failed: boom]", True),
+    ("# Mock: concise", True),
+    ("def f():\n    return 1\n", False),
+])
+def test_is_failed_response(text, failed):
+    assert is_failed_response(text) is failed
@@ -0,0 +1,64 @@
+import pytest
+
+from coderank_lc.core import astra_store
+
+
+class FindCollection:
+    """Just enough of an astrapy collection for `iter_feedback`: filtered, sorted, limited finds."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.finds = 0
+
+    @staticmethod
+    def _matches(doc, flt):
+        for field, cond in flt.items():
+            value = doc.get(field)
+            for op, arg in cond.items():
+                if op == "$exists" and (value is not None) != arg:
+                    return False
+                if op == "$eq" and value != arg:
+                    return False
+                if op == "$gte" and (value is None or value < arg):
+                    return False
+                if op == "$gt" and (value is None or value <= arg):
+                    return False
+        return True
+
+    def find(self, flt, projection=None, sort=None, limit=None):
+        self.finds += 1
+        assert self.finds < 100, "iter_feedback keeps re-reading the same page"
+        rows = [d for d in self.docs if self._matches(d, flt)]
+        if sort:
+            # Like the Data API, documents without the sort field come first
+            rows.sort(key=lambda d: (d.get("created_at") is not None, d.get("created_at") or 0.0))
+        return [dict(d) for d in rows[:limit]]
+
+
+@pytest.fixture
+def feedback(monkeypatch):
+    def install(docs):
+        coll = FindCollection(docs)
+        monkeypatch.setattr(astra_store, "get_collection", lambda name: coll)
+        monkeypatch.setattr(astra_store, "flush_writes", lambda timeout=None: None)
+        return coll
+    return install
+
+
+def test_legacy_docs_beyond_a_page_do_not_stall_the_cursor(feedback):
+    legacy = [{"_id": f"old-{i}", "query": "q"} for i in range(25)]
+    stamped = [{"_id": f"new-{i}", "query": "q", "created_at": 100.0 + i // 3} for i in range(12)]
+    feedback(legacy + stamped)
+
+    ids = [d["_id"] for d in astra_store.iter_feedback(page_size=5)]
+    assert ids[:25] == [d["_id"] for d in legacy]
+    assert sorted(ids[25:]) == sorted(d["_id"] for d in stamped)
+    assert len(ids) == len(set(ids)) == 37
+
+
+def test_cursor_resumes_after_a_mark(feedback):
+    stamped = [{"_id": f"new-{i:02d}", "created_at": 100.0 + i // 4} for i in range(12)]
+    feedback([{"_id": "old"}] + stamped)
+
+    ids = [d["_id"] for d in astra_store.iter_feedback(since=(101.0, "new-05"), page_size=3)]
+    assert ids == [f"new-{i:02d}" for i in range(6, 12)]
@@ -0,0 +1,55 @@
+import functools
+
+import pytest
+
+from coderank_lc.core import storage
+from coderank_lc.core.feedback_dataset import append_pairs, load_pairs, pair_from_feedback, sync_from_storage
+
+
+def feedback_doc(i, created_at=None):
+    doc = {"_id": f"doc-{i:02d}", "query": f"q{i}", "text_a": f"a{i}", "text_b": f"b{i}", "preferred": "A"}
+    if created_at is not None:
+        doc["created_at"] = created_at
+    return doc
+
+
+def test_legacy_feedback_sorts_as_oldest(tmp_path):
+    legacy = [pair_from_feedback(feedback_doc(i)) for i in range(3)]
+    stamped = [pair_from_feedback(feedback_doc(i, created_at=100.0 + i)) for i in range(3, 6)]
+    assert {rec["created_at"] for rec in legacy} == {0.0}
+
+    append_pairs(stamped, str(tmp_path))
+    append_pairs(legacy, str(tmp_path))  # a later full export appends the older, unseen rows
+    newest = load_pairs(str(tmp_path), limit=3, source="local")
+    assert newest.column("query").to_pylist() == ["q3", "q4", "q5"]
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    """Feedback docs served by a stubbed `iter_feedback`; set `fail_after` to break a run midway."""
+    state = {"docs": [feedback_doc(i, created_at=100.0 + i) for i in range(6)], "fail_after": None}
+
+    def fake_iter_feedback(fields=None, since=None):
+        for n, doc in enumerate(d for d in state["docs"] if since is None or (d["created_at"], d["_id"]) > since):
+            if n == state["fail_after"]:
+                raise ConnectionError("storage went away")
+            yield doc
+
+    monkeypatch.setattr(storage, "iter_feedback", fake_iter_feedback)
+    monkeypatch.setattr(storage, "Watermark", functools.partial(storage.Watermark, directory=str(tmp_path / "wm")))
+    return state
+
+
+def test_failed_full_sync_keeps_the_previous_watermark(backend, tmp_path):
+    data = str(tmp_path / "data")
+    assert sync_from_storage(data, limit=4) == 4
+    assert storage.Watermark("feedback_dataset").mark == (103.0, "doc-03")
+
+    backend["fail_after"] = 2
+    with pytest.raises(ConnectionError):
+        sync_from_storage(data, full=True)
+    assert storage.Watermark("feedback_dataset").mark == (103.0, "doc-03")
+
+    backend["fail_after"] = None
+    assert sync_from_storage(data, full=True, limit=1) == 1
+    assert storage.Watermark("feedback_dataset").mark == (105.0, "doc-05")
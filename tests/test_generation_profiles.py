@@ -0,0 +1,190 @@
+import pytest
+
+from coderank_lc.agents import generation_profiles, lc_agents
+from coderank_lc.agents.generation_profiles import (
+    FENCE,
+    CodeBlockStream,
+    GenerationProfile,
+    TokenUsage,
+    extract_code,
+)
+
+CODE_PROFILE = GenerationProfile(
+    max_new_tokens=64, temperature=0.2, stop=(FENCE,), prefill=f"{FENCE}python\n", extract_code=True
+)
+
+
+def stream(deltas, prefilled=True):
+    """Feed `deltas` like `_stream_generate` does; returns (emitted text, deltas consumed)."""
+    block = CodeBlockStream(prefilled=prefilled)
+    out, consumed = "", 0
+    for delta in deltas:
+        consumed += 1
+        out += block.feed(delta)
+        if block.done:
+            break
+    return out + block.finish(), consumed
+
+
+# ==============================================
+# extract_code
+# ==============================================
+@pytest.mark.parametrize("text, prefilled, expected", [
+    ("def f():\n    return 1\n```\nThis function returns one.", True, "def f():\n    return 1"),
+    ("def f():\n    return 1\n", True, "def f():\n    return 1"),  # budget hit before the closing fence
+    ("```python\ndef f():\n    pass\n```\nprose", True, "def f():\n    pass"),  # re-opened block
+    ("```", True, ""),  # re-opened block cut off by the fence stop sequence
+    ("```python", True, ""),
+    ("Sure:\n```py\nx = 1\n```\nmore ```js\ny\n```", False, "x = 1"),
+    ("x = 1\n", False, "x = 1"),  # no fence at all
+])
+def test_extract_code(text, prefilled, expected):
+    assert extract_code(text, prefilled=prefilled) == expected
+
+
+# ==============================================
+# CodeBlockStream
+# ==============================================
+def test_stream_holds_back_a_fence_split_across_deltas():
+    block = CodeBlockStream()
+    assert block.feed("x = 1\n`") == "x = 1"
+    assert block.feed("`") == ""
+    assert block.feed("`\nprose") == ""
+    assert block.done
+
+
+def test_stream_releases_backticks_that_are_not_a_fence():
+    block = CodeBlockStream()
+    assert block.feed("s = '`") == "s = '"
+    assert block.feed("'\n") == "`'"
+    assert block.feed("t = 2") == "\nt = 2"
+
+
+def test_stream_stops_reading_at_the_closing_fence():
+    out, consumed = stream(["def f():\n", "    pass\n", "```", "\nExplanation", " that costs tokens"])
+    assert out == "def f():\n    pass"
+    assert consumed == 3
+
+
+def test_stream_follows_a_reopened_block():
+    out, _ = stream(["``", "`py", "thon\n", "x = 1\n", "```", "\nprose"])
+    assert out == "x = 1"
+
+
+def test_stream_of_only_a_reopened_fence_emits_nothing():
+    assert stream(["``", "`"]) == ("", 2)
+
+
+def test_stream_ending_at_the_budget_flushes_held_back_text():
+    out, _ = stream(["def f():\n", "    return 1 ``"])
+    assert out == "def f():\n    return 1 ``"
+
+
+@pytest.mark.parametrize("prefilled", [True, False])
+@pytest.mark.parametrize("text", [
+    "\n\ndef f():\n  pass\n``` trailing",
+    "```python\ndef g():\n    pass\n```\nprose",
+    "  \n```py\n\n  x = 1  \n\n```",
+    "x = '`'\ny = 2 ``",
+    "Here:\n```python\ncode()\n```\nmore",
+    "```",
+])
+def test_stream_matches_extract_code_for_every_split(text, prefilled):
+    expected = extract_code(text, prefilled=prefilled)
+    for i in range(len(text) + 1):
+        for j in range(i, len(text) + 1):
+            assert stream([text[:i], text[i:j], text[j:]], prefilled)[0] == expected
+
+
+# ==============================================
+# lc_agents: _generate / _stream_generate
+# ==============================================
+@pytest.fixture
+def code_profile(monkeypatch):
+    monkeypatch.setitem(generation_profiles.PROFILES, "concise", CODE_PROFILE)
+
+
+def test_generate_trims_to_the_code_block(monkeypatch, code_profile):
+    monkeypatch.setattr(lc_agents, "_call_pool", lambda style, prompt, profile: "x = 1\n```\nprose")
+    assert lc_agents._generate("concise", "prompt") == "x = 1"
+
+
+def test_generate_retries_without_stop_when_no_code_came_back(monkeypatch, code_profile):
+    calls = []
+
+    def fake_call(style, prompt, profile):
+        calls.append(profile.stop)
+        # With the fence as stop sequence a re-opened block ends right at its opening fence
+        return "```" if profile.stop else "```python\nx = 1\n```\nprose"
+
+    monkeypatch.setattr(lc_agents, "_call_pool", fake_call)
+    assert lc_agents._generate("concise", "prompt") == "x = 1"
+    assert calls == [(FENCE,), ()]
+
+
+def test_generate_does_not_retry_when_code_came_back(monkeypatch, code_profile):
+    calls = []
+    monkeypatch.setattr(lc_agents, "_call_pool", lambda style, prompt, profile: calls.append(1) or "x = 1\n")
+    assert lc_agents._generate("concise", "prompt") == "x = 1"
+    assert len(calls) == 1
+
+
+def fake_stream_pool(responses, log):
+    """A `_stream_pool` stand-in: yields the deltas for each attempt and logs how far it was read."""
+    attempts = iter(responses)
+
+    def _stream_pool(style, prompt, profile):
+        deltas = next(attempts)
+        entry = {"stop": profile.stop, "read": 0, "closed": False}
+        log.append(entry)
+        try:
+            for delta in deltas:
+                entry["read"] += 1
+                yield delta
+        finally:
+            entry["closed"] = True
+
+    return _stream_pool
+
+
+def test_stream_generate_hangs_up_after_the_block(monkeypatch, code_profile):
+    log = []
+    deltas = ["x = ", "1\n", "```", "\nprose", " never read"]
+    monkeypatch.setattr(lc_agents, "_stream_pool", fake_stream_pool([deltas], log))
+    assert "".join(lc_agents._stream_generate("concise", "prompt")) == "x = 1"
+    assert log == [{"stop": (FENCE,), "read": 3, "closed": True}]
+
+
+def test_stream_generate_retries_without_stop_when_no_code_came_back(monkeypatch, code_profile):
+    log = []
+    responses = [["``", "`"], ["```python\n", "x = 1\n", "```", "\nprose"]]
+    monkeypatch.setattr(lc_agents, "_stream_pool", fake_stream_pool(responses, log))
+    assert "".join(lc_agents._stream_generate("concise", "prompt")) == "x = 1"
+    assert [entry["stop"] for entry in log] == [(FENCE,), ()]
+    assert all(entry["closed"] for entry in log)
+
+
+def test_stream_generate_at_budget_keeps_the_partial_block(monkeypatch, code_profile):
+    log = []
+    monkeypatch.setattr(lc_agents, "_stream_pool", fake_stream_pool([["def f():\n", "    return ``"]], log))
+    assert "".join(lc_agents._stream_generate("concise", "prompt")) == "def f():\n    return ``"
+    assert len(log) == 1
+
+
+# ==============================================
+# Profiles and usage
+# ==============================================
+def test_profile_parameters_carry_the_stop_sequence():
+    params = CODE_PROFILE.parameters()
+    assert params["stop"] == [FENCE]
+    assert params["max_new_tokens"] == 64
+    assert "stop" not in generation_profiles.DEFAULT_PROFILE.parameters()
+
+
+def test_token_usage_counts_early_stops_and_savings():
+    usage = TokenUsage()
+    usage.record("concise", tokens=40, budget=100, finish_reason="stop_sequence", seconds=1.0)
+    usage.record("concise", tokens=100, budget=100, finish_reason="length", seconds=1.0)
+    row = usage.snapshot()["concise"]
+    assert (row["calls"], row["early_stops"], row["budget_hits"], row["tokens_saved"]) == (2, 1, 1, 60)
+    assert row["est_seconds_saved"] == pytest.approx(60 / 70, abs=0.01)
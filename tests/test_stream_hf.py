@@ -0,0 +1,37 @@
+import io
+import json
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from coderank_lc.agents import lc_agents
+
+
+class StubClient:
+    """Answers every POST with a canned response, like `HttpClient.post_json(..., stream=True)`."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def post_json(self, url, payload, **kwargs):
+        return self.response
+
+
+def sse_response(tokens, chunk_size=7):
+    """A streamed response carrying `tokens` as raw UTF-8 SSE, with no charset in its Content-Type."""
+    events = [{"token": {"text": tok, "special": False}} for tok in tokens]
+    events.append({"token": {"text": "", "special": True}, "details": {"finish_reason": "eos_token"}})
+    body = "".join(f"data: {json.dumps(e, ensure_ascii=False)}\n\n" for e in events).encode("utf-8")
+    r = requests.Response()
+    r.status_code = 200
+    r.headers = CaseInsensitiveDict({"Content-Type": "text/event-stream"})
+    r.encoding = get_encoding_from_headers(r.headers)  # what requests' adapter sets: ISO-8859-1
+    r.raw = io.BufferedReader(io.BytesIO(body), buffer_size=chunk_size)
+    return r
+
+
+def test_stream_hf_decodes_non_ascii_tokens_as_utf8(monkeypatch):
+    tokens = ["def naïve(xs):\n", "    # Σ xs → total 😀\n", "    return sum(xs)\n"]
+    monkeypatch.setattr(lc_agents, "get_http_client", lambda: StubClient(sse_response(tokens)))
+    assert list(lc_agents.stream_hf("http://model", "prompt")) == tokens